@@ -0,0 +1,310 @@
+#-------------------------------------------------------------------------------
+#Name:            aioRP
+#Purpose:         asyncio interface for refprop calculations executed in
+#                 worker processes
+#
+#Author:          Thelen, B.J.
+#                 thelen_ben@yahoo.com
+#-------------------------------------------------------------------------------
+
+'''Refprop functions block the calling thread, called from an asyncio event
+loop they stall all other coroutines. This module runs refprop functions in a
+pool of worker processes (each with its own refprop library instance) and
+exposes them as coroutines:
+
+    prop = await aioRP.flsh('tp', 300, 100, [1], prop=H2O)
+    props = await aioRP.flshbatch('tp', ts, ps, [1], prop=H2O)
+
+The pool limits the no. of pending calls (backpressure, awaiting callers are
+suspended untill a slot is free) and the no. of concurrent calls per setup.
+Cancelling an awaiting coroutine cancels its calls that have not yet started.
+
+The setup details are passed with each call (input "prop", standard
+dictionary output from refprop functions); the worker will resetup when its
+loaded setup differs. The default pool is created on first call, use setpool
+to apply other settings.
+
+Requires python 3.7+ (async / await and asyncio.get_running_loop), the
+refprop and multiRP modules run on python 3.2.'''
+
+import asyncio
+import functools
+import concurrent.futures
+import multiprocessing as mp
+import refprop
+import multiRP
+
+#input declarations
+RefpropError = refprop.RefpropError
+
+#Declarations
+_pool = None
+
+#Classes
+class AioRPError(RefpropError):
+    'Raise error on invalid aioRP input or usage'
+    def __init__(self, value):
+        self.value = value
+    def __str__(self):
+        return repr(self.value)
+
+
+class RefpropPool():
+    '''Pool of refprop worker processes for asyncio usage
+
+    input:
+        processes--no. of worker processes (default no. of cpu's)
+        maxpending--maximum no. of calls submitted to the workers at once,
+            further calls wait (default 2 * processes)
+        persetup--maximum no. of concurrent calls per setup (default
+            processes)
+        chunksize--no. of states per worker call for batch functions
+        path--refprop root directory (see refprop.setpath), None for default'''
+    def __init__(self, processes=None, maxpending=None, persetup=None,
+                 chunksize=64, path=None):
+        self.processes = processes or mp.cpu_count()
+        self.maxpending = maxpending or 2 * self.processes
+        self.persetup = persetup or self.processes
+        self.chunksize = chunksize
+        self.path = path
+        self._executor = None
+        self._loop = None #event loop of the semaphores
+        self._pending = None
+        self._setupsem = {} #setup key: [semaphore, no. of calls using it]
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _start(self):
+        '''create executor on first call and the semaphores on first call in
+        the running event loop (semaphores are bound to their loop)'''
+        if self._executor == None:
+            self._executor = concurrent.futures.ProcessPoolExecutor(
+                self.processes, initializer=_initworker,
+                initargs=(self.path,))
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._pending = asyncio.Semaphore(self.maxpending)
+            self._setupsem = {}
+        return loop
+
+    async def _submit(self, routine, prop, argslist):
+        'run one task in a worker, obey pending and per setup limits'
+        loop = self._start()
+        key = refprop._setupkey(prop)
+        setupsem = self._setupsem.setdefault(
+            key, [asyncio.Semaphore(self.persetup), 0])
+        setupsem[1] += 1
+        try:
+            async with setupsem[0]:
+                async with self._pending:
+                    return await loop.run_in_executor(
+                        self._executor, multiRP._runtask, routine, prop,
+                        argslist)
+        finally:
+            setupsem[1] -= 1
+            if not setupsem[1] and self._setupsem.get(key) is setupsem:
+                #no calls of this setup, drop its semaphore
+                del self._setupsem[key]
+
+    async def call(self, routine, *args, prop=None):
+        '''Run refprop function routine in a worker process
+
+        input:
+            routine--name of the refprop function (e.g. 'flsh')
+            *args--input of the refprop function
+            prop--setup details (standard dictionary output from refprop
+                functions), None for the setup loaded in the workers
+        output:
+            output of the refprop function'''
+        return (await self._submit(routine, prop, [args]))[0]
+
+    async def batch(self, routine, argslist, prop=None, dedup=False):
+        '''Run refprop function routine for each args of argslist, the list is
+        split in chunks that run in parallel on the workers
+
+        input:
+            dedup--equal args are calculated once, each receives a copy of
+                the output
+        output:
+            list of refprop function outputs in order of argslist'''
+        argslist = [tuple(args) for args in argslist]
+        if dedup:
+            unique, positions = {}, []
+            for args in argslist:
+                key = multiRP._inputkey(args)
+                if key == None:
+                    #unhashable input, calculated on its own
+                    key = object()
+                positions.append(unique.setdefault(key, len(unique)))
+            uniqueargs = [None] * len(unique)
+            for args, position in zip(argslist, positions):
+                uniqueargs[position] = args
+            outputs = await self.batch(routine, uniqueargs, prop)
+            used = set()
+            results = []
+            for position in positions:
+                prps = outputs[position]
+                if position in used and prps.__class__ is dict:
+                    #own copy, callers may change their output
+                    prps = dict(prps)
+                used.add(position)
+                results.append(prps)
+            return results
+        chunks = [argslist[each:each + self.chunksize] for each in
+                  range(0, len(argslist), self.chunksize)]
+        tasks = [asyncio.ensure_future(self._submit(routine, prop, chunk))
+                 for chunk in chunks]
+        try:
+            results = await asyncio.gather(*tasks)
+        except BaseException:
+            #cancel remaining chunks on error or cancellation
+            for task in tasks:
+                task.cancel()
+            raise
+        return [prps for chunk in results for prps in chunk]
+
+    def close(self, wait=True):
+        'Shut down the worker processes'
+        if self._executor != None:
+            self._executor.shutdown(wait)
+            self._executor = None
+            self._loop = None
+            self._setupsem = {}
+
+
+#functions
+def _initworker(path):
+    'worker process initialization'
+    if path != None:
+        refprop.setpath(path)
+
+def setpool(pool):
+    '''Set pool used by the module coroutines, closes the previous pool.
+
+    input:
+        pool--RefpropPool'''
+    global _pool
+    if _pool != None and _pool is not pool:
+        _pool.close(False)
+    _pool = pool
+
+def getpool():
+    '''Return pool used by the module coroutines'''
+    global _pool
+    if _pool == None:
+        _pool = RefpropPool()
+    return _pool
+
+def close():
+    '''Shut down the pool used by the module coroutines'''
+    global _pool
+    if _pool != None:
+        _pool.close()
+        _pool = None
+
+async def call(routine, *args, prop=None):
+    '''Run refprop function routine in a worker process'''
+    return await getpool().call(routine, *args, prop=prop)
+
+async def batch(routine, argslist, prop=None, dedup=False):
+    '''Run refprop function routine for each args of argslist'''
+    return await getpool().batch(routine, argslist, prop=prop, dedup=dedup)
+
+def _coroutine(name):
+    'create coroutine for refprop function name'
+    @functools.wraps(getattr(refprop, name))
+    async def _rpcoro(*args, prop=None):
+        return await getpool().call(name, *args, prop=prop)
+    return _rpcoro
+
+#functions from refprop.py
+(critp, therm, therm0, residual, therm2, therm3, entro, enthal, cvcp, cvcpk,
+ gibbs, ag, press, dpdd, dpddk, dpdd2, dpdt, dpdtk, dddp, dddt, dhd1, fgcty,
+ fugcof, chempot, dbdt, virb, virc, vird, virba, virca, satt, satp, satd, sath,
+ sate, sats, csatk, dptsatk, cv2pk, tprho, flsh, flsh1, flsh2, info, name,
+ xmass, xmole, limitx, limitk, limits, qmass, qmole, wmol, dielec, surft,
+ surten, meltt, meltp, sublt, sublp, trnprp, getktv, getmod, getfij, b12,
+ excess, cstar, fpv, rmix2, getphase, psliq, psvap, ps2ph, phliq, phvap,
+ ph2ph) = [_coroutine(each) for each in (
+    'critp', 'therm', 'therm0', 'residual', 'therm2', 'therm3', 'entro',
+    'enthal', 'cvcp', 'cvcpk', 'gibbs', 'ag', 'press', 'dpdd', 'dpddk', 'dpdd2',
+    'dpdt', 'dpdtk', 'dddp', 'dddt', 'dhd1', 'fgcty', 'fugcof', 'chempot',
+    'dbdt', 'virb', 'virc', 'vird', 'virba', 'virca', 'satt', 'satp', 'satd',
+    'sath', 'sate', 'sats', 'csatk', 'dptsatk', 'cv2pk', 'tprho', 'flsh',
+    'flsh1', 'flsh2', 'info', 'name', 'xmass', 'xmole', 'limitx', 'limitk',
+    'limits', 'qmass', 'qmole', 'wmol', 'dielec', 'surft', 'surten', 'meltt',
+    'meltp', 'sublt', 'sublp', 'trnprp', 'getktv', 'getmod', 'getfij', 'b12',
+    'excess', 'cstar', 'fpv', 'rmix2', 'getphase', 'psliq', 'psvap', 'ps2ph',
+    'phliq', 'phvap', 'ph2ph')]
+
+#batch functions
+async def flshbatch(routine, var1, var2, x, kph=1, prop=None, dedup=False):
+    '''Flash calculation for each pair of var1[i], var2[i] at composition x,
+    equal pairs are calculated once with dedup
+
+    output:
+        list of flsh outputs'''
+    if len(var1) != len(var2):
+        raise AioRPError('var1 and var2 should have equal length')
+    return await batch('flsh', [(routine, each, other, x, kph) for each, other
+                                in zip(var1, var2)], prop=prop, dedup=dedup)
+
+async def thermbatch(t, D, x, routines=('therm',), outputs=None,
+                     order=False, dedup=False, prop=None):
+    '''Compute the outputs of therm, therm2, therm3, trnprp and / or dielec
+    for each pair of t[i], D[i] at composition x (see refprop.thermbatch),
+    in chunks of chunksize states running in parallel on the workers. With
+    order and dedup each chunk is ordered and deduplicated on its own.
+
+    output:
+        dictionary of the output arrays, errors, warnings and dedup
+        statistics (summed over the chunks) as refprop.thermbatch'''
+    if len(t) != len(D):
+        raise AioRPError('t and D should have equal length')
+    pool = getpool()
+    step = pool.chunksize
+    #an empty input is run once for the output names
+    tasks = [asyncio.ensure_future(pool.call(
+        'thermbatch', t[each:each + step], D[each:each + step], x, routines,
+        outputs, None, order, dedup, prop=prop)) for each in
+             range(0, len(t) or 1, step)]
+    try:
+        results = await asyncio.gather(*tasks)
+    except BaseException:
+        #cancel remaining chunks on error or cancellation
+        for task in tasks:
+            task.cancel()
+        raise
+    return _joinbatch(results, step)
+
+def _joinbatch(results, step):
+    '''return refprop.thermbatch output of the outputs results of
+    consecutive chunks of step states'''
+    from array import array
+    prps = dict(results[0])
+    for key, value in results[0].items():
+        if value.__class__ is array:
+            prps[key] = array(value.typecode)
+            for result in results:
+                prps[key].extend(result[key])
+        elif key in ('errors', 'warnings'):
+            prps[key] = {}
+            for number, result in enumerate(results):
+                for index, error in result[key].items():
+                    prps[key][number * step + index] = error
+        elif key == 'dedup':
+            prps[key] = dict((name, sum(result[key][name] for result in
+                                        results)) for name in value)
+    return prps
+
+async def trnprpbatch(t, D, x, prop=None, dedup=False):
+    '''trnprp calculation for each pair of t[i], D[i] at composition x'''
+    if len(t) != len(D):
+        raise AioRPError('t and D should have equal length')
+    return await batch('trnprp', [(each, other, x) for each, other
+                                  in zip(t, D)], prop=prop, dedup=dedup)
@@ -0,0 +1,601 @@
+#-------------------------------------------------------------------------------
+#Name:            batchRP
+#Purpose:         coalesce single refprop requests of concurrent callers into
+#                 batched calls
+#
+#Author:          Thelen, B.J.
+#                 thelen_ben@yahoo.com
+#-------------------------------------------------------------------------------
+
+'''The refprop module holds one loaded setup at a time and is not thread safe.
+Applications with many concurrent callers (e.g. threads of a web server) that
+each request one or two states would otherwise switch setups on nearly every
+call.
+
+This module collects the single requests of concurrent callers in a queue and
+hands each caller a future. A dispatcher thread (the only thread calling
+refprop) takes the queued requests for up to "maxdelay" microseconds or
+"maxbatch" items, groups them by setup details and routine and runs each group
+as one batch after a single resetup. The setup switch and the per request
+overhead are thereby shared by all requests of a group.
+
+example:
+    batcher = MicroBatcher(maxdelay=500, maxbatch=64)
+    future = batcher.submit('flsh', 'tp', 300, 100, [1], prop=H2O)
+    print(future.result()['D'])
+    batcher.close()
+
+Run as script the module evaluates a file of state points (csv, parquet or
+stdin) with a declarative spec on a pool of worker processes and streams the
+results in order to an output file (see main):
+
+    python -m batchRP states.csv results.parquet --fluids WATER --input tp \\
+        --outputs D,h,s,cp,w,eta,tcx'''
+
+import sys
+import json
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+import refprop
+
+#input declarations
+RefpropError = refprop.RefpropError
+
+#Classes
+class MicroBatcherError(RefpropError):
+    'Raise error on invalid MicroBatcher input or usage'
+    def __init__(self, value):
+        self.value = value
+    def __str__(self):
+        return repr(self.value)
+
+
+class SpecError(RefpropError):
+    'Raise error on invalid batch evaluation spec or state point file'
+    def __init__(self, value):
+        self.value = value
+    def __str__(self):
+        return repr(self.value)
+
+
+class _Request():
+    'single refprop request as queued by MicroBatcher.submit'
+    __slots__ = ('key', 'routine', 'func', 'args', 'kwargs', 'prop', 'future',
+                 'queued')
+    def __init__(self, key, routine, func, args, kwargs, prop):
+        self.key = key
+        self.routine = routine
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.prop = prop
+        self.future = Future()
+        self.queued = time.time()
+
+
+class MicroBatcher():
+    '''Collect single refprop requests and run them grouped by setup details
+    and routine.
+
+    input:
+        maxdelay--maximum time [microseconds] a request waits for other
+            requests before its batch is run (latency knob)
+        maxbatch--maximum no. of requests run in one batch (throughput knob)
+        maxqueue--maximum no. of queued requests, submit blocks while the
+            queue is full (0 = unlimited)
+        dedup--equal requests (setup, routine and input) of one batch are
+            calculated once, each receives a copy of the output'''
+    def __init__(self, maxdelay=500, maxbatch=64, maxqueue=0, dedup=False):
+        if maxdelay < 0 or maxbatch < 1 or maxqueue < 0:
+            raise MicroBatcherError('maxdelay and maxqueue should be >= 0 ' +
+                                    'and maxbatch >= 1')
+        self.maxdelay = maxdelay
+        self.maxbatch = maxbatch
+        self.maxqueue = maxqueue
+        self.dedup = dedup
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._metrics = {'requests':0, 'batches':0, 'groups':0,
+                         'setupswitches':0, 'errors':0, 'maxqueuedepth':0,
+                         'duplicates':0, 'waittime':0.0, 'runtime':0.0}
+        self._thread = threading.Thread(target=self._dispatch,
+                                        name='MicroBatcher')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def submit(self, routine, *args, prop=None, **kwargs):
+        '''Queue a refprop request and return its future.
+
+        input:
+            routine--name of the refprop function (e.g. 'flsh') or the
+                function itself
+            *args, **kwargs--input of the refprop function
+            prop--setup details (standard dictionary output from refprop
+                functions) the request is calculated with, None for the
+                setup loaded when the dispatcher takes the request (pass
+                prop when submitting from several threads or requests of
+                different setups)
+        output:
+            concurrent.futures.Future of the refprop function output'''
+        if routine.__class__ is str:
+            func = getattr(refprop, routine, None)
+            if func == None or routine.startswith('_'):
+                raise MicroBatcherError('unknown refprop function "' +
+                                        routine + '"')
+        elif callable(routine):
+            func = routine
+            routine = func.__name__
+        else:
+            raise MicroBatcherError('expect "str" or function input for ' +
+                                    'routine instead of "' +
+                                    str(routine.__class__) + '"')
+        #setup key is resolved by the dispatcher, the only thread calling
+        #refprop
+        request = _Request(None, routine, func, args, kwargs, prop)
+        with self._cond:
+            if self._closed:
+                raise MicroBatcherError('MicroBatcher is closed')
+            while self.maxqueue and len(self._queue) >= self.maxqueue:
+                self._cond.wait()
+                if self._closed:
+                    raise MicroBatcherError('MicroBatcher is closed')
+            self._queue.append(request)
+            self._metrics['requests'] += 1
+            if len(self._queue) > self._metrics['maxqueuedepth']:
+                self._metrics['maxqueuedepth'] = len(self._queue)
+            self._cond.notify_all()
+        return request.future
+
+    def call(self, routine, *args, prop=None, **kwargs):
+        '''Queue a refprop request and wait for its output'''
+        return self.submit(routine, *args, prop=prop, **kwargs).result()
+
+    def queuedepth(self):
+        'Return no. of requests waiting in queue'
+        return len(self._queue)
+
+    def metrics(self):
+        '''Return dispatch statistics
+
+        output:
+            queuedepth--no. of requests waiting in queue
+            maxqueuedepth--maximum no. of requests waited in queue
+            requests--no. of submitted requests
+            batches--no. of dispatched batches
+            groups--no. of (setup, routine) groups run
+            setupswitches--no. of resetup calls
+            errors--no. of requests finished with an exception
+            duplicates--no. of requests answered by an equal request (dedup)
+            meanbatch--average no. of requests per batch
+            meanwait--average queue time per request [microseconds]
+            meanrun--average calculation time per request [microseconds]'''
+        with self._cond:
+            mtrcs = dict(self._metrics)
+            mtrcs['queuedepth'] = len(self._queue)
+        done = mtrcs['requests'] - mtrcs['queuedepth']
+        mtrcs['meanbatch'] = done / mtrcs['batches'] if mtrcs['batches'] else 0
+        mtrcs['meanwait'] = mtrcs.pop('waittime') * 1e6 / done if done else 0
+        mtrcs['meanrun'] = mtrcs.pop('runtime') * 1e6 / done if done else 0
+        return mtrcs
+
+    def close(self, wait=True):
+        '''Stop accepting requests, queued requests are still calculated.
+
+        input:
+            wait--wait untill all queued requests have been calculated'''
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if wait:
+            self._thread.join()
+
+    def _take(self):
+        'wait for requests and return the next batch (None when closed)'
+        with self._cond:
+            while not self._queue:
+                if self._closed:
+                    return None
+                self._cond.wait()
+            #wait for further requests untill batch full or delay passed
+            deadline = self._queue[0].queued + self.maxdelay / 1e6
+            while len(self._queue) < self.maxbatch and not self._closed:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = [self._queue.popleft() for each in
+                     range(min(self.maxbatch, len(self._queue)))]
+            #release blocked submit calls
+            self._cond.notify_all()
+            return batch
+
+    def _dispatch(self):
+        'dispatcher thread, only thread calling refprop functions'
+        while True:
+            batch = self._take()
+            if batch == None:
+                return
+            start = time.time()
+            self._resolve(batch)
+            #group by setup and routine, keep order of first arrival
+            groups = {}
+            for request in batch:
+                groups.setdefault((request.key, request.routine),
+                                  []).append(request)
+            #run groups of the loaded setup first
+            loaded = refprop._loadedfingerprint()
+            order = sorted(groups, key=lambda group: group[0] != loaded)
+            waittime = sum(start - request.queued for request in batch)
+            errors = 0
+            for group in order:
+                errors += self._rungroup(groups[group])
+            with self._cond:
+                self._metrics['batches'] += 1
+                self._metrics['groups'] += len(groups)
+                self._metrics['errors'] += errors
+                self._metrics['waittime'] += waittime
+                self._metrics['runtime'] += time.time() - start
+
+    def _resolve(self, batch):
+        '''set setup key of the requests of batch, requests without prop
+        get the setup loaded before the batch is run'''
+        loaded = None
+        for request in batch:
+            if request.prop == None:
+                if refprop._setupprop == {}:
+                    continue
+                if loaded == None:
+                    loaded = refprop.setup_setting()
+                request.prop = loaded
+            request.key = refprop.fingerprint(request.prop)
+
+    def _rungroup(self, requests):
+        'run requests of identical setup and routine, return no. of errors'
+        errors = 0
+        key = requests[0].key
+        #compared to the loaded setup, a routine (e.g. setup) may change it
+        if key != None and key != refprop._loadedfingerprint():
+            try:
+                refprop.resetup(requests[0].prop)
+            except Exception as exc:
+                #setup failure fails the whole group
+                for request in requests:
+                    if request.future.set_running_or_notify_cancel():
+                        request.future.set_exception(exc)
+                return len(requests)
+            with self._cond:
+                self._metrics['setupswitches'] += 1
+        done = {} #request key: (result, exception) of dedup
+        duplicates = 0
+        for request in requests:
+            if not request.future.set_running_or_notify_cancel():
+                continue
+            inputkey = _requestkey(request) if self.dedup else None
+            if inputkey in done:
+                result, exc = done[inputkey]
+                duplicates += 1
+                if result.__class__ is dict:
+                    #own copy, callers may change their output
+                    result = dict(result)
+            else:
+                result, exc = None, None
+                try:
+                    result = request.func(*request.args, **request.kwargs)
+                except Exception as error:
+                    exc = error
+                if inputkey != None:
+                    done[inputkey] = result, exc
+            if exc != None:
+                errors += 1
+                request.future.set_exception(exc)
+            else:
+                request.future.set_result(result)
+        if duplicates:
+            with self._cond:
+                self._metrics['duplicates'] += duplicates
+        return errors
+
+
+def _requestkey(request):
+    '''return hashable key of the input of request (lists as tuples), None
+    for unhashable inputs'''
+    def frozen(value):
+        return tuple(value) if value.__class__ is list else value
+    key = (tuple(frozen(each) for each in request.args),
+           tuple(sorted((name, frozen(value)) for name, value in
+                        request.kwargs.items())))
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+
+#batch evaluation of state point files
+_outputs = ('t', 'p', 'D', 'h', 's', 'q', 'cp', 'w')
+_transport = ('eta', 'tcx')
+
+def _state(routine, var1, var2, x, kph=1, transport=False):
+    'flash calculation of one state point, with transport properties'
+    prps = refprop.flsh(routine, var1, var2, x, kph)
+    if transport:
+        prps.update(refprop.trnprp(prps['t'], prps['D'], x))
+    return prps
+
+def loadspec(spec=None, **kwargs):
+    '''Return completed evaluation spec of spec (dictionary or path of a
+    json file) updated with kwargs (None values are ignored).
+
+    spec keys:
+        fluids--list of fluid names, or dictionary fluid name: mole fraction
+            for mixtures
+        x--mole fractions of a list of fluids (required for mixtures)
+        hfmix--mixture coefficients file (default 'HMX.BNC')
+        hrf--reference state (default 'DEF', see setref)
+        setref--optional dictionary of setref input (hrf, ixflag, x0, h0,
+            s0, t0, p0)
+        input--flash input pair (default 'tp', see flsh)
+        columns--names of the two input columns (default the letters of
+            input)
+        kph--phase flag of the flash calculation (default 1)
+        outputs--list of refprop outputs to write (default t, p, D, h, s, q,
+            cp, w), eta and tcx add a trnprp calculation
+    output:
+        spec with setup details (prop), composition (x) and transport flag'''
+    if spec.__class__ is str:
+        with open(spec) as specfile:
+            spec = json.load(specfile)
+    spec = dict(spec or {})
+    for key, value in kwargs.items():
+        if value != None:
+            spec[key] = value
+    fluids = spec.get('fluids')
+    if not fluids:
+        raise SpecError('spec requires "fluids"')
+    if fluids.__class__ is str:
+        fluids = [fluids]
+    if fluids.__class__ is dict:
+        if spec.get('x') != None and len(spec['x']) != len(fluids):
+            raise SpecError('"x" should have ' + str(len(fluids)) +
+                            ' mole fractions')
+        spec['x'] = refprop.normalize(list(fluids.values()))['x']
+        fluids = list(fluids)
+    else:
+        fluids = list(fluids)
+        if len(set(fluids)) != len(fluids):
+            raise SpecError('fluids ' + str(fluids) + ' should be unique')
+        if len(fluids) == 1:
+            spec['x'] = spec.get('x', [1.0])
+        elif spec.get('x') == None:
+            raise SpecError('mixture of ' + str(fluids) + ' requires "x" ' +
+                            'or a dictionary of fluid name: mole fraction')
+        if len(spec['x']) != len(fluids):
+            raise SpecError('"x" should have ' + str(len(fluids)) +
+                            ' mole fractions')
+    spec['fluids'] = fluids
+    spec['input'] = spec.get('input', 'tp').lower()
+    if len(spec['input']) != 2:
+        raise SpecError('input should be a flash input pair as "tp"')
+    spec['columns'] = list(spec.get('columns', spec['input']))
+    spec['kph'] = spec.get('kph', 1)
+    outputs = spec.get('outputs', _outputs)
+    if outputs.__class__ is str:
+        outputs = outputs.split(',')
+    spec['outputs'] = [each.strip() for each in outputs if each.strip()]
+    spec['transport'] = any(each in _transport for each in spec['outputs'])
+    prop = {'hrf':spec.get('hrf', 'DEF').upper(), 'hfld':fluids,
+            'hfmix':spec.get('hfmix', 'HMX.BNC'), 'nc':len(fluids)}
+    if spec.get('setref') != None:
+        prop['setref'] = spec['setref']
+    spec['prop'] = prop
+    return spec
+
+def readstates(source, columns, batchsize=65536):
+    '''Return generator of the tuples of the values of columns of each row
+    of source, read lazily in batches. Unparsable values are nan.
+
+    input:
+        source--path of a csv, tsv or parquet file, '-' for csv on stdin
+        columns--names of the columns to read'''
+    if source.lower().endswith('.parquet'):
+        try:
+            import pyarrow.parquet
+        except ImportError:
+            raise SpecError('reading parquet requires pyarrow')
+        reader = pyarrow.parquet.ParquetFile(source)
+        for batch in reader.iter_batches(batchsize, columns=list(columns)):
+            values = [batch.column(each).to_pylist() for each in columns]
+            for row in zip(*values):
+                yield tuple(_float(each) for each in row)
+        return
+    import csv
+    if source == '-':
+        infile = sys.stdin
+    else:
+        infile = open(source, newline='', buffering=1 << 20)
+    try:
+        delimiter = '\t' if source.lower().endswith('.tsv') else ','
+        reader = csv.reader(infile, delimiter=delimiter)
+        header = [each.strip() for each in next(reader, [])]
+        try:
+            index = [header.index(each) for each in columns]
+        except ValueError:
+            raise SpecError('input columns ' + str(list(columns)) +
+                            ' not all in header ' + str(header))
+        for row in reader:
+            if row:
+                yield tuple(_float(row[each]) if each < len(row) else
+                            float('nan') for each in index)
+    finally:
+        if infile is not sys.stdin:
+            infile.close()
+
+def _float(value):
+    'return value as float, nan if unparsable'
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float('nan')
+
+def evaluate(spec, source, output, processes=None, chunksize=256,
+             timeout=None, path=None, pool=None, rowgroup=65536,
+             checkpoint=None, dedup=False):
+    '''Evaluate the state points of source with spec (see loadspec) on a
+    pool of worker processes and stream the outputs in order of source to
+    output. Failed states are written with nan values, ierr 999 and the
+    error message in herr.
+
+    input:
+        spec--evaluation spec (dictionary or path of a json file)
+        source--input file, see readstates
+        output--output file (.csv, .tsv, .csv.gz, .parquet, .arrow, see
+            sinkRP.sink), '-' for csv on stdout
+        processes--no. of worker processes (default no. of cpu's)
+        chunksize--no. of states per task send to a worker
+        timeout--time budget [s] per state, see multiRP.RPPool.imap
+        path--refprop root directory (see refprop.setpath)
+        pool--persistent multiRP.RPPool to use instead of a temporary pool
+        rowgroup--no. of rows buffered by the output
+        checkpoint--checkpoint directory, the states are evaluated in
+            segments of rowgroup states which are merged to output when
+            completed. An interrupted evaluation resumes with the missing
+            segments (see sinkRP.sweep)
+        dedup--calculate equal state points once (see multiRP.RPPool.imap)
+    output:
+        rows--no. of evaluated states
+        failed--no. of failed states (ierr > 0, states with a refprop
+            warning are not counted)
+        time--elapsed time [s]
+        rate--throughput [states/s]
+        unique--no. of calculated unique states (dedup only)'''
+    #imported on use, the MicroBatcher does not require it
+    import sinkRP
+    if spec.__class__ is not dict or 'prop' not in spec:
+        spec = loadspec(spec)
+    x, kph, transport = spec['x'], spec['kph'], spec['transport']
+    routine = spec['input']
+    states = ((routine, var1, var2, x, kph, transport) for var1, var2 in
+              readstates(source, spec['columns']))
+    start = time.time()
+    options = {'timeout':timeout, 'skiperrors':True}
+    if dedup:
+        options['dedup'] = stats = {}
+    if pool == None:
+        options.update(processes=processes, path=path)
+    if checkpoint != None:
+        if output == '-':
+            raise SpecError('checkpointed evaluation requires an output file')
+        #csv and tsv parts of a .gz output are compressed by merge
+        filetype = output.lower()
+        compressed = filetype.endswith('.gz')
+        filetype = filetype[:-3 if compressed else None].rsplit('.', 1)[-1]
+        if filetype not in (('csv', 'tsv') if compressed else ('csv', 'tsv',
+                            'parquet', 'arrow', 'feather', 'ipc')):
+            raise SpecError('unknown file type of output "' + output +
+                            '", select .csv, .tsv, .csv.gz, .tsv.gz, ' +
+                            '.parquet, .arrow, .feather or .ipc')
+        sweep = sinkRP.sweep(_state, states, checkpoint, spec['outputs'],
+                             spec['prop'], rowgroup, filetype, chunksize,
+                             pool, 'batchRP._state', **options)
+        sinkRP.merge(checkpoint, output)
+        rows, failed = sweep['rows'], sweep['failed']
+    else:
+        if output == '-':
+            out = sinkRP.CSVSink(sys.stdout, spec['outputs'], spec['prop'],
+                                 rowgroup)
+        else:
+            out = sinkRP.sink(output, spec['outputs'], spec['prop'],
+                              rowgroup)
+        with out:
+            sinkRP.imap(_state, states, out, spec['prop'], chunksize, pool,
+                        **options)
+        rows, failed = out.rows, out.failed
+    elapsed = time.time() - start
+    summary = {'rows':rows, 'failed':failed, 'time':elapsed,
+               'rate':rows / elapsed if elapsed else 0}
+    if dedup:
+        summary['unique'] = stats['unique']
+    return summary
+
+def main(argv=None):
+    '''Command line entry point, run "python -m batchRP --help" for the
+    options. A throughput and error summary is printed to stderr.'''
+    import argparse
+    parser = argparse.ArgumentParser(
+        prog='batchRP',
+        description='evaluate a file of state points with refprop')
+    parser.add_argument('source', help="input csv, tsv or parquet file, " +
+                        "'-' for csv on stdin")
+    parser.add_argument('output', help="output csv, tsv, parquet or arrow " +
+                        "file, '-' for csv on stdout")
+    parser.add_argument('--spec', default=None, help='json spec file, ' +
+                        'options below override its keys')
+    parser.add_argument('--fluids', default=None,
+                        help='comma separated fluid names')
+    parser.add_argument('--x', default=None,
+                        help='comma separated mole fractions of the fluids')
+    parser.add_argument('--hrf', default=None, help='reference state')
+    parser.add_argument('--input', default=None,
+                        help="flash input pair (default 'tp')")
+    parser.add_argument('--columns', default=None,
+                        help='comma separated names of the input columns')
+    parser.add_argument('--outputs', default=None,
+                        help='comma separated refprop outputs')
+    parser.add_argument('--processes', type=int, default=None,
+                        help="no. of worker processes (default no. of cpu's)")
+    parser.add_argument('--chunksize', type=int, default=256,
+                        help='no. of states per worker task')
+    parser.add_argument('--timeout', type=float, default=None,
+                        help='time budget [s] per state')
+    parser.add_argument('--path', default=None, help='refprop root directory')
+    parser.add_argument('--checkpoint', default=None,
+                        help='checkpoint directory to resume an interrupted ' +
+                        'evaluation')
+    parser.add_argument('--dedup', action='store_true',
+                        help='calculate equal state points once (the ' +
+                        'outputs of the 65536 most recently used states ' +
+                        'are kept)')
+    args = parser.parse_args(argv)
+
+    def _split(value):
+        return value.split(',') if value != None else None
+    fluids, x = _split(args.fluids), _split(args.x)
+    if fluids == None and x != None:
+        parser.error('--x requires --fluids')
+    if x != None:
+        if len(x) != len(fluids):
+            parser.error('--x requires a mole fraction for each of the ' +
+                         str(len(fluids)) + ' fluids')
+        if len(set(fluids)) != len(fluids):
+            parser.error('--fluids should be unique')
+        try:
+            x = refprop.normalize([float(each) for each in x])['x']
+        except ValueError:
+            parser.error('--x should be numbers')
+    spec = loadspec(args.spec, fluids=fluids, x=x, hrf=args.hrf,
+                    input=args.input, columns=_split(args.columns),
+                    outputs=args.outputs)
+    summary = evaluate(spec, args.source, args.output, args.processes,
+                       args.chunksize, args.timeout, args.path,
+                       checkpoint=args.checkpoint, dedup=args.dedup)
+    sys.stderr.write(str(summary['rows']) + ' states, ' +
+                     str(summary['failed']) + ' failed, ' +
+                     '%.2f s, %.0f states/s\n' % (summary['time'],
+                                                   summary['rate']))
+    if args.dedup:
+        sys.stderr.write(str(summary['unique']) + ' unique states ' +
+                         'calculated\n')
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
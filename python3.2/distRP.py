@@ -0,0 +1,241 @@
+#-------------------------------------------------------------------------------
+#Name:            distRP
+#Purpose:         distribute refprop calculations over worker processes on
+#                 multiple hosts
+#
+#Author:          Thelen, B.J.
+#                 thelen_ben@yahoo.com
+#-------------------------------------------------------------------------------
+
+'''A multiRP.RPPool is limited to the cores of one host. This module adds a
+coordinator / worker mode over TCP:
+
+Workers run on any host with a local refprop installation (input "path", see
+refprop.setpath) and register with the coordinator:
+
+    python distRP.py coordinatorhost 6000 --authkey secret \
+        --path /usr/local/lib/refprop/
+
+The coordinator is a RPPool without local processes, its imap function is
+identical to RPPool.imap. Chunks are send to registered workers tagged with the
+setup key of their setup details. The chunk of a lost worker (crash, network
+failure) is send again to another worker.
+
+Tasks and results are send as pickles, anyone able to connect with the
+authentication key can run arbitrary code on the coordinator and the workers.
+Use a secret authkey (e.g. os.urandom(16).hex()) and listen on a trusted
+network only, the coordinator listens on localhost by default.
+
+    with Coordinator(('localhost', 6000), authkey=b'secret') as pool:
+        for prps in pool.imap(refprop.flsh, states, prop=H2O):
+            print(prps['D'])'''
+
+import os
+import socket
+import threading
+import multiprocessing as mp
+from multiprocessing.connection import Listener, Client, \
+    deliver_challenge, answer_challenge
+import multiRP
+
+#input declarations
+MultiRPError = multiRP.MultiRPError
+
+#Declarations
+#maximum time [s] of an authenticated connection to register its worker
+_registertime = 10.0
+
+#Classes
+class DistRPError(MultiRPError):
+    'Raise error on coordinator / worker failure'
+    def __init__(self, value):
+        self.value = value
+    def __str__(self):
+        return repr(self.value)
+
+
+class _RemoteWorker():
+    'registered worker process of a Coordinator'
+    def __init__(self, host, pid):
+        self.name = host + ':' + str(pid)
+    def join(self):
+        pass
+
+
+class Coordinator(multiRP.RPPool):
+    '''RPPool of which the workers register over TCP
+
+    input:
+        address--(host, port) to listen on for workers, ('', port) for all
+            interfaces
+        authkey--secret authentication key [bytes] shared with the workers
+            (required, the connection carries pickles)
+        timeout--maximum time [s] to wait for a worker to register when no
+            worker is available, None to wait indefinitely'''
+    def __init__(self, address=('localhost', 6000), authkey=None,
+                 timeout=None):
+        _checkauthkey(authkey)
+        self._init(0, None)
+        self.timeout = timeout
+        self._polltime = 1.0
+        self._joined = []
+        self._cond = threading.Condition()
+        self._authkey = authkey
+        #authenticated by _register, not by accept
+        self._listener = Listener(address, backlog=16)
+        self.address = self._listener.address
+        self._thread = threading.Thread(target=self._accept,
+                                        name='Coordinator')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _accept(self):
+        '''accept connecting workers, each is registered in its own thread,
+        a stalled connection does not block the others'''
+        while not self._closed:
+            try:
+                conn = self._listener.accept()
+            except Exception:
+                #listener closed
+                continue
+            thread = threading.Thread(target=self._register, args=(conn,),
+                                      name='Coordinator register')
+            thread.daemon = True
+            thread.start()
+
+    def _register(self, conn):
+        '''authenticate connection conn and register its worker, the
+        connection is closed when the worker does not register within
+        _registertime'''
+        try:
+            deliver_challenge(conn, self._authkey)
+            answer_challenge(conn, self._authkey)
+            if not conn.poll(_registertime):
+                raise DistRPError('no registration within ' +
+                                  str(_registertime) + ' s')
+            host, pid = conn.recv()
+        except Exception:
+            #failed authentication or registration
+            conn.close()
+            return
+        with self._cond:
+            if self._closed:
+                conn.close()
+                return
+            self._joined.append((conn, _RemoteWorker(host, pid)))
+            self._cond.notify_all()
+
+    def _spawn(self):
+        'workers are not spawned but register themselves'
+        pass
+
+    def _idle(self):
+        'add registered workers and return connections of idle workers'
+        with self._cond:
+            for conn, worker in self._joined:
+                self._workers[conn] = worker
+            self._joined = []
+        return multiRP.RPPool._idle(self)
+
+    def _waitworker(self):
+        'wait for a worker to register'
+        with self._cond:
+            while not self._joined:
+                if not self._cond.wait(self.timeout):
+                    raise DistRPError('no worker registered within ' +
+                                      str(self.timeout) + ' s')
+
+    def _lost(self, conn):
+        'remove lost worker of connection conn and return a description'
+        worker = self._workers.pop(conn)
+        conn.close()
+        return 'worker ' + worker.name + ' lost'
+
+    def _kill(self, conn):
+        '''remote workers can not be killed, the worker of connection conn
+        exceeding its time budget is told to stop after its task and the
+        connection is dropped, a result send later is discarded'''
+        try:
+            conn.send(None)
+        except (OSError, EOFError):
+            pass
+        conn.close()
+
+    def _lostchunk(self, chunk, description, timedout=False):
+        '''send chunk of a lost worker to another worker, chunks of timed out
+        workers are handled as in RPPool'''
+        if timedout or chunk[6]:
+            return multiRP.RPPool._lostchunk(self, chunk, description)
+        return 'retry', description
+
+    def workers(self):
+        'Return names (host:pid) of the registered workers'
+        self._idle()
+        return [worker.name for worker in self._workers.values()]
+
+    def close(self):
+        'Stop the registered workers and the listener'
+        multiRP.RPPool.close(self)
+        self._listener.close()
+        with self._cond:
+            for conn, worker in self._joined:
+                conn.close()
+            self._joined = []
+
+
+#functions
+def _checkauthkey(authkey):
+    'raise DistRPError on a missing authentication key'
+    if not authkey:
+        raise DistRPError('an authentication key (authkey) is required, ' +
+                          'the connection carries pickles')
+
+def worker(address, authkey=None, path=None):
+    '''Register at the coordinator on address and calculate the received
+    tasks untill the coordinator closes.
+
+    input:
+        address--(host, port) of the coordinator
+        authkey--authentication key [bytes] shared with the coordinator
+        path--refprop root directory (see refprop.setpath), None for default'''
+    _checkauthkey(authkey)
+    conn = Client(address, authkey=authkey)
+    conn.send((socket.gethostname(), os.getpid()))
+    try:
+        multiRP._serve(conn, path)
+    finally:
+        conn.close()
+
+def startworkers(address, processes=None, authkey=None, path=None):
+    '''Start worker processes on this host registering at the coordinator on
+    address.
+
+    output:
+        list of started processes'''
+    _checkauthkey(authkey)
+    workers = []
+    for each in range(processes or mp.cpu_count()):
+        process = mp.Process(target=worker, args=(address, authkey, path))
+        process.daemon = True
+        process.start()
+        workers.append(process)
+    return workers
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(
+        description='start refprop workers registering at a coordinator')
+    parser.add_argument('host', help='coordinator host')
+    parser.add_argument('port', type=int, help='coordinator port')
+    parser.add_argument('--processes', type=int, default=None,
+                        help="no. of worker processes (default no. of cpu's)")
+    parser.add_argument('--path', default=None, help='refprop root directory')
+    parser.add_argument('--authkey', required=True,
+                        help='secret authentication key shared with the ' +
+                        'coordinator')
+    args = parser.parse_args()
+
+    for process in startworkers((args.host, args.port), args.processes,
+                                args.authkey.encode('ascii'), args.path):
+        process.join()
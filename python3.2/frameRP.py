@@ -0,0 +1,347 @@
+#-------------------------------------------------------------------------------
+#Name:            frameRP
+#Purpose:         columnar (struct-of-arrays) container for the outputs of
+#                 large refprop sweeps
+#
+#Author:          Thelen, B.J.
+#                 thelen_ben@yahoo.com
+#-------------------------------------------------------------------------------
+
+'''Refprop functions return one dictionary per state, a sweep of millions of
+states as a list of dictionaries is slow to build and uses about 1 kB per
+state. A PropertyFrame preallocates one typed column per requested output
+(8 bytes per value, 4 with typecode 'f') and is filled in place:
+
+    frame = PropertyFrame(len(states), ('t', 'p', 'D', 'h', 's'), prop=H2O)
+    frame.fill(refprop.flsh('tp', t, p, [1]) for t, p in states)
+
+or directly from the workers of multiRP, which return only the requested
+columns:
+
+    frame = frameRP.imap('flsh', (('tp', t, p, [1]) for t, p in states),
+                         columns=('D', 'h', 'cp', 'w'), prop=H2O,
+                         rows=len(states))
+
+Columns are numpy arrays when numpy is installed and array.array otherwise,
+both are exported without copying to pandas (topandas) and pyarrow (toarrow)
+when those are installed.'''
+
+import array
+import refprop
+import multiRP
+
+#optional packages, columns fall back to array.array
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+#input declarations
+RefpropError = refprop.RefpropError
+
+#Declarations
+_columns = ('t', 'p', 'D', 'h', 's', 'q', 'cp', 'w', 'eta', 'tcx')
+_nan = float('nan')
+#ierr of a row failed by an exception (e.g. a failed worker or timeout),
+#positive as the refprop errors, refprop warnings are negative
+_failedierr = 999
+
+#Classes
+class PropertyFrameError(RefpropError):
+    'Raise error on invalid PropertyFrame input or usage'
+    def __init__(self, value):
+        self.value = value
+    def __str__(self):
+        return repr(self.value)
+
+
+class PropertyFrame():
+    '''Preallocated typed columns of refprop outputs, one row per state.
+    Unfilled values are nan, column ierr holds the refprop error number of
+    each row (999 for a row failed by an exception, see errors).
+
+    input:
+        rows--no. of preallocated rows, the frame grows when rows beyond are
+            filled
+        columns--names of the refprop outputs to store (e.g. 't', 'D', 'h',
+            'cp', 'eta')
+        prop--setup details (standard dictionary output from refprop
+            functions) of the stored states
+        typecode--'d' for double or 'f' for single precision columns'''
+    def __init__(self, rows=0, columns=_columns, prop=None, typecode='d'):
+        if rows < 0:
+            raise PropertyFrameError('rows should be >= 0')
+        if typecode not in ('d', 'f'):
+            raise PropertyFrameError('typecode should be "d" or "f"')
+        columns = tuple(columns)
+        if 'ierr' in columns or len(set(columns)) != len(columns):
+            raise PropertyFrameError('columns should be unique and exclude ' +
+                                     '"ierr"')
+        self.columns = columns
+        self.prop = refprop.setup_details(prop) if prop != None else None
+        self.typecode = typecode
+        self.errors = {} #row: error message of failed rows
+        self._rows = rows
+        self._filled = 0 #highest filled row + 1
+        self._data = {}
+        for column in columns:
+            self._data[column] = _alloc(rows, typecode, _nan)
+        self._data['ierr'] = _alloc(rows, 'i', 0)
+
+    def __len__(self):
+        return self._rows
+
+    def __getitem__(self, column):
+        'Return column (numpy array or array.array) of output column'
+        try:
+            return self._data[column]
+        except KeyError:
+            raise PropertyFrameError('no column "' + str(column) + '" in ' +
+                                     'PropertyFrame')
+
+    def __contains__(self, column):
+        return column in self._data
+
+    def keys(self):
+        '''Return names of the output columns (without ierr), dict(frame)
+        is the mapping of the output columns. A frame of len(t) rows is
+        accepted as input out of refprop.thermbatch and statebatch, which
+        fill the columns in place and return the errors (ierr, errors and
+        the filled rows of trim are not updated).'''
+        return self.columns
+
+    def __iter__(self):
+        'iterate rows as dictionaries'
+        for row in range(self._rows):
+            yield self.row(row)
+
+    def nbytes(self):
+        'Return memory usage [bytes] of the columns'
+        return sum(_nbytes(column) for column in self._data.values())
+
+    def resize(self, rows):
+        '''Grow or truncate the frame to rows, added rows are unfilled'''
+        if rows < 0:
+            raise PropertyFrameError('rows should be >= 0')
+        for column, data in self._data.items():
+            if column == 'ierr':
+                self._data[column] = _resize(data, rows, 'i', 0)
+            else:
+                self._data[column] = _resize(data, rows, self.typecode, _nan)
+        for row in [row for row in self.errors if row >= rows]:
+            del self.errors[row]
+        self._rows = rows
+        self._filled = min(self._filled, rows)
+
+    def trim(self):
+        '''Truncate the frame after the highest filled row'''
+        self.resize(self._filled)
+
+    def setrow(self, row, prps):
+        '''Fill row with the outputs of refprop output prps (standard
+        dictionary), the stored column values, ierr and herr of tuple prps
+        (see frameRP.imap) or an exception (failed row).'''
+        if row >= self._rows:
+            #grow by doubling to keep appending rows linear
+            self.resize(max(2 * self._rows, row + 1, 64))
+        if row >= self._filled:
+            self._filled = row + 1
+        data = self._data
+        if prps.__class__ is tuple:
+            for column, value in zip(self.columns, prps):
+                data[column][row] = _nan if value == None else value
+            data['ierr'][row] = prps[-2]
+            if prps[-2]:
+                self.errors[row] = prps[-1]
+        elif isinstance(prps, Exception):
+            for column in self.columns:
+                data[column][row] = _nan
+            data['ierr'][row] = _failedierr
+            self.errors[row] = str(prps)
+        else:
+            for column in self.columns:
+                value = prps.get(column)
+                data[column][row] = _nan if value == None else value
+            data['ierr'][row] = prps.get('ierr') or 0
+            if prps.get('ierr'):
+                self.errors[row] = prps.get('herr')
+
+    def fill(self, outputs, start=0, indexed=False):
+        '''Fill rows from start with the refprop outputs of iterable outputs
+        (e.g. a generator, multiRP.imap or a list from aioRP.batch).
+
+        input:
+            indexed--outputs are tuples (index, output) as streamed by imap
+                with ordered=False, filling row start + index
+        output:
+            no. of filled rows'''
+        count = 0
+        rows = self._rows
+        if indexed:
+            for index, prps in outputs:
+                self.setrow(start + index, prps)
+                count += 1
+        else:
+            for prps in outputs:
+                self.setrow(start + count, prps)
+                count += 1
+        if self._rows > rows:
+            #drop the unfilled rows of growing
+            self.resize(max(rows, self._filled))
+        return count
+
+    def row(self, row):
+        '''Return row as standard dictionary (setup details and the stored
+        outputs)'''
+        if not -self._rows <= row < self._rows:
+            raise PropertyFrameError('row ' + str(row) + ' out of range')
+        prps = dict(self.prop) if self.prop != None else {}
+        for column, data in self._data.items():
+            prps[column] = data[row]
+        if row in self.errors:
+            prps['herr'] = self.errors[row]
+        return prps
+
+    def tonumpy(self):
+        '''Return dictionary of numpy arrays of the columns, array.array
+        columns are wrapped without copying'''
+        if numpy == None:
+            raise PropertyFrameError('tonumpy requires numpy')
+        return dict((column, _asnumpy(data)) for column, data in
+                    self._data.items())
+
+    def topandas(self):
+        '''Return pandas.DataFrame of the columns (without copying)'''
+        try:
+            import pandas
+        except ImportError:
+            raise PropertyFrameError('topandas requires pandas')
+        return pandas.DataFrame(self.tonumpy(), copy=False)
+
+    def toarrow(self):
+        '''Return pyarrow.Table of the columns (without copying), the setup
+        details are stored in the schema metadata'''
+        try:
+            import pyarrow
+        except ImportError:
+            raise PropertyFrameError('toarrow requires pyarrow')
+        arrays, names = [], []
+        for column, data in self._data.items():
+            names.append(column)
+            arrays.append(_asarrow(pyarrow, data))
+        metadata = None
+        if self.prop != None:
+            metadata = {'prop':repr(self.prop)}
+        return pyarrow.Table.from_arrays(arrays, names, metadata=metadata)
+
+    @classmethod
+    def fromoutputs(cls, outputs, columns=_columns, prop=None, typecode='d'):
+        '''Return PropertyFrame filled with the refprop outputs of list
+        outputs, prop defaults to the setup details of the first output'''
+        if prop == None and outputs and outputs[0].__class__ is dict:
+            prop = outputs[0]
+        frame = cls(len(outputs), columns, prop, typecode)
+        frame.fill(outputs)
+        return frame
+
+
+class _Columns():
+    '''picklable wrapper of a refprop function returning only the values of
+    columns, ierr and herr (None for ierr 0) as tuple, keeps the results send
+    by the workers small'''
+    def __init__(self, routine, columns):
+        self.routine = routine
+        self.columns = columns
+        self.__name__ = getattr(routine, '__name__', str(routine))
+
+    def __call__(self, *args):
+        prps = multiRP._rpfunction(self.routine)(*args)
+        ierr = prps.get('ierr') or 0
+        return tuple(prps.get(column) for column in self.columns) + (
+            ierr, prps.get('herr') if ierr else None)
+
+
+#functions
+def _alloc(rows, typecode, value):
+    'return column of rows values'
+    if numpy != None:
+        return numpy.full(rows, value, typecode)
+    return array.array(typecode, [value]) * rows
+
+def _resize(data, rows, typecode, value):
+    'return column data grown or truncated to rows'
+    if rows <= len(data):
+        return data[:rows].copy() if numpy != None else data[:rows]
+    if numpy != None:
+        return numpy.concatenate((data, numpy.full(rows - len(data), value,
+                                                   typecode)))
+    data.extend(array.array(typecode, [value]) * (rows - len(data)))
+    return data
+
+def _nbytes(data):
+    'return memory usage [bytes] of column data'
+    if numpy != None:
+        return data.nbytes
+    return data.itemsize * len(data)
+
+def _asnumpy(data):
+    'return column data as numpy array, without copying'
+    if data.__class__ is array.array:
+        return numpy.frombuffer(data, data.typecode)
+    return data
+
+def _asarrow(pyarrow, data):
+    'return column data as pyarrow array, without copying'
+    if data.__class__ is array.array:
+        types = {'d':pyarrow.float64(), 'f':pyarrow.float32(),
+                 'i':pyarrow.int32()}
+        return pyarrow.Array.from_buffers(types[data.typecode], len(data),
+                                          [None, pyarrow.py_buffer(data)])
+    return pyarrow.array(data)
+
+def imap(routine, iterable, columns=_columns, prop=None, rows=None,
+         typecode='d', chunksize=256, pool=None, order=False, **kwargs):
+    '''Return PropertyFrame of routine(*args) for each args of iterable,
+    calculated on the workers of pool (multiRP.RPPool, or a temporary pool).
+    The workers return only the values of columns and results are written to
+    their row on arrival (no reordering buffer).
+
+    input:
+        routine--refprop function (name, refprop or multiRP function)
+        iterable--(lazy) iterable of input tuples of routine
+        columns, prop, typecode--see PropertyFrame
+        rows--no. of preallocated rows (default len(iterable) if available),
+            the frame is trimmed to the no. of inputs
+        chunksize--no. of inputs per task send to a worker
+        pool--multiRP.RPPool (or distRP.Coordinator), None for a temporary
+            pool
+        order--send the inputs in Hilbert curve order of their numeric
+            arguments (see refprop.curveorder), neighbouring states are
+            calculated in sequence on a worker, rows stay in input order.
+            The whole iterable is read into memory to be sorted
+        **kwargs--further input of RPPool.imap (maxinflight, timeout,
+            skiperrors, dedup) or multiRP.imap (processes, path)'''
+    if routine.__class__ is not str:
+        routine = multiRP._rpfunction(routine)
+    permutation = None
+    if order:
+        iterable = [args if args.__class__ is tuple else (args,) for args in
+                    iterable]
+        if iterable:
+            permutation = refprop.curveorder(list(zip(*iterable)))
+            iterable = [iterable[each] for each in permutation]
+    if rows == None:
+        rows = len(iterable) if hasattr(iterable, '__len__') else 0
+    frame = PropertyFrame(rows, columns, prop, typecode)
+    func = _Columns(routine, frame.columns)
+    if pool == None:
+        outputs = multiRP.imap(func, iterable, prop, chunksize, False,
+                               **kwargs)
+    else:
+        outputs = pool.imap(func, iterable, prop, chunksize, False, **kwargs)
+    if permutation != None:
+        #scatter back to the input rows
+        outputs = ((permutation[index], prps) for index, prps in outputs)
+    frame.fill(outputs, indexed=True)
+    frame.trim()
+    return frame
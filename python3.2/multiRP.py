@@ -35,6 +35,8 @@ import sys
 import refprop
 import time
 import multiprocessing as mp
+from itertools import islice
+from collections import deque, OrderedDict
 from decimal import Decimal
 
 #input declarations
@@ -47,6 +49,10 @@ RefproproutineError = refprop.RefproproutineError
 RefpropWarning = refprop.RefpropWarning
 RefpropdllWarning = refprop.RefpropdllWarning
 
+#Declarations
+#no. of most recently used unique inputs of which dedup keeps the output
+_dedupkeys = 65536
+
 #Classes
 class _MultiRefProp(mp.Process):
     '''initiate multiprocessing for refprop,
@@ -85,6 +91,322 @@ class MultiRPChildError(MultiRPError):
     def __str__(self):
         return repr(self.value)
 
+class TaskError(MultiRPError):
+    '''Failed input of RPPool.imap with skiperrors, yielded in place of the
+    output. value is the raised error or crash / timeout description, inputs
+    the input tuple that caused it'''
+    def __init__(self, value, inputs):
+        self.value = value
+        self.inputs = inputs
+    def __str__(self):
+        return repr(self.value)
+
+class RPPool():
+    '''Pool of refprop worker processes streaming results of chunked tasks.
+
+    Each worker owns one end of a pipe, tasks (chunks of inputs) are sent to
+    idle workers and results are received as soon as a worker finishes its
+    chunk. Similar to "multirefprop" the pool is to be created under
+    "if __name__ == '__main__':". Requires python 3.3+ (the other multiRP
+    functions run on python 3.2).
+
+    The pool supervises its workers, a crashed worker or a worker exceeding
+    the time budget of its chunk (see imap input timeout) is killed and
+    respawned with the setup of the running imap loaded.
+
+    input:
+        processes--no. of worker processes (default no. of cpu's)
+        path--refprop root directory (see refprop.setpath), None for default'''
+    def __init__(self, processes=None, path=None):
+        if mp.current_process()._parent_pid != None:
+            raise MultiRPChildError(
+                'Only parent process can initiate a RPPool')
+        self._init(processes or mp.cpu_count(), path)
+        for each in range(self.processes):
+            self._spawn()
+
+    def _init(self, processes, path):
+        'set up the fields of the pool (shared with distRP.Coordinator)'
+        self.processes = processes
+        self.path = path
+        self._workers = {} #connection: process
+        self._busy = {} #connection: chunk
+        self._retry = [] #chunks to be send again
+        self._started = {} #connection: send time of chunk
+        self._closed = False
+        self._polltime = None #maximum wait for results before resubmitting
+        self._timeout = None #time budget [s] per input of running imap
+        self._warm = None #(prop, key) loaded in respawned workers
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _spawn(self):
+        'start a worker process'
+        conn, childconn = mp.Pipe()
+        worker = mp.Process(target=_serve, args=(childconn, self.path,
+                                                 self._warm))
+        worker.daemon = True
+        worker.start()
+        childconn.close()
+        self._workers[conn] = worker
+
+    def _idle(self):
+        'return connections of idle workers'
+        return [conn for conn in self._workers if conn not in self._busy]
+
+    def _waitworker(self):
+        'wait for a worker to become available (no worker is busy or idle)'
+        raise MultiRPChildError('RPPool has no worker processes')
+
+    def _send(self, conn, chunk):
+        '''send chunk (chunkid, start, routine, prop, key, argslist,
+        skiperrors) to worker'''
+        self._busy[conn] = chunk
+        self._started[conn] = time.time()
+        try:
+            conn.send((chunk[0],) + chunk[2:])
+        except (OSError, EOFError):
+            #worker lost before receiving the chunk
+            del self._busy[conn]
+            del self._started[conn]
+            self._retry.append(chunk)
+            self._lost(conn)
+
+    def _kill(self, conn):
+        'kill worker of connection conn exceeding its time budget'
+        self._workers[conn].terminate()
+
+    def _lost(self, conn):
+        '''remove worker of connection conn after a crash and return a
+        description'''
+        worker = self._workers.pop(conn)
+        conn.close()
+        worker.join()
+        self._spawn()
+        return 'child error in ' + worker.name + ' exitcode = ' + str(
+            worker.exitcode)
+
+    def _lostchunk(self, chunk, description, timedout=False):
+        '''return (status, output) of chunk of which the worker is lost
+        (crashed or timed out), status 'error' raises output, 'retry' sends
+        chunk again, 'split' sends the chunks of output instead and 'done'
+        returns output as result of the chunk.
+
+        With skiperrors the chunk is bisected untill the single input
+        causing the loss is found, which fails with a TaskError.'''
+        argslist = chunk[5]
+        if not chunk[6]:
+            return 'error', MultiRPChildError(description)
+        elif len(argslist) == 1:
+            return 'done', [TaskError(description, argslist[0])]
+        half = len(argslist) // 2
+        return 'split', [chunk[:5] + (argslist[:half], True),
+                         (chunk[0], chunk[1] + half) + chunk[2:5] +
+                         (argslist[half:], True)]
+
+    def _receive(self, timeout=None):
+        '''wait for finished chunks and return list of (chunk, status,
+        output) with status 'done', 'error' or 'retry'.'''
+        #python 3.3+, imported on use
+        from multiprocessing.connection import wait
+        finished = []
+        if self._timeout != None:
+            #wait no longer than the first time budget to expire
+            now = time.time()
+            for conn, chunk in self._busy.items():
+                remaining = max(self._started[conn] + self._timeout *
+                                len(chunk[5]) - now, 0)
+                if timeout == None or remaining < timeout:
+                    timeout = remaining
+        for conn in wait(list(self._busy), timeout):
+            chunk = self._busy.pop(conn)
+            del self._started[conn]
+            try:
+                chunkid, status, output = conn.recv()
+            except (OSError, EOFError):
+                status, output = self._lostchunk(chunk, self._lost(conn))
+            finished.append((chunk, status, output))
+        if self._timeout != None:
+            finished.extend(self._overdue())
+        return finished
+
+    def _overdue(self):
+        '''kill and respawn workers exceeding the time budget of their chunk,
+        return list of (chunk, status, output) of the killed workers'''
+        finished = []
+        now = time.time()
+        for conn, chunk in list(self._busy.items()):
+            budget = self._timeout * len(chunk[5])
+            if now - self._started[conn] < budget:
+                continue
+            del self._busy[conn]
+            del self._started[conn]
+            self._kill(conn)
+            description = self._lost(conn) + ', exceeded time budget of ' + \
+                str(budget) + ' s for ' + str(len(chunk[5])) + ' input(s)'
+            status, output = self._lostchunk(chunk, description, True)
+            finished.append((chunk, status, output))
+        return finished
+
+    def _drain(self):
+        'wait for all busy workers and discard their results'
+        self._retry = []
+        while self._busy:
+            self._receive()
+
+    def imap(self, func, iterable, prop=None, chunksize=64, ordered=True,
+             maxinflight=None, timeout=None, skiperrors=False, dedup=False):
+        '''Return generator streaming func(*args) for each args of iterable.
+
+        input:
+            func--refprop function (name, refprop or multiRP function) or
+                other picklable function
+            iterable--(lazy) iterable of input tuples of func, a non tuple
+                input is passed as single argument
+            prop--setup details (standard dictionary output from refprop
+                functions) func is calculated with, None for the setup loaded
+                in the workers
+            chunksize--no. of inputs per task send to a worker
+            ordered--True: yield outputs in order of iterable
+                False: yield tuples (index, output) in order of completion
+            maxinflight--maximum no. of chunks submitted or waiting to be
+                yielded (default 2 * no. of workers), this limits the memory usage
+                to maxinflight * chunksize inputs and outputs
+            timeout--time budget [s] per input, a worker exceeding the budget
+                of its chunk (timeout * no. of inputs) is killed and respawned.
+                None for no time budget
+            skiperrors--False: a failed input raises its error, a crashed or
+                killed worker raises MultiRPChildError
+                True: a failed input yields a TaskError (with the inputs) in
+                place of its output and the remaining inputs are calculated,
+                chunks of crashed or killed workers are bisected to find the
+                failing input
+            dedup--True: equal inputs are calculated once, the output is
+                repeated for each duplicate. The outputs of the 65536
+                (_dedupkeys) most recently used unique inputs are kept, an
+                older duplicate is calculated again. A dictionary also
+                receives the statistics inputs, unique and duplicates (added
+                to the values of previous calls)'''
+        if dedup.__class__ is dict or dedup:
+            mapper = lambda inputs: self.imap(func, inputs, prop, chunksize,
+                                              ordered, maxinflight, timeout,
+                                              skiperrors)
+            for each in _dedupmap(mapper, iterable, ordered, dedup):
+                yield each
+            return
+        if self._closed:
+            raise MultiRPInputError('RPPool is closed')
+        if chunksize < 1:
+            raise MultiRPInputError('chunksize should be >= 1')
+        if timeout != None and timeout <= 0:
+            raise MultiRPInputError('timeout should be > 0')
+        if func.__class__ is not str and getattr(
+                func, '__module__', None) == __name__:
+            func = func.__name__
+        #tag chunks with the setup key, workers skip resetup on equal keys
+        key = refprop._setupkey(prop)
+        #lazy chunks of (chunkid, start index, routine, prop, key, argslist,
+        #skiperrors)
+        def chunks():
+            inputs = iter(iterable)
+            chunkid = 0
+            while True:
+                argslist = [args if args.__class__ is tuple else (args,)
+                            for args in islice(inputs, chunksize)]
+                if not argslist:
+                    return
+                yield (chunkid, chunkid * chunksize, func, prop, key, argslist,
+                       skiperrors)
+                chunkid += 1
+        pending = chunks()
+        exhausted = False
+        buffer = {} #finished chunks waiting to be yielded (ordered only)
+        nextid = 0 #next chunkid to be yielded (ordered only)
+        parts = {} #chunkid: [no. of parts pending, {start: output}]
+        inflight = 0
+        self._timeout = timeout
+        self._warm = (prop, key) if key != None else None
+        try:
+            while True:
+                #submit chunks to idle workers, chunks to retry first
+                idle = self._idle()
+                while idle and self._retry:
+                    self._send(idle.pop(), self._retry.pop(0))
+                limit = maxinflight or 2 * max(len(self._workers), 1)
+                while idle and not exhausted and inflight < limit:
+                    chunk = next(pending, None)
+                    if chunk == None:
+                        exhausted = True
+                        break
+                    self._send(idle.pop(), chunk)
+                    inflight += 1
+                if not self._busy:
+                    if self._retry:
+                        self._waitworker()
+                        continue
+                    if not buffer:
+                        if exhausted:
+                            return
+                        if not self._workers:
+                            self._waitworker()
+                        continue
+                for chunk, status, output in self._receive(self._polltime):
+                    if status == 'error':
+                        raise output
+                    elif status == 'retry':
+                        self._retry.append(chunk)
+                        continue
+                    elif status == 'split':
+                        #bisected chunk, collect the outputs of its parts
+                        parts.setdefault(chunk[0], [1, {}])[0] += \
+                            len(output) - 1
+                        self._retry[:0] = output
+                        continue
+                    if chunk[0] in parts:
+                        part = parts[chunk[0]]
+                        part[1][chunk[1]] = output
+                        part[0] -= 1
+                        if part[0]:
+                            continue
+                        del parts[chunk[0]]
+                        starts = sorted(part[1])
+                        chunk = (chunk[0], starts[0])
+                        output = [prps for start in starts for prps in
+                                  part[1][start]]
+                    if ordered:
+                        buffer[chunk[0]] = output
+                    else:
+                        inflight -= 1
+                        for index, prps in enumerate(output):
+                            yield chunk[1] + index, prps
+                while nextid in buffer:
+                    output = buffer.pop(nextid)
+                    nextid += 1
+                    inflight -= 1
+                    for prps in output:
+                        yield prps
+        finally:
+            self._drain()
+            self._timeout = None
+            self._warm = None
+
+    def close(self):
+        'Stop the worker processes'
+        self._drain()
+        for conn in self._workers:
+            try:
+                conn.send(None)
+            except (OSError, EOFError):
+                pass
+        for conn, worker in self._workers.items():
+            worker.join()
+            conn.close()
+        self._workers = {}
+        self._closed = True
 
 #Classes from refprop.py
 class FluidModel(refprop.FluidModel):
@@ -303,6 +625,187 @@ def _checksetupblock(name): ####################################################
             'function "' + str(name) +
             '" is blocked while multiRP child processes are active')
 
+def _rpfunction(routine):
+    '''return refprop function for routine (name, refprop or multiRP function
+    or any other callable)'''
+    if routine.__class__ is str:
+        func = getattr(refprop, routine, None)
+        if func == None or routine.startswith('_'):
+            raise MultiRPInputError('unknown refprop function "' +
+                                    routine + '"')
+        return func
+    elif getattr(routine, '__module__', None) == __name__:
+        #multiRP wrappers require mRP, use the refprop function instead
+        return getattr(refprop, routine.__name__)
+    elif callable(routine):
+        return routine
+    raise MultiRPInputError('expect "str" or function input for routine ' +
+                            'instead of "' + str(routine.__class__) + '"')
+
+def _runtask(routine, prop, argslist, skiperrors=False):
+    '''worker side of a task, resetup to prop (if not None) and return the
+    list of routine outputs for each args in argslist. With skiperrors a
+    failed input returns a TaskError instead of raising.'''
+    func = _rpfunction(routine)
+    if prop != None:
+        refprop.resetup(prop)
+    if not skiperrors:
+        return [func(*args) for args in argslist]
+    output = []
+    for args in argslist:
+        try:
+            output.append(func(*args))
+        except Exception as exc:
+            output.append(TaskError(exc, args))
+    return output
+
+def _serve(conn, path, warm=None):
+    '''worker process of RPPool, run received tasks untill None is received.
+    The setup key of each task is compared to the loaded one to skip the
+    resetup. warm is (prop, key) of the setup loaded at start (respawned
+    workers).'''
+    if path != None:
+        refprop.setpath(path)
+    loadedkey = None
+    if warm != None:
+        try:
+            refprop.resetup(warm[0])
+            loadedkey = warm[1]
+        except Exception:
+            #the setup error is raised by the first task
+            pass
+    while True:
+        try:
+            task = conn.recv()
+        except (OSError, EOFError):
+            return
+        if task == None:
+            return
+        chunkid, routine, prop, key, argslist, skiperrors = task
+        try:
+            if key != None and key == loadedkey:
+                prop = None
+            #routine with prop None could change setup
+            loadedkey = None
+            output = ('done', _runtask(routine, prop, argslist, skiperrors))
+            loadedkey = key
+        except Exception as exc:
+            output = ('error', exc)
+        try:
+            conn.send((chunkid,) + output)
+        except Exception as exc:
+            #unpicklable output
+            conn.send((chunkid, 'error', MultiRPChildError(repr(exc))))
+
+def imap(func, iterable, prop=None, chunksize=64, ordered=True,
+         maxinflight=None, processes=None, path=None, timeout=None,
+         skiperrors=False, dedup=False):
+    '''Return generator streaming func(*args) for each args of iterable,
+    calculated on a temporary RPPool (see RPPool.imap). Memory usage is
+    limited to maxinflight * chunksize inputs and outputs.
+
+    example:
+        for prps in imap(refprop.flsh, (('tp', t, p, [1]) for t, p in
+                         states), prop=H2O, chunksize=100):
+            print(prps['D'])'''
+    with RPPool(processes, path) as pool:
+        for each in pool.imap(func, iterable, prop, chunksize, ordered,
+                              maxinflight, timeout, skiperrors, dedup):
+            yield each
+
+def _inputkey(args):
+    'return hashable key of input args, None for unhashable inputs'
+    key = tuple(tuple(each) if each.__class__ is list else each for each in
+                args) if args.__class__ is tuple else args
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+def _dedupmap(mapper, iterable, ordered, dedup):
+    '''return generator of the outputs of mapper (an imap on an iterable of
+    inputs) for each input of iterable, calculating equal inputs once. Only
+    the outputs of the _dedupkeys most recently used unique inputs are kept,
+    an older input is calculated again. The statistics are added to dedup if
+    it is a dictionary.'''
+    stats = dedup if dedup.__class__ is dict else {}
+    for name in ('inputs', 'unique', 'duplicates'):
+        stats.setdefault(name, 0)
+    seen = OrderedDict() #input key: unique index, least recently used first
+    sequence = deque() #(index, unique index) of the consumed inputs
+    live = set() #unique indices of seen
+    results = {} #unique index: output, while in seen or in sequence
+    pending = {} #unique index: no. of its entries in sequence
+    counter = [0] #no. of unique indices
+    def unique():
+        for index, args in enumerate(iterable):
+            key = _inputkey(args)
+            number = seen.get(key) if key != None else None
+            stats['inputs'] += 1
+            if number == None:
+                number = counter[0]
+                counter[0] += 1
+                if key != None:
+                    seen[key] = number
+                    live.add(number)
+                    if len(seen) > _dedupkeys:
+                        oldest = seen.popitem(False)[1]
+                        live.discard(oldest)
+                        release(oldest)
+                stats['unique'] += 1
+                pending[number] = 1
+                sequence.append((index, number))
+                yield args
+            else:
+                seen.move_to_end(key)
+                stats['duplicates'] += 1
+                pending[number] += 1
+                sequence.append((index, number))
+
+    def release(number):
+        'drop the output of unique index number when no longer needed'
+        if number not in live and not pending.get(number):
+            pending.pop(number, None)
+            results.pop(number, None)
+
+    def take():
+        'pop the next input of sequence, return (index, output)'
+        index, number = sequence.popleft()
+        output = results[number]
+        pending[number] -= 1
+        release(number)
+        return index, output
+
+    if ordered:
+        #outputs of unique inputs arrive in order, duplicates refer back
+        received = 0
+        for output in mapper(unique()):
+            results[received] = output
+            received += 1
+            while sequence and sequence[0][1] < received:
+                yield take()[1]
+        while sequence:
+            yield take()[1]
+        return
+    #unordered, the positions of mapper are the unique indices
+    waiting = {} #unique index: indices of the inputs waiting for its output
+    for number, output in mapper(unique()):
+        results[number] = output
+        while sequence:
+            index, each = sequence[0]
+            if each in results:
+                yield take()
+            else:
+                sequence.popleft()
+                waiting.setdefault(each, []).append(index)
+        for index in waiting.pop(number, ()):
+            pending[number] -= 1
+            yield index, output
+        release(number)
+    while sequence:
+        yield take()
+
 
 #functions from refprop.py
 def setpath(path='c:/program files/refprop/'):
@@ -313,6 +816,78 @@ def fluidlib():
     '''Displays all fluids and mixtures available on root directory.'''
     refprop.fluidlib()
 
+def fluidindex(rebuild=False):
+    '''Returns index of the fluid library parsed from the fluid file headers'''
+    return refprop.fluidindex(rebuild)
+
+def findfluid(name):
+    '''Returns index record of fluid or mixture name or alias'''
+    return refprop.findfluid(name)
+
+def constants(fluid=None):
+    '''Returns fluid constants from the constants table (see
+    refprop.constants)'''
+    return refprop.constants(fluid)
+
+def buildconstants(rebuild=False, processes=None, chunksize=4):
+    '''Calculate the constants table (see refprop.constants) in parallel on
+    a RPPool for the fluids which are new or of which the fluid file has
+    changed. To be called under "if __name__ == '__main__':".
+
+    input:
+        rebuild--True: recalculate all fluids
+        processes--no. of worker processes (default no. of cpu's)
+        chunksize--no. of fluids per task send to a worker
+    output:
+        no. of calculated fluids'''
+    stale = refprop._staleconstants(rebuild)
+    if stale:
+        with RPPool(processes, refprop._fpath or None) as pool:
+            records = list(pool.imap(refprop._fluidconstants, stale,
+                                     chunksize=chunksize, skiperrors=True))
+        #fluids crashing a worker are stored with the error
+        for each, record in enumerate(records):
+            if record.__class__ is TaskError:
+                records[each] = refprop._constantsrecord(stale[each], {},
+                                                         str(record))
+        refprop._storeconstants(records)
+    return len(stale)
+
+def phase_envelopes(compositions, pmin=10, tol=0.005, maxstep=0.1,
+                    minstep=1e-4, maxpoints=500, prop=None, processes=None,
+                    chunksize=1, pool=None, skiperrors=True):
+    '''Trace the phase envelopes (see refprop.phase_envelope) of many
+    compositions in parallel on the workers of pool (RPPool, or a temporary
+    pool). Equal compositions are traced once, the envelopes are cached by
+    the workers for further calls on the same pool.
+
+    input:
+        compositions--list of compositions [array of mol frac]
+        prop--setup details (standard dictionary output from refprop
+            functions), None for the setup loaded in this process
+        skiperrors--return a TaskError for compositions failing to trace
+    output:
+        list of phase_envelope outputs in the order of compositions'''
+    if prop == None:
+        #the workers load the setup of this process
+        if refprop._setupprop == {}:
+            raise MultiRPInputError('phase_envelopes requires prop or a ' +
+                                    'loaded setup')
+        prop = refprop.setup_setting()
+    unique = {}
+    for x in compositions:
+        unique.setdefault(tuple(x), len(unique))
+    args = [(list(x), pmin, tol, maxstep, minstep, maxpoints) for x in
+            sorted(unique, key=unique.get)]
+    if pool == None:
+        outputs = list(imap(refprop.phase_envelope, args, prop, chunksize,
+                            skiperrors=skiperrors, processes=processes,
+                            path=refprop._fpath or None))
+    else:
+        outputs = list(pool.imap(refprop.phase_envelope, args, prop,
+                                 chunksize, skiperrors=skiperrors))
+    return [outputs[unique[tuple(x)]] for x in compositions]
+
 def normalize(x):
     '''Normalize the sum of list x value's to 1'''
     return refprop.normalize(x)
@@ -330,6 +905,22 @@ def setup_details(prop):
     '''Returns basic setup details.'''
     return refprop.setup_details(prop)
 
+def refoffset(hrf, x0=[1], h0=0, s0=0, t0=273, p0=100, prop=None, mRP=None):
+    '''Returns the enthalpy and entropy offsets to reference state hrf'''
+    def _rpfunc():
+        return refprop.refoffset(hrf, x0, h0, s0, t0, p0)
+    return _rpfunc_handler(prop, mRP, _rpfunc)
+
+def applyref(prop, hrf, x0=None, h0=0, s0=0, t0=273, p0=100, mRP=None):
+    '''Returns copy of prop converted to reference state hrf'''
+    def _rpfunc():
+        return refprop.applyref(prop, hrf, x0, h0, s0, t0, p0)
+    return _rpfunc_handler(prop, mRP, _rpfunc)
+
+def fingerprint(prop=None):
+    '''Returns fingerprint of the setup details (see refprop.fingerprint)'''
+    return refprop.fingerprint(prop)
+
 def getphase(prop, mRP=None):
     '''Return fluid phase'''
     def _rpfunc():
@@ -851,6 +1442,41 @@ def trnprp(t, D, x, prop=None, mRP=None):
         return refprop.trnprp(t, D, x)
     return _rpfunc_handler(prop, mRP, _rpfunc)
 
+def thermbatch(t, D, x, routines=('therm',), outputs=None, order=False,
+               dedup=False, prop=None, mRP=None):
+    '''Compute the outputs of therm, therm2, therm3, trnprp and / or dielec
+    for each pair of t[i], D[i] at composition x.'''
+    def _rpfunc():
+        return refprop.thermbatch(t, D, x, routines, outputs, None, order,
+                                  dedup)
+    return _rpfunc_handler(prop, mRP, _rpfunc)
+
+def state(routine, var1, var2, x, outputs=('t', 'p', 'D', 'h', 's'), kph=1,
+          prop=None, mRP=None):
+    '''Flash calculation returning only the requested outputs with the
+    minimum set of library calls.'''
+    def _rpfunc():
+        return refprop.state(routine, var1, var2, x, outputs, kph)
+    return _rpfunc_handler(prop, mRP, _rpfunc)
+
+def statebatch(routine, var1, var2, x, outputs=('t', 'p', 'D', 'h', 's'),
+               kph=1, order=False, dedup=False, prop=None, mRP=None):
+    '''Array variant of state, for each pair of var1[i], var2[i] at
+    composition x.'''
+    def _rpfunc():
+        return refprop.statebatch(routine, var1, var2, x, outputs, kph,
+                                  None, order, dedup)
+    return _rpfunc_handler(prop, mRP, _rpfunc)
+
+def phase_envelope(x, pmin=10, tol=0.005, maxstep=0.1, minstep=1e-4,
+                   maxpoints=500, prop=None, mRP=None):
+    '''Trace the phase envelope (bubble and dew curve) of composition x by
+    continuation.'''
+    def _rpfunc():
+        return refprop.phase_envelope(x, pmin, tol, maxstep, minstep,
+                                      maxpoints)
+    return _rpfunc_handler(prop, mRP, _rpfunc)
+
 def getktv(icomp, jcomp, prop=None, mRP=None):
     '''Retrieve mixture model and parameter info for a specified binary.'''
     def _rpfunc():
@@ -1025,3 +1651,8 @@ if __name__ == '__main__':
     while mRP['ppipe'].poll():#parentpipe
         #print value from pipe
         print(mRP['ppipe'].recv())
+
+    #stream results of a sweep with imap (alternative to the pipe above)
+    for prps in imap(press, ((303 + each, 58, [0.4, 0.6]) for each in
+                             range(100)), H2O_NH3, chunksize=10):
+        print(prps['p'])
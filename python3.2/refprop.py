@@ -70,16 +70,25 @@ surface Tension                     N/m
 ----------------------------------------------------------------------------
 '''
 #imports
-from fnmatch import fnmatch
-from os import listdir, path
-from platform import system
+#hashlib, pickle and decimal are imported on first use, this keeps
+#the import of refprop fast (short lived worker processes and scripts)
+import sys
+from os import listdir, path, makedirs, stat
 from copy import copy
-from decimal import Decimal
-if system() == 'Linux':
+from math import exp, log, floor, isfinite
+from collections import OrderedDict
+if sys.platform.startswith('linux'):
+    _system = 'Linux'
+elif sys.platform == 'win32':
+    _system = 'Windows'
+else:
+    from platform import system
+    _system = system()
+if _system == 'Linux':
     from ctypes import (
         c_long, create_string_buffer, c_double, c_char, byref, RTLD_GLOBAL,
-        CDLL)
-elif system() == 'Windows':
+        RTLD_LOCAL, CDLL)
+elif _system == 'Windows':
     from ctypes import (
         c_long, create_string_buffer, c_double, c_char, byref, RTLD_GLOBAL, 
         windll)
@@ -87,6 +96,76 @@ elif system() == 'Windows':
 
 
 #Declarations
+class _Setupdict(dict):
+    '''dict of setup state (_setupprop, _set), any change invalidates the
+    fingerprint of the loaded setup. Lists and dicts are stored read only
+    (_Frozenlist, _Frozendict), the outputs share them without copying and a
+    nested change (e.g. prop['hfld'].append) can not change the setup state
+    unnoticed'''
+    def __init__(self, *args, **kwargs):
+        _setupchanged()
+        dict.__init__(self)
+        self.update(*args, **kwargs)
+    def __setitem__(self, key, value):
+        _setupchanged()
+        dict.__setitem__(self, key, _freeze(value))
+    def __delitem__(self, key):
+        _setupchanged()
+        dict.__delitem__(self, key)
+    def pop(self, *args):
+        _setupchanged()
+        return dict.pop(self, *args)
+    def popitem(self):
+        _setupchanged()
+        return dict.popitem(self)
+    def setdefault(self, key, value=None):
+        _setupchanged()
+        return dict.setdefault(self, key, _freeze(value))
+    def update(self, *args, **kwargs):
+        _setupchanged()
+        for key, value in dict(*args, **kwargs).items():
+            dict.__setitem__(self, key, _freeze(value))
+    def clear(self):
+        _setupchanged()
+        dict.clear(self)
+
+def _readonly(self, *args, **kwargs):
+    raise TypeError('setup details are read only, change a copy (e.g. ' +
+                    'list(value) or dict(value))')
+
+class _Frozenlist(list):
+    'read only list of a setup value, equal to and printed as a list'
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = append = extend = \
+        insert = pop = remove = clear = sort = reverse = _readonly
+    def __reduce__(self):
+        return _Frozenlist, (list(self),)
+
+class _Frozendict(dict):
+    'read only dict of a setup value, equal to and printed as a dict'
+    __setitem__ = __delitem__ = pop = popitem = setdefault = update = \
+        clear = _readonly
+    def __reduce__(self):
+        return _Frozendict, (dict(self),)
+
+def _freeze(value):
+    '''return read only version of a (nested) list, tuple or dict setup
+    value'''
+    if isinstance(value, (list, tuple)):
+        frozen = [_freeze(each) for each in value]
+        return tuple(frozen) if value.__class__ is tuple else \
+            _Frozenlist(frozen)
+    if isinstance(value, dict):
+        return _Frozendict((key, _freeze(each)) for key, each in
+                           value.items())
+    return value
+
+def _setupchanged():
+    '''invalidate fingerprint of the loaded setup, this module instance sets
+    up the shared library'''
+    global _fingerprint
+    _fingerprint = None
+    _libraryowner[0] = globals()
+
 #strings
 testresult = ''
 _setwarning = 'on'
@@ -94,22 +173,81 @@ _seterror = 'on'
 _seterrordebug = 'off'
 _setinputerrorcheck = 'on'
 _fpath = ''
+_private = False #load a private copy of the shared library (RefpropSession)
+_privatecopy = None #file of the loaded private library copy (Windows)
+_cachedir = path.join(path.expanduser('~'), '.refprop', '')
+
+#globals of the module instance (refprop or a non private RefpropSession)
+#which last changed the setup of the shared library
+_libraryowner = [None]
 
 #Dict
 _fldext = {}
-_setupprop = {}
-_set = {}
+_setupdetails = {}
+_fldindex = {}
+#setup details shared (by identity) by the outputs of the loaded setup
+_detailkeys = ('setmod', 'gerg04', 'hrf', 'hfld', 'hfmix', 'hmxnme', 'nc',
+               'setktv', 'preos', 'setaga', 'setref')
+_constants = {}
+_refoffsets = {}
+_setupprop = _Setupdict()
+_set = _Setupdict()
 
 #Intergers
 _fixicomp = 0
+_fingerprint = None #fingerprint of loaded setup, None if changed
 _nmxpar = 6
 _maxcomps = 20
 
+#functions changing the loaded setup
+_setupfunctions = ('setpath', 'setup', 'setmod', 'gerg04', 'setref',
+                   'purefld', 'setktv', 'setaga', 'unsetaga', 'preos',
+                   'resetup')
+
 #Nones
 (_rp, _gerg04_pre_rec, _setmod_pre_rec, _setup_rec, _setmod_rec, _gerg04_rec,
 _setref_rec, _purefld_rec, _setktv_rec, _setaga_rec, _preos_rec) \
     = (None,)*11
 
+#refprop library routines, linux symbol: windows symbol (None if not
+#available), bound to globals _rp + linux symbol on first call
+_symbols = {'setup0_':'SETUPdll', 'setmod_':'SETMODdll', 'gerg04_':'GERG04dll',
+    'setref_':'SETREFdll', 'setmix_':'SETMIXdll', 'critp_':'CRITPdll',
+    'therm_':'THERMdll', 'therm0_':'THERM0dll', 'residual_':'RESIDUALdll',
+    'therm2_':'THERM2dll', 'therm3_':'THERM3dll', 'chempot_':'CHEMPOTdll',
+    'purefld_':'PUREFLDdll', 'name_':'NAMEdll', 'entro_':'ENTROdll',
+    'enthal_':'ENTHALdll', 'cvcp_':'CVCPdll', 'cvcpk_':'CVCPKdll',
+    'gibbs_':'GIBBSdll', 'ag_':'AGdll', 'press_':'PRESSdll', 'dpdd_':'DPDDdll',
+    'dpddk_':'DPDDKdll', 'dpdd2_':'DPDD2dll', 'dpdt_':'DPDTdll',
+    'dpdtk_':'DPDTKdll', 'dddp_':'DDDPdll', 'dddt_':'DDDTdll', 'dcdt_':None,
+    'dcdt2_':None, 'dhd1_':'DHD1dll', 'fugcof_':'FUGCOFdll', 'dbdt_':'DBDTdll',
+    'virb_':'VIRBdll', 'virc_':'VIRCdll', 'vird_':None, 'virba_':'VIRBAdll',
+    'virca_':'VIRCAdll', 'satt_':'SATTdll', 'satp_':'SATPdll',
+    'satd_':'SATDdll', 'sath_':'SATHdll', 'sate_':'SATEdll', 'sats_':'SATSdll',
+    'csatk_':'CSATKdll', 'dptsatk_':'DPTSATKdll', 'cv2pk_':'CV2PKdll',
+    'tprho_':'TPRHOdll', 'tpflsh_':'TPFLSHdll', 'tdflsh_':'TDFLSHdll',
+    'thflsh_':'THFLSHdll', 'tsflsh_':'TSFLSHdll', 'teflsh_':'TEFLSHdll',
+    'pdflsh_':'PDFLSHdll', 'phflsh_':'PHFLSHdll', 'psflsh_':'PSFLSHdll',
+    'peflsh_':'PEFLSHdll', 'hsflsh_':'HSFLSHdll', 'esflsh_':'ESFLSHdll',
+    'dhflsh_':'DHFLSHdll', 'dsflsh_':'DSFLSHdll', 'deflsh_':'DEFLSHdll',
+    'tqflsh_':'TQFLSHdll', 'pqflsh_':'PQFLSHdll', 'thfl1_':None, 'tsfl1_':None,
+    'tefl1_':None, 'pdfl1_':'PDFL1dll', 'phfl1_':'PHFL1dll',
+    'psfl1_':'PSFL1dll', 'pefl1_':None, 'hsfl1_':None, 'dhfl1_':None,
+    'dsfl1_':None, 'defl1_':None, 'tpfl2_':None, 'dhfl2_':None, 'dsfl2_':None,
+    'defl2_':None, 'thfl2_':None, 'tsfl2_':None, 'tefl2_':None, 'tdfl2_':None,
+    'pdfl2_':None, 'phfl2_':None, 'psfl2_':None, 'pefl2_':None, 'tqfl2_':None,
+    'pqfl2_':None, 'abfl2_':None, 'info_':'INFOdll', 'rmix2_':None,
+    'xmass_':'XMASSdll', 'xmole_':'XMOLEdll', 'limitx_':'LIMITXdll',
+    'limitk_':'LIMITKdll', 'limits_':'LIMITSdll', 'qmass_':'QMASSdll',
+    'qmole_':'QMOLEdll', 'wmoldll_':'WMOLdll', 'dielec_':'DIELECdll',
+    'surft_':'SURFTdll', 'surten_':'SURTENdll', 'meltt_':'MELTTdll',
+    'meltp_':'MELTPdll', 'sublt_':'SUBLTdll', 'sublp_':'SUBLPdll',
+    'trnprp_':'TRNPRPdll', 'getktv_':'GETKTVdll', 'getmod_':None,
+    'setktv_':'SETKTVdll', 'setaga_':'SETAGAdll', 'unsetaga_':'UNSETAGAdll',
+    'preos_':'PREOSdll', 'getfij_':'GETFIJdll', 'b12_':'B12dll',
+    'excess_':None, 'phiderv_':None, 'cstar_':'CSTARdll',
+    'setpath_':'SETPATHdll', 'fgcty_':'FGCTYdll', 'fpv_':'FPVdll'}
+
 #c_long
 (_icomp, _jcomp, _kph, _kq, _kguess, _nc, _ixflag, _v, _nroot, _k1, _k2, _k3,
     _ksat, _ierr, _kr, _iderv) = (c_long(), c_long(), c_long(), c_long(),
@@ -181,19 +319,530 @@ _hfij = ((c_char * (8 * _nmxpar)) * _nmxpar)()
 
 
 #classes
+class _Symbol():
+    '''placeholder of refprop library routine, loads the library and binds
+    the routine on first call'''
+    __slots__ = ('name',)
+    def __init__(self, name):
+        self.name = name
+    def __call__(self, *args):
+        return _bindsymbol(self.name)(*args)
+
+
 class _Setuprecord():
     'record setmod, setup, setktv, setref, purefld input values for def reset'
-    object_list = []
+    #objectname: no. of records (a new record is created before the previous
+    #record of the same name is deleted)
+    object_list = {}
 
     #add record
     def __init__(self, record, objectname):
         self.record = record
         self.objectname = objectname
-        self.object_list.append(self.objectname)
+        self.object_list[objectname] = self.object_list.get(objectname, 0) + 1
 
     #del record
     def __del__(self):
-        self.object_list.remove(self.objectname)
+        self.object_list[self.objectname] -= 1
+        if self.object_list[self.objectname] == 0:
+            del self.object_list[self.objectname]
+
+
+class RefpropSession():
+    '''Independent refprop instance with its own module state, buffers and
+    (private=True) its own copy of the shared library, methods mirror the
+    module functions:
+
+        with RefpropSession() as session:
+            session.setup('def', 'water')
+            prop = session.flsh('tp', 300, 100, [1])
+
+    Sessions do not interfere with each other or with the module functions,
+    e.g. one session per thread or per fluid of a cycle calculation. A
+    session itself is not thread safe. Errors are raised as the exception
+    classes of the refprop module (e.g. refprop.RefpropError). Requires
+    python 3.5+ (importlib.util.module_from_spec), the module functions run
+    on python 3.2.
+
+    input:
+        path--refprop root directory (see setpath), default the directory of
+            the refprop module
+        private--True: load a private copy of the shared library (no resetup
+            needed when switching sessions), removed by close
+            False: share the library with the module functions and other
+            non private sessions, the setup of the session is reloaded when
+            the library was set up by other code since'''
+    _count = 0
+
+    def __init__(self, path=None, private=True):
+        import importlib.util
+        if not hasattr(importlib.util, 'module_from_spec'):
+            raise RefpropError('RefpropSession requires python 3.5+')
+        RefpropSession._count += 1
+        spec = importlib.util.spec_from_file_location(
+            'refprop_session' + str(RefpropSession._count), __file__)
+        self._module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(self._module)
+        #raise the exception classes of this module
+        for name, obj in list(vars(self._module).items()):
+            if obj.__class__ is type and issubclass(obj, Exception) and \
+            name in globals():
+                setattr(self._module, name, globals()[name])
+        if not private:
+            #track the setup of the library shared with this module
+            self._module._libraryowner = _libraryowner
+        self._module._private = private
+        self.private = private
+        self._prop = None
+        self.key = None
+        path = path or _fpath
+        if path:
+            self._module.setpath(path)
+
+    def __repr__(self):
+        return '<RefpropSession ' + self._module.__name__ + '>'
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        '''Unload the private copy of the shared library and remove its
+        file, the library is loaded again on further use (setup required)'''
+        if self.private:
+            self._module._closelibrary()
+
+    def __getattr__(self, name):
+        if name == '_module':
+            raise AttributeError(name)
+        func = getattr(self._module, name)
+        if name.startswith('_') or not callable(func) or \
+        func.__class__ is type:
+            return func
+        session = self
+        def _sessionfunc(*args, **kwargs):
+            if not session.private and session._prop != None:
+                owner = _libraryowner[0]
+                if owner is not vars(session._module) and (owner == None or
+                owner['_loadedfingerprint']() != session.key):
+                    #reload the setup of this session in the shared library
+                    session._module.resetup(session._prop, True)
+            output = func(*args, **kwargs)
+            if name in _setupfunctions:
+                #setup changed, freeze details and key of the new setup
+                session._prop = session._module.setup_setting()
+                session.key = session._module.fingerprint()
+            return output
+        _sessionfunc.__name__ = name
+        _sessionfunc.__doc__ = func.__doc__
+        if self.private and name not in _setupfunctions:
+            #no switching required
+            return func
+        return _sessionfunc
+
+
+class State():
+    '''Reusable state of one fluid, updated in place (e.g. one State per
+    control volume of a simulation):
+
+        state = State(H2O)
+        state.update('tp', 300, 100)
+        print(state.h, state['eta'])
+
+    update runs the flash only, the other outputs (see state) are
+    calculated at t and D of the flash on first access and cached untill the
+    next update. The flash outputs of the previous update are kept in
+    previous.
+
+    With warm, a 'tp' update of a single phase state is solved by tprho
+    with the density of the previous state as first guess (kguess=1)
+    followed by therm, which skips the phase search of the flash. The
+    saturation pressures are estimated from a cache of satt points (ln p
+    linear in 1/t, refreshed per 10 K band), a cold flash is used when the
+    previous state is 2-phase, the new state is within 2 % of the saturation
+    pressure (phase change) or near the critical point. The no. of warm and
+    cold updates are counted in starts.
+
+    input:
+        prop--setup details (standard dictionary output from refprop
+            functions), None for the loaded setup
+        x--composition [array of mol frac], default x of prop or [1]
+        kph--phase flag of the flash (see flsh)
+        warm--warm start 'tp' updates from the previous density'''
+    def __init__(self, prop=None, x=None, kph=1, warm=True):
+        if x == None:
+            x = prop.get('x', [1]) if prop.__class__ is dict else [1]
+        self.prop = setup_details(prop) if prop != None else None
+        self.x = list(x)
+        self.kph = kph
+        self.warm = warm
+        self.starts = {'warm':0, 'cold':0}
+        self.routine = None
+        self.previous = None #flash outputs of the previous update
+        self._satcache = None #(tlow, thigh, saturation curves)
+        self._pcrit = None #critical pressure of x (q of warm starts)
+        self._key = fingerprint(prop) if prop != None else None
+        self._flash = {} #flash outputs of the current update
+        self._derived = {} #outputs calculated on access
+        self._xliq = (c_double * _maxcomps)()
+        self._xvap = (c_double * _maxcomps)()
+        self._checked = False
+
+    def __repr__(self):
+        return '<State ' + str(self._flash) + '>'
+
+    def _load(self):
+        'load the setup (when not loaded) and the composition'
+        if self._key != None and self._key != _loadedfingerprint():
+            resetup(self.prop)
+        x = self.x
+        if not self._checked:
+            _inputerrorcheck({'x':x, 'kph':self.kph})
+            self._checked = True
+        for each in range(len(x)): _x[each] = x[each]
+
+    def update(self, routine, var1, var2):
+        '''Flash to the state of input pair routine and var1, var2 (see
+        flsh)'''
+        self._load()
+        if self.warm and routine.upper() == 'TP' and self._warmtp(var1, var2):
+            self.starts['warm'] += 1
+        else:
+            _kph.value = self.kph
+            _flshcall(routine.upper(), var1, var2)
+            if _ierr.value != 0:
+                _outputierrcheck(_ierr.value, _herr.value, 'State.update',
+                                 {'routine':routine, 'var1':var1,
+                                  'var2':var2})
+            self.starts['cold'] += 1
+        #swap the output dictionaries, no allocation per update
+        self.previous, flash = self._flash, self.previous
+        if flash == None:
+            flash = {}
+        self._flash = flash
+        for output in _stateflash:
+            flash[output] = globals()['_' + output].value
+        if _cp.value < 0:
+            #not defined for 2-phase states
+            flash['cv'] = flash['cp'] = flash['w'] = float('nan')
+        nc = _nc_rec.record
+        self._xliq[:nc] = _xliq[:nc]
+        self._xvap[:nc] = _xvap[:nc]
+        self._derived.clear()
+        self.routine = routine
+        return self
+
+    def _warmtp(self, t, p):
+        '''solve t, p by tprho from the density of the current state and
+        therm, leave the outputs in the buffers as the flash does. Return
+        False when a cold flash is required.'''
+        flash = self._flash
+        if not flash or flash['D'] <= 0 or 0 <= flash['q'] <= 1:
+            return False
+        q = flash['q']
+        sat = self._saturation(t)
+        if sat == None:
+            #near the critical point
+            return False
+        elif not sat:
+            #above the critical temperature, no phase change, q as the flash:
+            #999 supercritical (p > pcrit), 998 superheated vapor
+            if self._pcrit == None:
+                _rpcritp_(_x, byref(_tcrit), byref(_pcrit), byref(_Dcrit),
+                          byref(_ierr), byref(_herr), c_long(255))
+                if _ierr.value != 0:
+                    return False
+                self._pcrit = _pcrit.value
+            kph, q = 0, 999 if p > self._pcrit else 998
+        elif q < 0 and p > sat[0] * (1 + _satmargin):
+            #subcooled liquid (q -998 or < 0)
+            kph = 1
+        elif 1 < q <= 998 and p < sat[1] * (1 - _satmargin):
+            #superheated vapor (q 998 or > 1)
+            kph = 2
+        else:
+            return False
+        _t.value, _p.value, _kph.value = t, p, kph
+        _kguess.value, _D.value = 1, flash['D']
+        _rptprho_(byref(_t), byref(_p), _x, byref(_kph), byref(_kguess),
+                  byref(_D), byref(_ierr), byref(_herr), c_long(255))
+        if _ierr.value != 0 or _D.value <= 0:
+            return False
+        _rptherm_(byref(_t), byref(_D), _x, byref(_p), byref(_e), byref(_h),
+                  byref(_s), byref(_cv), byref(_cp), byref(_w), byref(_hjt))
+        _p.value, _q.value = p, q
+        _Dliq.value = _Dvap.value = _D.value
+        nc = len(self.x)
+        _xliq[:nc] = _xvap[:nc] = _x[:nc]
+        return True
+
+    def _saturation(self, t):
+        '''return (bubble, dew) pressure [kPa] at t estimated from the
+        saturation cache, () above the critical temperature and None near
+        the critical point'''
+        cache = self._satcache
+        if cache == None or not cache[0] <= t <= cache[1]:
+            cache = self._satcache = self._satband(t)
+        curves = cache[2]
+        if curves == None or not curves:
+            return curves
+        pressures = tuple(exp(a - b / t) for a, b in curves)
+        return pressures if len(pressures) == 2 else pressures * 2
+
+    def _satband(self, t):
+        '''return (tlow, thigh, curves) of the saturation band around t,
+        curves are (a, b) of ln p = a - b / t for the bubble and dew curve
+        (one curve for pure fluids), () above and None near the critical
+        point'''
+        tlow, thigh = t - _satwidth, t + _satwidth
+        curves, failed = [], 0
+        kphs = (1, 2) if len(self.x) > 1 else (1,)
+        for kph in kphs:
+            points = []
+            for tsat in (tlow, thigh):
+                _t.value, _kph.value = tsat, kph
+                _rpsatt_(byref(_t), _x, byref(_kph), byref(_p), byref(_Dliq),
+                         byref(_Dvap), _xliq, _xvap, byref(_ierr),
+                         byref(_herr), c_long(255))
+                if _ierr.value != 0 or _p.value <= 0:
+                    failed += 1
+                    break
+                points.append(log(_p.value))
+            else:
+                b = (points[0] - points[1]) / (1 / thigh - 1 / tlow)
+                curves.append((points[0] + b / tlow, b))
+        if failed == 0:
+            return tlow, thigh, curves
+        elif failed == len(kphs):
+            #no saturation at the band, check the lower edge once more
+            _t.value, _kph.value = tlow, 1
+            _rpsatt_(byref(_t), _x, byref(_kph), byref(_p), byref(_Dliq),
+                     byref(_Dvap), _xliq, _xvap, byref(_ierr),
+                     byref(_herr), c_long(255))
+            if _ierr.value != 0:
+                return tlow, thigh, ()
+        return tlow, thigh, None
+
+    def __getitem__(self, output):
+        'Return output (see state) of the current state'
+        if output in self._flash:
+            return self._flash[output]
+        if output in self._derived:
+            return self._derived[output]
+        if not self._flash:
+            raise RefpropinputError('State has not been updated')
+        if output == 'xliq' or output == 'xvap':
+            buf = self._xliq if output == 'xliq' else self._xvap
+            comp = normalize([buf[each] for each in
+                              range(_nc_rec.record)])['x']
+            if '_purefld_rec' in _Setuprecord.object_list \
+            and len(self.x) == 1 and len(comp) != 1:
+                comp = [comp[_purefld_rec.record['icomp'] - 1]]
+            self._derived[output] = comp
+            return comp
+        calls = _stateplan((output,))[1]
+        self._load()
+        flash = self._flash
+        _t.value, _D.value = flash['t'], flash['D']
+        _Dliq.value, _q.value = flash['Dliq'], flash['q']
+        failed = _statecalls(calls)
+        if failed != None:
+            _outputierrcheck(failed[0], failed[1], 'State', dict(flash))
+        for name, args, copies, errorflag in calls:
+            for each, buf in copies:
+                self._derived[each] = buf.value
+            #cache the other outputs of the routine as well
+            for routine, buffers, errorflag in _thermbatch.values():
+                if routine == name:
+                    for buf in buffers:
+                        if not buf.startswith('_spare'):
+                            self._derived.setdefault(buf[1:],
+                                                     globals()[buf].value)
+        return self._derived[output]
+
+    def __getattr__(self, output):
+        if output.startswith('_'):
+            raise AttributeError(output)
+        try:
+            return self[output]
+        except RefpropinputError as exc:
+            raise AttributeError(str(exc))
+
+    def outputs(self, names):
+        'Return dictionary of the outputs names of the current state'
+        return dict((name, self[name]) for name in names)
+
+
+class FlashCache():
+    '''Deadband cache of one flash routine for dynamic simulations, of which
+    the inputs change by tiny amounts between time steps:
+
+        cache = FlashCache('ph', H2O, rtol=1e-4, correct=True)
+        prps = cache.flsh(p, h)
+
+    Each input is quantized to bins of relative width rtol (absolute width
+    rtol * atol below atol, e.g. enthalpies around 0), inputs in the bins of
+    a cached state return the cached outputs. With correct, the outputs t, p,
+    D, h, s and e of single phase states are corrected to first order from
+    the derivatives of the cached state (therm2 and dhd1, calculated once per
+    flash), the other outputs are returned as cached.
+
+    The error introduced is measured by verifying every verify-th hit with a
+    flash, a verified hit with a relative error of t or D above maxerror
+    replaces the cached state. The counts and errors are kept in stats:
+    calls, hits, misses, corrected (hits), verified (hits), exceeded
+    (verified hits above maxerror), maxerror and meanerror (relative error of
+    t and D of the verified hits).
+
+    input:
+        routine--flash input pair (see flsh, e.g. 'ph')
+        prop--setup details (standard dictionary output from refprop
+            functions), None for the loaded setup
+        x--composition [array of mol frac], default x of prop or [1]
+        kph--phase flag of the flash (see flsh)
+        rtol--relative tolerance of both inputs, or (rtol1, rtol2)
+        atol--magnitude of each input below which the bins are linear,
+            default per variable (see _deadbandfloor)
+        correct--first order correction of single phase states
+        verify--no. of hits per verified hit, 0 for no verification
+        maxerror--tolerated relative error of t and D of a verified hit
+        maxsize--maximum no. of cached states (least recently used are
+            removed)'''
+    def __init__(self, routine, prop=None, x=None, kph=1, rtol=1e-4,
+                 atol=None, correct=False, verify=0, maxerror=1e-3,
+                 maxsize=100000):
+        routine = routine.upper()
+        if len(routine) != 2 or routine[0] not in _deadbandfloor or \
+        routine[1] not in _deadbandfloor and routine[1] != 'Q':
+            raise RefpropinputError('FlashCache requires a flash input ' +
+                                    'pair of t, p, D, h, s, e and q')
+        if x == None:
+            x = prop.get('x', [1]) if prop.__class__ is dict else [1]
+        rtol = (rtol, rtol) if rtol.__class__ in (int, float) else tuple(rtol)
+        if min(rtol) <= 0:
+            raise RefpropinputError('rtol should be > 0')
+        if atol == None:
+            atol = tuple(_deadbandfloor.get(each, 1e-3) for each in routine)
+        self.routine = routine
+        self.prop = setup_details(prop) if prop != None else None
+        self.x = list(x)
+        self.kph = kph
+        self.rtol = rtol
+        self.atol = tuple(atol)
+        self.correct = correct and 'Q' not in routine
+        self.verify = verify
+        self.maxerror = maxerror
+        self.maxsize = maxsize
+        self.stats = {'calls':0, 'hits':0, 'misses':0, 'corrected':0,
+                      'verified':0, 'exceeded':0, 'maxerror':0.0,
+                      'meanerror':0.0}
+        self._key = fingerprint(prop) if prop != None else None
+        self._cache = OrderedDict() #bins: (var1, var2, outputs, gradients)
+        self._widths = (log(1 + rtol[0]), log(1 + rtol[1]))
+
+    def __len__(self):
+        return len(self._cache)
+
+    def clear(self):
+        'Remove the cached states'
+        self._cache.clear()
+
+    def _bins(self, var1, var2):
+        'return the deadband bins of the finite inputs var1, var2'
+        bins = []
+        for value, rtol, atol, width in zip((var1, var2), self.rtol,
+                                            self.atol, self._widths):
+            if abs(value) <= atol:
+                bins.append(int(floor(value / (rtol * atol))))
+            else:
+                bins.append((value > 0, int(floor(log(abs(value) / atol) /
+                                                  width))))
+        return tuple(bins)
+
+    def _flash(self, var1, var2):
+        'return the cache entry of an exact flash at var1, var2'
+        if self._key != None and self._key != _loadedfingerprint():
+            resetup(self.prop)
+        prps = flsh(self.routine, var1, var2, self.x, self.kph)
+        gradients = None
+        if self.correct and not 0 <= prps['q'] <= 1:
+            gradients = _deadbandgradients(self.routine, prps, self.x)
+        return var1, var2, prps, gradients
+
+    def flsh(self, var1, var2):
+        '''Return the outputs (see flsh) at var1, var2 from the cache or a
+        flash'''
+        stats = self.stats
+        stats['calls'] += 1
+        if not (isfinite(var1) and isfinite(var2)):
+            #nan and inf have no bins, flashed without caching
+            stats['misses'] += 1
+            return dict(self._flash(var1, var2)[2])
+        bins = self._bins(var1, var2)
+        entry = self._cache.get(bins)
+        if entry == None:
+            stats['misses'] += 1
+            entry = self._cache[bins] = self._flash(var1, var2)
+            if len(self._cache) > self.maxsize:
+                self._cache.popitem(False)
+            return dict(entry[2])
+        self._cache.move_to_end(bins)
+        stats['hits'] += 1
+        cached1, cached2, prps, gradients = entry
+        prps = dict(prps)
+        if gradients != None:
+            delta1, delta2 = var1 - cached1, var2 - cached2
+            for output, (d1, d2) in gradients.items():
+                prps[output] += d1 * delta1 + d2 * delta2
+            stats['corrected'] += 1
+        if self.verify and stats['hits'] % self.verify == 0:
+            exact = self._flash(var1, var2)
+            error = max(abs(prps[each] - exact[2][each]) /
+                        max(abs(exact[2][each]), 1e-300) for each in
+                        ('t', 'D'))
+            stats['verified'] += 1
+            stats['meanerror'] += (error - stats['meanerror']) / \
+                stats['verified']
+            stats['maxerror'] = max(stats['maxerror'], error)
+            if error > self.maxerror:
+                stats['exceeded'] += 1
+                self._cache[bins] = exact
+                return dict(exact[2])
+        return prps
+
+
+#default atol of the FlashCache inputs
+_deadbandfloor = {'T':1.0, 'P':1e-3, 'D':1e-6, 'H':1.0, 'S':1e-3, 'E':1.0}
+
+
+def _deadbandgradients(routine, prps, x):
+    '''return dictionary of output: (d output / d var1, d output / d var2)
+    of the single phase state prps of flash routine (first order, from the
+    derivatives of therm2 and dhd1 at t and D), None if singular'''
+    t, D, p = prps['t'], prps['D'], prps['p']
+    derivs = therm2(t, D, x)
+    dh = dhd1(t, D, x)
+    dpdt, dpdD = derivs['dpdt'], derivs['dpdD']
+    #partial derivatives with respect to (t, D)
+    partial = {'t':(1.0, 0.0), 'D':(0.0, 1.0), 'p':(dpdt, dpdD),
+               'h':(dh['dhdt_D'], dh['dhdD_t']),
+               's':(derivs['cv'] / t, -dpdt / D ** 2),
+               'e':(derivs['cv'], (p - t * dpdt) / D ** 2)}
+    (a1, a2), (b1, b2) = [partial[each if each == 'D' else each.lower()]
+                          for each in routine]
+    det = a1 * b2 - a2 * b1
+    if det == 0:
+        return None
+    #(t, D) as function of the inputs, inverse Jacobian
+    dt = (b2 / det, -a2 / det)
+    dD = (-b1 / det, a1 / det)
+    gradients = {}
+    for output, (yt, yD) in partial.items():
+        gradients[output] = (yt * dt[0] + yD * dD[0],
+                             yt * dt[1] + yD * dD[1])
+    return gradients
 
 
 class SetWarning:
@@ -205,7 +854,7 @@ class SetWarning:
         'Sets RefpropdllWarning on, initiate Error on Refpropdll ierr value < 0'
         global _setwarning
         _setwarning = 'on'
-        if 'SetWarng' in _set: _set.pop('SetWarning')
+        if 'SetWarning' in _set: _set.pop('SetWarning')
         return _prop()
     @staticmethod
     def off():
@@ -445,6 +1094,8 @@ def _prop(**prop):
     global _fixicomp, _setupprop, _set
     prop.update(_setupprop)
     prop.update(_set)
+    prop['fingerprint'] = _fingerprint if _fingerprint != None else \
+        _loadedfingerprint()
 
     #local declarations
     icomp = prop.get('icomp')
@@ -529,7 +1180,7 @@ def _inputerrorcheck(deflocals):
             if not value: pass
             else:
                 lenvalue = len(value)
-                if not type(value) == list:
+                if not isinstance(value, list):
                     raise RefpropinputError('expect "list" input for ' +
                                              key + ' instead of "' +
                                              str(value.__class__) +
@@ -548,7 +1199,7 @@ def _inputerrorcheck(deflocals):
                     raise RefpropnormalizeError('sum input value '
                                                  + key + 'is unequal to 1')
         elif key in checklist:
-            if not type(value) == list:
+            if not isinstance(value, list):
                 raise RefpropinputError ('expect "list" input for ' +
                                           key + ' instead of "' +
                                           str(value.__class__) +'"')
@@ -558,7 +1209,7 @@ def _inputerrorcheck(deflocals):
                                           + str(_nmxpar))
         elif key in checkliststring:
             for each in value:
-                if type(each) == list:
+                if isinstance(each, list):
                     for other in each:
                         if not type(other) == str:
                             raise RefpropinputError ('expect "list of str"' +
@@ -573,6 +1224,7 @@ def _inputerrorcheck(deflocals):
 def normalize(x):
     '''Normalize the sum of list x value's to 1'''
     lsum = sum
+    from decimal import Decimal
     x = [Decimal(each) for each in x]
     norm = lsum(x)
     while float(norm) != 1:
@@ -648,23 +1300,365 @@ def fluidlib():
 
 def _fluidextention():
     """return fluid library"""
-    global _fldext, _fpath
-    if _fldext == {}:
-        fldext = {}
-        fluidslistdir = listdir(_fpath + 'fluids/')
-        mixtureslistdir = listdir(_fpath + 'mixtures/')
-        fldext[_fpath + 'fluids/'] = [(each[:-4].upper()) for each in
-                                            fluidslistdir if
-                                            fnmatch(each, '*.FLD')]
-        fldext[_fpath + 'fluids/'].extend([each for each in fluidslistdir
-                                                 if fnmatch(each, '*.PPF')])
-        fldext[_fpath + 'mixtures/'] = [(each[:-4].upper()) for each in
-                                              mixtureslistdir if fnmatch
-                                              (each, '*.MIX')]
-        _fldext = fldext.copy()
+    global _fldext
+    index = _fluidindex()
+    _fldext = {_fpath + 'fluids/':list(index['fluids']),
+               _fpath + 'mixtures/':list(index['mixtures'])}
     return _fldext
 
 
+def fluidindex(rebuild=False):
+    '''Returns index of the fluid library on root directory parsed from the
+    headers of the .FLD, .PPF and .MIX files, without calling SETUP.
+
+    The index is stored in a cache file in ~/.refprop/ and rebuilt when the
+    fluids or mixtures directory is modified (or on input rebuild=True).
+
+    output:
+        fluids--dict of fluid name (file name, .PPF with extention): record
+            with file, hash, hname, hcas, hn80, formula, synonym, wmm, ttrp,
+            tnbpt, tcrit, pcrit, Dcrit, acf, dip and hrf (None if not in the
+            file header)
+        mixtures--dict of mixture name: record with file, hash, hname, wmm,
+            tcrit, pcrit, Dcrit, hfld and x'''
+    index = _fluidindex(rebuild)
+    return {'fluids':index['fluids'], 'mixtures':index['mixtures']}
+
+
+def findfluid(name):
+    '''Returns record (see fluidindex) of fluid or mixture name, name can
+    be the file name, short name, CAS no., chemical formula or synonym (case
+    insensitive). Returns None for an unknown name, raises RefpropinputError
+    for an alias of several files (e.g. formula C4H10).'''
+    index = _fluidindex()
+    name = _resolvefluid(name.upper(), index)
+    if name in index['fluids']:
+        return index['fluids'][name]
+    return index['mixtures'].get(name)
+
+
+def constants(fluid=None):
+    '''Returns fluid constants from the constants table without calling
+    SETUP or other library functions.
+
+    The table is stored in a cache file in ~/.refprop/. Fluids which are new
+    or of which the fluid file has changed are calculated (SETUP, info,
+    limits and name) on call, use multiRP.buildconstants to calculate them
+    in parallel.
+
+    input:
+        fluid--fluid name or alias (see findfluid), None for all fluids
+    output:
+        wmm, ttrp, tnbpt, tcrit, pcrit, Dcrit, zcrit, acf, dip, Rgas--see
+            info
+        tmin, tmax, Dmax, pmax--equation of state limits, see limits
+        hname, hn80, hcas--see name
+        hash--hash of the fluid file
+        error--error message if the fluid could not be loaded (otherwise
+            None)
+        or dict of fluid name: constants for fluid None'''
+    stale = _staleconstants()
+    if stale:
+        _storeconstants(_calcconstants(stale))
+    if fluid == None:
+        return dict(_constants['fluids'])
+    name = _resolvefluid(fluid.upper())
+    if name not in _constants['fluids']:
+        raise RefpropinputError('unknown fluid "' + str(fluid) + '"')
+    return _constants['fluids'][name]
+
+
+def _constantsfile():
+    '''return cache file name of the constants table of the root
+    directory'''
+    from hashlib import sha1
+    return _cachedir + 'constants_' + \
+        sha1(_rootpath().encode('utf-8')).hexdigest()[:12] + '.pickle'
+
+
+def _staleconstants(rebuild=False):
+    '''load constants table and return list of fluid names which are missing
+    or of which the fluid file has changed'''
+    import pickle
+    global _constants
+    fpath = _rootpath()
+    index = _fluidindex()
+    if _constants.get('path') != fpath:
+        try:
+            with open(_constantsfile(), 'rb') as cache:
+                _constants = pickle.load(cache)
+        except Exception:
+            #missing or corrupt cache file
+            _constants = {}
+        if _constants.get('path') != fpath:
+            _constants = {'path':fpath, 'fluids':{}}
+    table = _constants['fluids']
+    #remove deleted fluids
+    for name in [each for each in table if each not in index['fluids']]:
+        del table[name]
+    return [name for name, record in index['fluids'].items() if rebuild or
+            name not in table or table[name]['hash'] != record['hash']]
+
+
+def _fluidconstants(fluid):
+    '''return (fluid, constants record) of fluid name (calls SETUP)'''
+    try:
+        setup('def', fluid)
+        prop = info(1)
+        prop.update(limits([1]))
+        prop.update(name(1))
+    except RefpropError as exc:
+        return _constantsrecord(fluid, {}, str(exc))
+    return _constantsrecord(fluid, prop)
+
+
+def _constantsrecord(fluid, prop, error=None):
+    '''return (fluid, constants record) from refprop output prop'''
+    record = {'hash':_fluidindex()['fluids'][fluid]['hash'], 'error':error}
+    for key in ('wmm', 'ttrp', 'tnbpt', 'tcrit', 'pcrit', 'Dcrit', 'zcrit',
+                'acf', 'dip', 'Rgas', 'tmin', 'tmax', 'Dmax', 'pmax', 'hname',
+                'hn80', 'hcas'):
+        record[key] = prop.get(key)
+    return (fluid, record)
+
+
+def _calcconstants(names):
+    '''return list of (name, constants record) of fluid names, the loaded
+    setup is restored afterwards'''
+    prop = setup_setting() if _setupprop != {} else None
+    try:
+        return [_fluidconstants(name) for name in names]
+    finally:
+        if prop != None:
+            resetup(prop, True)
+
+
+def _storeconstants(records):
+    '''add list of (name, constants record) to the constants table and
+    store it in the cache file'''
+    import pickle
+    _constants['fluids'].update(records)
+    try:
+        makedirs(_cachedir, exist_ok=True)
+        with open(_constantsfile(), 'wb') as cache:
+            pickle.dump(_constants, cache, pickle.HIGHEST_PROTOCOL)
+    except OSError:
+        #table is used from memory only
+        pass
+
+
+def _resolvefluid(name, index=None):
+    '''return file name (uppercase) of fluid name or alias, unknown names
+    are returned unchanged, raise RefpropinputError for an alias of several
+    files'''
+    if index == None:
+        index = _fluidindex()
+    if name in index['fluids'] or name in index['mixtures']:
+        return name
+    if name in index['ambiguous']:
+        raise RefpropinputError('fluid name "' + name + '" is ambiguous, ' +
+                                'select one of ' +
+                                ', '.join(index['ambiguous'][name]))
+    return index['lookup'].get(name, name)
+
+
+def _rootpath():
+    '''return refprop root directory, the default directory if setpath has
+    not been called'''
+    if _fpath != '':
+        return _fpath
+    return _defaultpath()
+
+
+def _defaultpath():
+    '''return default refprop root directory'''
+    if _system == 'Windows':
+        #use the standard 2 windows options
+        if path.isdir('c:/program files/refprop/'):
+            return 'c:/program files/refprop/'
+        return 'c:/program files (x86)/refprop/'
+    return '/usr/local/lib/refprop/'
+
+
+def _dirstamp(dirname):
+    '''return tuple of (name, modification time, size) of the files of
+    directory (None if not existing), changes with a file edited in place
+    (the directory modification time does not)'''
+    try:
+        names = sorted(listdir(dirname))
+    except OSError:
+        return None
+    stamp = []
+    for name in names:
+        try:
+            status = stat(dirname + name)
+        except OSError:
+            #removed while listing
+            continue
+        stamp.append((name, status.st_mtime, status.st_size))
+    return tuple(stamp)
+
+
+def _fluidindex(rebuild=False):
+    '''return fluid index of the root directory from memory, the cache file
+    or build it from the fluid file headers'''
+    import pickle
+    from hashlib import sha1
+    global _fldindex
+    fpath = _rootpath()
+    stamp = (_dirstamp(fpath + 'fluids/'), _dirstamp(fpath + 'mixtures/'))
+    if not rebuild and _fldindex.get('path') == fpath and \
+    _fldindex.get('stamp') == stamp:
+        return _fldindex
+    cachefile = _cachedir + 'fluidindex_' + \
+        sha1(fpath.encode('utf-8')).hexdigest()[:12] + '.pickle'
+    index = None
+    if not rebuild:
+        try:
+            with open(cachefile, 'rb') as cache:
+                index = pickle.load(cache)
+        except Exception:
+            #missing or corrupt cache file
+            index = None
+    if index == None or index.get('path') != fpath or \
+    index.get('stamp') != stamp:
+        index = _buildindex(fpath)
+        index['stamp'] = stamp
+        try:
+            makedirs(_cachedir, exist_ok=True)
+            with open(cachefile, 'wb') as cache:
+                pickle.dump(index, cache, pickle.HIGHEST_PROTOCOL)
+        except OSError:
+            #index is used from memory only
+            pass
+    _fldindex = index
+    return _fldindex
+
+
+def _buildindex(fpath):
+    '''parse headers of all fluid and mixture files on root directory fpath'''
+    fluids, mixtures, lookup = {}, {}, {}
+    if path.isdir(fpath + 'fluids/'):
+        for each in sorted(listdir(fpath + 'fluids/')):
+            if each.upper().endswith('.FLD'):
+                fluids[each[:-4].upper()] = _parsefld(fpath + 'fluids/', each)
+            elif each.upper().endswith('.PPF'):
+                fluids[each.upper()] = _parsefld(fpath + 'fluids/', each)
+    if path.isdir(fpath + 'mixtures/'):
+        for each in sorted(listdir(fpath + 'mixtures/')):
+            if each.upper().endswith('.MIX'):
+                mixtures[each[:-4].upper()] = _parsemix(fpath + 'mixtures/',
+                                                        each)
+    #aliases of fluids, file names take precedence
+    candidates = {}
+    for name, record in fluids.items():
+        for alias in [record['hname'], record['hcas'], record['formula']] \
+        + record['aliases']:
+            if alias and alias.upper() not in fluids and alias.upper() not in \
+            mixtures:
+                candidates.setdefault(alias.upper(), set()).add(name)
+    for name, record in mixtures.items():
+        if record['hname'] and record['hname'].upper() not in fluids and \
+        record['hname'].upper() not in mixtures:
+            candidates.setdefault(record['hname'].upper(), set()).add(name)
+    #aliases of several files (e.g. formula C4H10 of butane and isobutane)
+    #do not resolve, see _resolvefluid
+    ambiguous = {}
+    for alias, names in candidates.items():
+        if len(names) == 1:
+            lookup[alias] = names.pop()
+        else:
+            ambiguous[alias] = sorted(names)
+    return {'path':fpath, 'fluids':fluids, 'mixtures':mixtures,
+            'lookup':lookup, 'ambiguous':ambiguous}
+
+
+def _readheader(dirname, filename):
+    '''return (hash, header lines) of file, the header ends at the first
+    model section (#)'''
+    from hashlib import sha1
+    with open(dirname + filename, 'rb') as fluidfile:
+        content = fluidfile.read()
+    lines = []
+    for line in content.decode('latin-1').splitlines():
+        if line.startswith('#') or len(lines) > 40:
+            break
+        lines.append(line)
+    return sha1(content).hexdigest()[:16], lines
+
+
+def _headernumber(value):
+    '''return float of header value (None if not a number)'''
+    try:
+        return float(value.split()[0].replace('d', 'e').replace('D', 'e'))
+    except (ValueError, IndexError):
+        return None
+
+
+def _parsefld(dirname, filename):
+    '''return index record of .FLD or .PPF file'''
+    #header comment label: record key
+    labels = (('short name', 'hname'), ('cas', 'hcas'),
+              ('full name', 'hn80'), ('formula', 'formula'),
+              ('synonym', 'synonym'), ('molecular weight', 'wmm'),
+              ('molar mass', 'wmm'), ('triple point', 'ttrp'),
+              ('normal boiling', 'tnbpt'), ('critical temperature', 'tcrit'),
+              ('critical pressure', 'pcrit'), ('critical density', 'Dcrit'),
+              ('acentric', 'acf'), ('dipole', 'dip'),
+              ('reference state', 'hrf'))
+    numbers = ('wmm', 'ttrp', 'tnbpt', 'tcrit', 'pcrit', 'Dcrit', 'acf', 'dip')
+    record = {'file':filename, 'hname':None, 'hcas':None, 'hn80':None,
+              'formula':None, 'synonym':None, 'aliases':[], 'hrf':None}
+    for key in numbers:
+        record[key] = None
+    filehash, lines = _readheader(dirname, filename)
+    record['hash'] = filehash
+    for line in lines:
+        if '!' not in line:
+            continue
+        value, comment = line.split('!', 1)
+        value, comment = value.strip(), comment.lower()
+        for label, key in labels:
+            if label in comment and record[key] == None:
+                if key in numbers:
+                    record[key] = _headernumber(value)
+                else:
+                    record[key] = value
+                if key == 'formula' and '{' in comment:
+                    #alternative formula e.g. {C2H2F4}
+                    record['aliases'].append(
+                        comment.split('{', 1)[1].split('}')[0].upper())
+                break
+    if record['synonym']:
+        record['aliases'].extend([each.strip() for each in
+                                  record['synonym'].split(',')
+                                  if each.strip()])
+    return record
+
+
+def _parsemix(dirname, filename):
+    '''return index record of .MIX file'''
+    record = {'file':filename, 'hname':None, 'wmm':None, 'tcrit':None,
+              'pcrit':None, 'Dcrit':None, 'hfld':[], 'x':[]}
+    filehash, lines = _readheader(dirname, filename)
+    record['hash'] = filehash
+    lines = [line.split('!')[0].strip() for line in lines]
+    try:
+        record['hname'] = lines[0].split()[0]
+        (record['wmm'], record['tcrit'], record['pcrit'],
+         record['Dcrit']) = [_headernumber(each) for each in
+                             lines[1].split()[:4]]
+        nc = int(lines[2].split()[0])
+        record['hfld'] = [each.split()[0].upper().rsplit('.FLD', 1)[0] for
+                          each in lines[3:3 + nc]]
+        x = ' '.join(lines[3 + nc:]).split()
+        record['x'] = [_headernumber(each) for each in x[:nc]]
+    except (ValueError, IndexError):
+        #non standard header, keep the parsed part
+        pass
+    return record
+
+
 def resetup(prop, force=False):
     '''Resetup models and re-initialize  arrays.
 
@@ -685,6 +1679,14 @@ def resetup(prop, force=False):
         props--standard dictinary output from refprop functions
         force--force resetup (True or False (standard input)'''
     global _gerg04_pre_rec, _setmod_pre_rec
+    if _libraryowner[0] is not globals():
+        #the shared library was set up by a RefpropSession
+        force = True
+    #loaded setup is unchanged if prop is an output of it or the
+    #fingerprints are equal
+    if force != True and (_isloaded(prop) or fingerprint(prop) ==
+                          _loadedfingerprint()):
+        return dict(_setupdetails)
     prop = setup_details(prop)
     #only resetup if loaded models are unequal to request (or force)
     if force == True or setup_setting() != prop:
@@ -735,6 +1737,8 @@ def resetup(prop, force=False):
         #initialize setref
         strf = prop.get('setref')
         if strf != None:
+            #defaults on a copy, setup values are read only
+            strf = prop['setref'] = dict(strf)
             if not 'ixflag' in strf:
                 prop['setref']['ixflag'] = 1
             if not 'x0' in strf:
@@ -875,6 +1879,67 @@ def setup_details(prop):
     return prps
 
 
+def fingerprint(prop=None):
+    '''Returns fingerprint of the setup details of input fluid, equal setup
+    details return an equal fingerprint (also in other processes).
+
+    The fingerprint is part of the standard dictionary output of the refprop
+    functions and compared by resetup to skip the resetup.
+
+    input:
+        prop--standard dictinary output from refprop functions or setup
+            details, None for the loaded setup
+    output:
+        fingerprint--integer hash of the setup details'''
+    if prop == None:
+        return _loadedfingerprint()
+    if _isloaded(prop):
+        return prop['fingerprint']
+    return _detailsfingerprint(setup_details(prop))
+
+
+def _isloaded(prop):
+    '''return True if prop is an output of the loaded setup: its fingerprint
+    is the loaded one and its setup values are the (read only) values of the
+    loaded setup, not those of an edited copy. Identity comparisons only, no
+    hashing.'''
+    if prop.__class__ is not dict or prop.get('fingerprint') != \
+    _loadedfingerprint():
+        return False
+    details = _setupdetails
+    for key in _detailkeys:
+        if prop.get(key) is not details.get(key):
+            return False
+    return True
+
+
+def _loadedfingerprint():
+    '''return fingerprint of the loaded setup, calculated once per setup
+    change'''
+    global _fingerprint, _setupdetails
+    if _fingerprint == None:
+        prop = dict(_setupprop)
+        prop.update(_set)
+        _setupdetails = setup_details(prop)
+        _fingerprint = _detailsfingerprint(_setupdetails)
+    return _fingerprint
+
+
+def _detailsfingerprint(details):
+    '''return fingerprint (64 bit integer) of setup details'''
+    from hashlib import sha1
+    return int(sha1(repr(sorted(details.items())).encode('utf-8')
+                    ).hexdigest()[:16], 16)
+
+
+def _setupkey(prop):
+    '''Returns hashable key of the setup details of input fluid, equal setup
+    details return an equal key (None if prop is None)'''
+    if prop == None:
+        return None
+    return fingerprint(prop)
+
+
 def _test():
     '''execute detailed test run of refprop'''
     import rptest
@@ -1398,6 +2463,7 @@ def setpath(path=None):
     This function must be called before
     SETUP if path is not default. Note, all fluids and mixtures to be filed
     under root/fluids and root/mixtures. Input in string format.
+    The shared library is loaded on the first call of a library routine.
     '''
     global _purefld_rec, _setref_rec, _setaga_rec, _preos_rec
     global _gerg04_pre_rec, _gerg04_rec, _setmod_pre_rec, _setmod_rec
@@ -1438,150 +2504,110 @@ def setpath(path=None):
 
 
 def _loadfile(fpath):
-    global _rpsetup0_, _rpsetmod_, _rpgerg04_, _rpsetref_, _rpsetmix_, \
-        _rpcritp_, _rptherm_, _rptherm0_, _rpresidual_, _rptherm2_, \
-        _rptherm3_, _rpchempot_, _rppurefld_, _rpname_, _rpentro_, \
-        _rpenthal_, _rpcvcp_, _rpcvcpk_, _rpgibbs_, _rpag_, _rppress_, \
-        _rpdpdd_, _rpdpddk_, _rpdpdd2_, _rpdpdt_, _rpdpdtk_, _rpdddp_, \
-        _rpdddt_, _rpdcdt_, _rpdcdt2_, _rpdhd1_, _rpfugcof_, _rpdbdt_, \
-        _rpvirb_, _rpvirc_, _rpvird_, _rpvirba_, _rpvirca_, _rpsatt_, \
-        _rpsatp_, _rpsatd_, _rpsath_, _rpsate_, _rpsats_, _rpcsatk_, \
-        _rpdptsatk_, _rpcv2pk_, _rptprho_, _rptpflsh_, _rptdflsh_, \
-        _rpthflsh_, _rptsflsh_, _rpteflsh_, _rppdflsh_, _rpphflsh_, \
-        _rppsflsh_, _rppeflsh_, _rphsflsh_, _rpesflsh_, _rpdhflsh_, \
-        _rpdsflsh_, _rpdeflsh_, _rptqflsh_, _rppqflsh_, _rpthfl1_, \
-        _rptsfl1_, _rptefl1_, _rppdfl1_, _rpphfl1_, _rppsfl1_, _rppefl1_, \
-        _rphsfl1_, _rpdhfl1_, _rpdsfl1_, _rpdefl1_, _rptpfl2_, _rpdhfl2_, \
-        _rpdsfl2_, _rpdefl2_, _rpthfl2_, _rptsfl2_, _rptefl2_, _rptdfl2_, \
-        _rppdfl2_, _rpphfl2_, _rppsfl2_, _rppefl2_, _rptqfl2_, _rppqfl2_, \
-        _rpabfl2_, _rpinfo_, _rprmix2_, _rpxmass_, _rpxmole_, _rplimitx_, \
-        _rplimitk_, _rplimits_, _rpqmass_, _rpqmole_, _rpwmoldll_, \
-        _rpdielec_, _rpsurft_, _rpsurten_, _rpmeltt_, _rpmeltp_, _rpsublt_, \
-        _rpsublp_, _rptrnprp_, _rpgetktv_, _rpgetmod_, _rpsetktv_, \
-        _rpsetaga_, _rpunsetaga_, _rppreos_, _rpgetfij_, _rpb12_, \
-        _rpexcess_, _rpphiderv_, _rpcstar_, _rpsetpath_, _rpfgcty_, _rpfpv_
-    
-    #set fpath  and filename
-    if system() == 'Linux':
-        if fpath == None:
-            fpath = '/usr/local/lib/refprop/'
-        filename = fpath.rsplit('refprop/')[0] + 'librefprop.so'
-        if not path.isfile(filename):
-            raise RefpropError('can not find' + filename) 
+    '''return refprop root directory fpath (default directory for None)
+    after confirming the shared library exists. The library is loaded on the
+    first call of a library routine (see _bindsymbol).'''
+    global _rp
+    if fpath == None:
+        fpath = _defaultpath()
+    filename = _libraryfile(fpath)
+    if not path.isfile(filename):
+        raise RefpropError('can not find' + filename)
+    #(re)load library and rebind symbols on first call
+    _rp = None
+    _resetsymbols()
+    return fpath
+
+
+def _libraryfile(fpath):
+    '''return file name of the refprop shared library of root directory
+    fpath'''
+    if _system == 'Linux':
+        return fpath.rsplit('refprop/')[0] + 'librefprop.so'
+    elif _system == 'Windows':
+        return fpath + 'refprop.dll'
+    raise RefpropError('refprop is not supported on ' + _system)
+
+
+def _loadlibrary():
+    '''load refprop shared library of root directory and set its path'''
+    global _rp, _fpath, _privatecopy
+    if _fpath == '':
+        setpath()
+    filename = _libraryfile(_fpath)
+    if _private:
+        #a copy of the library file is loaded as a separate instance
+        import os, shutil, tempfile
+        copyname = path.join(tempfile.mkdtemp(prefix='refprop'),
+                             path.basename(filename))
+        shutil.copyfile(filename, copyname)
+        if _system == 'Linux':
+            #local symbols, the copy should not bind to the shared instance
+            _rp = CDLL(str(copyname), mode=RTLD_LOCAL | getattr(
+                os, 'RTLD_DEEPBIND', 0))
+            #the loaded library remains after removing its file
+            os.remove(copyname)
+            os.rmdir(path.dirname(copyname))
+        elif _system == 'Windows':
+            #a loaded dll can not be removed, see _closelibrary
+            _rp = windll.LoadLibrary(str(copyname))
+            _privatecopy = copyname
+    elif _system == 'Linux':
         _rp = CDLL(str(filename), mode=RTLD_GLOBAL)
-    elif system() == 'Windows':
-        if fpath == None:
-            #use the standard 2 windows options
-            fpath='c:/program files/refprop/'
-            #test 1
-            try: listdir(fpath)
-            except WindowsError:
-                fpath='c:/program files (x86)/refprop/'
-                #test 2
-                listdir(fpath)
-        filename = fpath + 'refprop.dll'
-        if not path.isfile(filename):
-            raise RefpropError('can not find' + filename) 
+    elif _system == 'Windows':
         _rp = windll.LoadLibrary(str(filename))
-
-    #refprop functions
-    if system() == 'Linux':
-        (_rpsetup0_, _rpsetmod_, _rpgerg04_, _rpsetref_, _rpsetmix_,
-         _rpcritp_, _rptherm_, _rptherm0_, _rpresidual_, _rptherm2_,
-         _rptherm3_, _rpchempot_, _rppurefld_, _rpname_, _rpentro_,
-         _rpenthal_, _rpcvcp_, _rpcvcpk_, _rpgibbs_, _rpag_, _rppress_,
-         _rpdpdd_, _rpdpddk_, _rpdpdd2_, _rpdpdt_, _rpdpdtk_, _rpdddp_,
-         _rpdddt_, _rpdcdt_, _rpdcdt2_, _rpdhd1_, _rpfugcof_, _rpdbdt_,
-         _rpvirb_, _rpvirc_, _rpvird_, _rpvirba_, _rpvirca_, _rpsatt_,
-         _rpsatp_, _rpsatd_, _rpsath_, _rpsate_, _rpsats_, _rpcsatk_,
-         _rpdptsatk_, _rpcv2pk_, _rptprho_, _rptpflsh_, _rptdflsh_,
-         _rpthflsh_, _rptsflsh_, _rpteflsh_, _rppdflsh_, _rpphflsh_,
-         _rppsflsh_, _rppeflsh_, _rphsflsh_, _rpesflsh_, _rpdhflsh_,
-         _rpdsflsh_, _rpdeflsh_, _rptqflsh_, _rppqflsh_, _rpthfl1_,
-         _rptsfl1_, _rptefl1_, _rppdfl1_, _rpphfl1_, _rppsfl1_, _rppefl1_,
-         _rphsfl1_, _rpdhfl1_, _rpdsfl1_, _rpdefl1_, _rptpfl2_, _rpdhfl2_,
-         _rpdsfl2_, _rpdefl2_, _rpthfl2_, _rptsfl2_, _rptefl2_, _rptdfl2_,
-         _rppdfl2_, _rpphfl2_, _rppsfl2_, _rppefl2_, _rptqfl2_, _rppqfl2_,
-         _rpabfl2_, _rpinfo_, _rprmix2_, _rpxmass_, _rpxmole_, _rplimitx_,
-         _rplimitk_, _rplimits_, _rpqmass_, _rpqmole_, _rpwmoldll_,
-         _rpdielec_, _rpsurft_, _rpsurten_, _rpmeltt_, _rpmeltp_, _rpsublt_,
-         _rpsublp_, _rptrnprp_, _rpgetktv_, _rpgetmod_, _rpsetktv_,
-         _rpsetaga_, _rpunsetaga_, _rppreos_, _rpgetfij_, _rpb12_,
-         _rpexcess_, _rpphiderv_, _rpcstar_, _rpsetpath_, _rpfgcty_,
-         _rpfpv_) = \
-        (_rp.setup0_, _rp.setmod_, _rp.gerg04_, _rp.setref_, _rp.setmix_,
-         _rp.critp_, _rp.therm_, _rp.therm0_, _rp.residual_, _rp.therm2_,
-         _rp.therm3_, _rp.chempot_, _rp.purefld_, _rp.name_, _rp.entro_,
-         _rp.enthal_, _rp.cvcp_, _rp.cvcpk_, _rp.gibbs_, _rp.ag_, _rp.press_,
-         _rp.dpdd_, _rp.dpddk_, _rp.dpdd2_, _rp.dpdt_, _rp.dpdtk_, _rp.dddp_,
-         _rp.dddt_, _rp.dcdt_, _rp.dcdt2_, _rp.dhd1_, _rp.fugcof_, _rp.dbdt_,
-         _rp.virb_, _rp.virc_, _rp.vird_, _rp.virba_, _rp.virca_, _rp.satt_,
-         _rp.satp_, _rp.satd_, _rp.sath_, _rp.sate_, _rp.sats_, _rp.csatk_,
-         _rp.dptsatk_, _rp.cv2pk_, _rp.tprho_, _rp.tpflsh_, _rp.tdflsh_,
-         _rp.thflsh_, _rp.tsflsh_, _rp.teflsh_, _rp.pdflsh_, _rp.phflsh_,
-         _rp.psflsh_, _rp.peflsh_, _rp.hsflsh_, _rp.esflsh_, _rp.dhflsh_,
-         _rp.dsflsh_, _rp.deflsh_, _rp.tqflsh_, _rp.pqflsh_, _rp.thfl1_,
-         _rp.tsfl1_, _rp.tefl1_, _rp.pdfl1_, _rp.phfl1_, _rp.psfl1_, _rp.pefl1_,
-         _rp.hsfl1_, _rp.dhfl1_, _rp.dsfl1_, _rp.defl1_, _rp.tpfl2_, _rp.dhfl2_,
-         _rp.dsfl2_, _rp.defl2_, _rp.thfl2_, _rp.tsfl2_, _rp.tefl2_, _rp.tdfl2_,
-         _rp.pdfl2_, _rp.phfl2_, _rp.psfl2_, _rp.pefl2_, _rp.tqfl2_, _rp.pqfl2_,
-         _rp.abfl2_, _rp.info_, _rp.rmix2_, _rp.xmass_, _rp.xmole_, _rp.limitx_,
-         _rp.limitk_, _rp.limits_, _rp.qmass_, _rp.qmole_, _rp.wmoldll_,
-         _rp.dielec_, _rp.surft_, _rp.surten_, _rp.meltt_, _rp.meltp_, _rp.sublt_,
-         _rp.sublp_, _rp.trnprp_, _rp.getktv_, _rp.getmod_, _rp.setktv_,
-         _rp.setaga_, _rp.unsetaga_, _rp.preos_, _rp.getfij_, _rp.b12_,
-         _rp.excess_, _rp.phiderv_, _rp.cstar_, _rp.setpath_, _rp.fgcty_,
-         _rp.fpv_)
-    
-    elif system() == 'Windows':
-        (_rpsetup0_, _rpsetmod_, _rpgerg04_, _rpsetref_, _rpsetmix_,
-         _rpcritp_, _rptherm_, _rptherm0_, _rpresidual_, _rptherm2_,
-         _rptherm3_, _rpchempot_, _rppurefld_, _rpname_, _rpentro_,
-         _rpenthal_, _rpcvcp_, _rpcvcpk_, _rpgibbs_, _rpag_, _rppress_,
-         _rpdpdd_, _rpdpddk_, _rpdpdd2_, _rpdpdt_, _rpdpdtk_, _rpdddp_,
-         _rpdddt_, _rpdhd1_, _rpfugcof_, _rpdbdt_,
-         _rpvirb_, _rpvirc_, _rpvirba_, _rpvirca_, _rpsatt_,
-         _rpsatp_, _rpsatd_, _rpsath_, _rpsate_, _rpsats_, _rpcsatk_,
-         _rpdptsatk_, _rpcv2pk_, _rptprho_, _rptpflsh_, _rptdflsh_,
-         _rpthflsh_, _rptsflsh_, _rpteflsh_, _rppdflsh_, _rpphflsh_,
-         _rppsflsh_, _rppeflsh_, _rphsflsh_, _rpesflsh_, _rpdhflsh_,
-         _rpdsflsh_, _rpdeflsh_, _rptqflsh_, _rppqflsh_,
-         _rppdfl1_, _rpphfl1_, _rppsfl1_,
-         _rpinfo_, _rpxmass_, _rpxmole_, _rplimitx_,
-         _rplimitk_, _rplimits_, _rpqmass_, _rpqmole_, _rpwmoldll_,
-         _rpdielec_, _rpsurft_, _rpsurten_, _rpmeltt_, _rpmeltp_, _rpsublt_,
-         _rpsublp_, _rptrnprp_, _rpgetktv_, _rpsetktv_,
-         _rpsetaga_, _rpunsetaga_, _rppreos_, _rpgetfij_, _rpb12_,
-         _rpcstar_, _rpsetpath_, _rpfgcty_,
-         _rpfpv_) = \
-        (_rp.SETUPdll, _rp.SETMODdll, _rp.GERG04dll, _rp.SETREFdll,
-         _rp.SETMIXdll, _rp.CRITPdll, _rp.THERMdll, _rp.THERM0dll,
-         _rp.RESIDUALdll, _rp.THERM2dll, _rp.THERM3dll, _rp.CHEMPOTdll,
-         _rp.PUREFLDdll, _rp.NAMEdll, _rp.ENTROdll, _rp.ENTHALdll, _rp.CVCPdll,
-         _rp.CVCPKdll, _rp.GIBBSdll, _rp.AGdll, _rp.PRESSdll, _rp.DPDDdll,
-         _rp.DPDDKdll, _rp.DPDD2dll, _rp.DPDTdll, _rp.DPDTKdll, _rp.DDDPdll,
-         _rp.DDDTdll, _rp.DHD1dll, _rp.FUGCOFdll,
-         _rp.DBDTdll, _rp.VIRBdll, _rp.VIRCdll, _rp.VIRBAdll,
-         _rp.VIRCAdll, _rp.SATTdll, _rp.SATPdll, _rp.SATDdll, _rp.SATHdll,
-         _rp.SATEdll, _rp.SATSdll, _rp.CSATKdll, _rp.DPTSATKdll, _rp.CV2PKdll,
-         _rp.TPRHOdll, _rp.TPFLSHdll, _rp.TDFLSHdll, _rp.THFLSHdll,
-         _rp.TSFLSHdll, _rp.TEFLSHdll, _rp.PDFLSHdll, _rp.PHFLSHdll, _rp.PSFLSHdll,
-         _rp.PEFLSHdll, _rp.HSFLSHdll, _rp.ESFLSHdll, _rp.DHFLSHdll,
-         _rp.DSFLSHdll, _rp.DEFLSHdll, _rp.TQFLSHdll, _rp.PQFLSHdll,
-         _rp.PDFL1dll, _rp.PHFL1dll,
-         _rp.PSFL1dll,
-         _rp.INFOdll, _rp.XMASSdll, _rp.XMOLEdll,
-         _rp.LIMITXdll, _rp.LIMITKdll, _rp.LIMITSdll, _rp.QMASSdll, _rp.QMOLEdll,
-         _rp.WMOLdll, _rp.DIELECdll, _rp.SURFTdll, _rp.SURTENdll, _rp.MELTTdll,
-         _rp.MELTPdll, _rp.SUBLTdll, _rp.SUBLPdll, _rp.TRNPRPdll, _rp.GETKTVdll,
-         _rp.SETKTVdll, _rp.SETAGAdll, _rp.UNSETAGAdll,
-         _rp.PREOSdll, _rp.GETFIJdll, _rp.B12dll,
-         _rp.CSTARdll, _rp.SETPATHdll, _rp.FGCTYdll, _rp.FPVdll)
     #set path for refprop
-    _hpth.value = fpath.encode('ascii')
-    _rpsetpath_(byref(_hpth), c_long(255))
+    _hpth.value = _fpath.encode('ascii')
+    _bindsymbol('_rpsetpath_')(byref(_hpth), c_long(255))
+
+
+def _closelibrary():
+    '''unload the private copy of the shared library (RefpropSession) and
+    remove its file, symbols are bound again on next use'''
+    global _rp, _privatecopy
+    if _rp == None:
+        return
+    import _ctypes
+    if _system == 'Windows':
+        _ctypes.FreeLibrary(_rp._handle)
+    else:
+        _ctypes.dlclose(_rp._handle)
+    _rp = None
+    _resetsymbols()
+    if _privatecopy != None:
+        import shutil
+        shutil.rmtree(path.dirname(_privatecopy), ignore_errors=True)
+        _privatecopy = None
+    #the setup is lost with the library
+    _setupprop.clear()
+    _set.clear()
+
+
+def _bindsymbol(name):
+    '''return routine of global name (e.g. '_rpcritp_') from the refprop
+    library and replace the placeholder by the routine'''
+    if _rp == None:
+        _loadlibrary()
+    if _system == 'Windows':
+        symbol = _symbols[name[3:]]
+        if symbol == None:
+            raise RefpropError('routine "' + name[3:-1] +
+                               '" is not available in refprop.dll')
+    else:
+        symbol = name[3:]
+    func = getattr(_rp, symbol)
+    globals()[name] = func
+    return func
+
+
+def _resetsymbols():
+    '''set placeholders for all refprop library routines'''
+    for each in _symbols:
+        globals()['_rp' + each] = _Symbol('_rp' + each)
+
+#placeholders untill the library is loaded
+_resetsymbols()
 
-    return fpath
 
 #REFPROP functions
 def setup(hrf, *hfld, hfmix='HMX.BNC'):
@@ -1612,7 +2638,7 @@ def setup(hrf, *hfld, hfmix='HMX.BNC'):
     _setup_rec = _Setuprecord(copy(locals()), '_setup_rec')
 
     #empty global setup storage for new population
-    _setupprop = {}
+    _setupprop = _Setupdict()
 
     #load refprop shared library
     if _fpath == '':
@@ -1623,20 +2649,24 @@ def setup(hrf, *hfld, hfmix='HMX.BNC'):
 
     #create listing of input *hfld (in either list format or *arg string format)
     for each in hfld:
-        if each.__class__ is list:
+        if isinstance(each, list):
             for other in each:
                 listhfld.append(other.upper())
         elif each.__class__ is str:
             listhfld.append(each.upper())
     
+    #resolve aliases (CAS no., formula, synonym) to file names
+    index = _fluidindex()
+    listhfld = [_resolvefluid(each, index) for each in listhfld]
+
     #create RP input format with file directory structure and file extention
     for each in listhfld:
-        if _fluidextention()[_fpath + 'fluids/'].__contains__(each):
-            if each[-4:] == '.PPF':
-                fluidname += _fpath + 'fluids/' + each + '|'
-            else: fluidname += _fpath + 'fluids/' + each + '.FLD|'
-        elif _fluidextention()[_fpath + 'mixtures/'].__contains__(each):
-            fluidname += _fpath + 'mixtures/' + each + '.MIX|'
+        if each in index['fluids']:
+            fluidname += _fpath + 'fluids/' + index['fluids'][each]['file'] + \
+                '|'
+        elif each in index['mixtures']:
+            fluidname += _fpath + 'mixtures/' + \
+                index['mixtures'][each]['file'] + '|'
 
     nc = len(listhfld)
     _nc_rec = _Setuprecord(nc, '_nc_rec')
@@ -1743,7 +2773,7 @@ def setmod(htype='NBS', hmix='NBS', *hcomp):
     if len(hcomp) == 0:
         hcomp = []
     #list input for hcomp
-    elif hcomp[0].__class__ is list:
+    elif isinstance(hcomp[0], list):
         hcomp = hcomp[0]
     #str's input for hcomp
     else:
@@ -1943,7 +2973,112 @@ def setref(hrf='DEF', ixflag=1, x0=[1], h0=0, s0=0, t0=273, p0=100):
             _setupprop.__delitem__('setref')
 
     return _prop(ierr = _ierr.value, herr = _herr.value, defname = 'setref')
-    
+
+
+def refoffset(hrf, x0=[1], h0=0, s0=0, t0=273, p0=100):
+    '''Returns the enthalpy and entropy offsets from the loaded reference
+    state to reference state hrf, without calling SETREF.
+
+    For a pure fluid or a mixture of fixed composition x0 a reference state
+    only adds constant offsets to h and s (see applyref). The offsets are
+    calculated once per setup and reference state.
+
+    inputs:
+        hrf--reference state 'NBP', 'ASH', 'IIR', 'OTH', 'OT0' or 'DEF' (pure
+            fluids with a NBP, ASH or IIR default only), see setref
+        x0--composition the offsets apply to [array of mol frac], mixtures
+            are referenced as a whole (setref ixflag = 2)
+        h0, s0, t0, p0--reference state for hrf 'OTH' and 'OT0', see setref
+    outputs:
+        refstate--reference state hrf
+        dh--enthalpy offset [J/mol]
+        ds--entropy offset [J/mol-K]'''
+    _inputerrorcheck(locals())
+    hrf = hrf.upper()
+    key = (_loadedfingerprint(), hrf, tuple(x0), h0, s0, t0, p0)
+    if key in _refoffsets:
+        return _prop(refstate = hrf, x0 = x0, **_refoffsets[key])
+    if hrf == 'DEF':
+        #default reference state of the fluid file
+        record = None
+        if _setupprop.get('nc') == 1 and 'hfld' in _setupprop:
+            record = _fluidindex()['fluids'].get(_setupprop['hfld'][0])
+        if record == None or record['hrf'] not in ('NBP', 'ASH', 'IIR'):
+            raise RefpropinputError('reference state offset of "DEF" is ' +
+                                    'only available for pure fluids with a ' +
+                                    'NBP, ASH or IIR default, use setref')
+        hrf = record['hrf']
+    #reference point and its enthalpy and entropy
+    if hrf == 'NBP' or (hrf == 'OTH' and t0 == -1):
+        sat = satp(101.325, x0, 1)
+        t, D = sat['t'], sat['Dliq']
+    elif hrf == 'ASH':
+        t, D = 233.15, satt(233.15, x0, 1)['Dliq']
+    elif hrf == 'IIR':
+        t, D = 273.15, satt(273.15, x0, 1)['Dliq']
+    elif hrf == 'OTH' and p0 in (-1, -2):
+        sat = satt(t0, x0, -p0)
+        t, D = t0, sat['Dliq'] if p0 == -1 else sat['Dvap']
+    elif hrf == 'OTH':
+        t, D = t0, flsh('tp', t0, p0, x0)['D']
+    elif hrf == 'OT0':
+        #ideal gas state
+        t, D = t0, p0 / (rmix2(x0)['Rgas'] * t0)
+    else:
+        raise RefpropinputError('reference state "' + hrf + '" has no ' +
+                                'offset, select NBP, ASH, IIR, OTH, OT0 or ' +
+                                'DEF')
+    if hrf == 'OT0':
+        prps = therm0(t, D, x0)
+    else:
+        prps = therm(t, D, x0)
+    #enthalpy and entropy of the reference state
+    if hrf == 'IIR':
+        wmix = wmol(x0)['wmix']
+        href, sref = 200 * wmix, 1.0 * wmix
+    elif hrf in ('OTH', 'OT0'):
+        href, sref = h0, s0
+    else:
+        href, sref = 0, 0
+    _refoffsets[key] = {'dh':href - prps['h'], 'ds':sref - prps['s']}
+    return _prop(refstate = key[1], x0 = x0, **_refoffsets[key])
+
+
+def applyref(prop, hrf, x0=None, h0=0, s0=0, t0=273, p0=100):
+    '''Returns copy of refprop output prop (or list of outputs) with h, s,
+    e, A and G converted to reference state hrf (see refoffset). Values may
+    be numbers or arrays (numpy) of equal length.
+
+    The setup of prop is loaded (resetup) to calculate the offsets, one
+    warm setup serves every reference state.
+
+    inputs:
+        prop--standard dictinary output from refprop functions with t for A
+            and G
+        hrf, h0, s0, t0, p0--see refoffset
+        x0--composition the offsets apply to, default x of prop'''
+    if prop.__class__ is list:
+        return [applyref(each, hrf, x0, h0, s0, t0, p0) for each in prop]
+    resetup(prop)
+    if x0 == None:
+        x0 = prop.get('x', [1])
+    offset = refoffset(hrf, list(x0), h0, s0, t0, p0)
+    dh, ds = offset['dh'], offset['ds']
+    prps = dict(prop)
+    if 'h' in prps:
+        prps['h'] = prps['h'] + dh
+    if 's' in prps:
+        prps['s'] = prps['s'] + ds
+    if 'e' in prps:
+        prps['e'] = prps['e'] + dh
+    #Helmholtz and Gibbs energy offsets depend on temperature
+    if 'A' in prps:
+        prps['A'] = prps['A'] + dh - prps['t'] * ds
+    if 'G' in prps:
+        prps['G'] = prps['G'] + dh - prps['t'] * ds
+    prps['refstate'] = offset['refstate']
+    return prps
+
 
 def _setmix(hmxnme, hrf, hfmix):
     global _nc_rec, _setupprop
@@ -3268,79 +4403,11 @@ def tprho(t, p, x, kph=2, kguess=0, D=0):
             ierr = _ierr.value, herr = _herr.value, defname = 'tprho')
             
             
-def flsh(routine, var1, var2, x, kph=1):
-    '''Flash calculation given two independent variables and bulk
-    composition
-
-    These routines accept both single-phase and two-phase states as the
-    input; if the phase is known, the specialized routines are faster
-
-    inputs:
-        routine--set input variables:
-            'TP'--temperature; pressure
-            'TD'--temperature; Molar Density
-            'TH'--temperature; enthalpy
-            'TS'--temperature; entropy
-            'TE'--temperature; internal energy
-            'PD'--pressure; molar density
-            'PH'--pressure; enthalpy
-            'PS'--pressure; entropy
-            'PE'--pressure; internal energy
-            'HS'--enthalpy; entropy
-            'ES'--internal energy; entropy
-            'DH'--molar density; enthalpy
-            'DS'--molar density; entropy
-            'DE'--molar density; internal energy
-            'TQ'--temperature; vapour quality
-            'PQ'--pressure; vapour qaulity
-        var1, var2--two of the following as indicated by the routine input:
-            t--temperature [K]
-            p--pressure [kPa]
-            e--internal energy [J/mol]
-            h--enthalpy [J/mol]
-            s--entropy [[J/mol-K]
-            q--vapor quality on molar basis [moles vapor/total moles]
-                q = 0 indicates saturated liquid
-                0 < q < 1 indicates 2 phase state
-                q = 1 indicates saturated vapor
-                q < 0 or q > 1 are not allowed and will result in warning
-        x--overall (bulk) composition [array of mol frac]
-        kph--phase flag:
-            N.B. only applicable for routine setting 'TE', 'TH' and 'TS'
-            1=liquid,
-            2=vapor in equilibrium with liq,
-            3=liquid in equilibrium with solid,
-            4=vapor in equilibrium with solid.
-    outputs:
-        t--temperature [K]
-        p--pressure [kPa]
-        D--overall (bulk) molar density [mol/L]
-        Dliq--molar density [mol/L] of the liquid phase
-        Dvap--molar density [mol/L] of the vapor phase
-            if only one phase is present, Dl = Dv = D
-        xliq--composition of liquid phase [array of mol frac]
-        xvap--composition of vapor phase [array of mol frac]
-            if only one phase is present, x = xliq = xvap
-        q--vapor quality on a MOLAR basis [moles vapor/total moles]
-            q < 0 indicates subcooled (compressed) liquid
-            q = 0 indicates saturated liquid
-            0 < q < 1 indicates 2 phase state
-            q = 1 indicates saturated vapor
-            q > 1 indicates superheated vapor
-            q = 998 superheated vapor, but quality not defined (t > Tc)
-            q = 999 indicates supercritical state (t > Tc) and (p > Pc)
-        e--overall (bulk) internal energy [J/mol]
-        h--overall (bulk) enthalpy [J/mol]
-        s--overall (bulk) entropy [J/mol-K]
-        cv--isochoric (constant V) heat capacity [J/mol-K]
-        cp--isobaric (constant p) heat capacity [J/mol-K]
-        w--speed of sound [m/s]
-            cp, cv and w are not defined for 2-phase states in such cases'''
-
-    _inputerrorcheck(locals())
-    _kph.value = kph
-    for each in range(len(x)): _x[each] = x[each]
-    if routine.upper() == 'TP':
+def _flshcall(routine, var1, var2):
+    '''call the flash routine of input pair routine (upper case) with the
+    composition and kph loaded in _x and _kph, outputs are left in the
+    buffers (used by flsh and state)'''
+    if routine == 'TP':
         _t.value, _p.value = var1, var2
         
         _rptpflsh_(byref(_t), byref(_p), _x, byref(_D), byref(_Dliq),
@@ -3348,7 +4415,7 @@ def flsh(routine, var1, var2, x, kph=1):
                     byref(_s), byref(_cv), byref(_cp), byref(_w), byref(_ierr),
                     byref(_herr), c_long(255))
 
-    elif routine.upper() == 'TD':
+    elif routine == 'TD':
         _t.value, _D.value = var1, var2
 
         _rptdflsh_(byref(_t), byref(_D), _x, byref(_p), byref(_Dliq),
@@ -3356,7 +4423,7 @@ def flsh(routine, var1, var2, x, kph=1):
                     byref(_s), byref(_cv), byref(_cp), byref(_w), byref(_ierr),
                     byref(_herr), c_long(255))
 
-    elif routine.upper() == 'TH':
+    elif routine == 'TH':
         _t.value, _h.value = var1, var2
 
         _rpthflsh_(byref(_t), byref(_h), _x, byref(_kph), byref(_p), byref(_D),
@@ -3364,7 +4431,7 @@ def flsh(routine, var1, var2, x, kph=1):
                     byref(_e), byref(_s), byref(_cv), byref(_cp), byref(_w),
                     byref(_ierr), byref(_herr), c_long(255))
 
-    elif routine.upper() == 'TS':
+    elif routine == 'TS':
         _t.value, _s.value = var1, var2
 
         _rptsflsh_(byref(_t), byref(_s), _x, byref(_kph), byref(_p), byref(_D),
@@ -3372,7 +4439,7 @@ def flsh(routine, var1, var2, x, kph=1):
                     byref(_e), byref(_h), byref(_cv), byref(_cp), byref(_w),
                     byref(_ierr), byref(_herr), c_long(255))
 
-    elif routine.upper() == 'TE':
+    elif routine == 'TE':
         _t.value, _e.value = var1, var2
 
         _rpteflsh_(byref(_t), byref(_e), _x, byref(_kph), byref(_p), byref(_D),
@@ -3380,7 +4447,7 @@ def flsh(routine, var1, var2, x, kph=1):
                     byref(_h), byref(_s), byref(_cv), byref(_cp), byref(_w),
                     byref(_ierr), byref(_herr), c_long(255))
 
-    elif routine.upper() == 'PD':
+    elif routine == 'PD':
         _p.value, _D.value = var1, var2
 
         _rppdflsh_(byref(_p), byref(_D), _x, byref(_t), byref(_Dliq),
@@ -3388,7 +4455,7 @@ def flsh(routine, var1, var2, x, kph=1):
                     byref(_s), byref(_cv), byref(_cp), byref(_w), byref(_ierr),
                     byref(_herr), c_long(255))
 
-    elif routine.upper() == 'PH':
+    elif routine == 'PH':
         _p.value, _h.value = var1, var2
         
         _rpphflsh_(byref(_p), byref(_h), _x, byref(_t), byref(_D),
@@ -3396,7 +4463,7 @@ def flsh(routine, var1, var2, x, kph=1):
                     byref(_e), byref(_s), byref(_cv), byref(_cp), byref(_w),
                     byref(_ierr), byref(_herr), c_long(255))
 
-    elif routine.upper() == 'PS':
+    elif routine == 'PS':
         _p.value, _s.value = var1, var2
 
         _rppsflsh_(byref(_p), byref(_s), _x, byref(_t), byref(_D),
@@ -3404,7 +4471,7 @@ def flsh(routine, var1, var2, x, kph=1):
                     byref(_e), byref(_h), byref(_cv), byref(_cp), byref(_w),
                     byref(_ierr), byref(_herr), c_long(255))
 
-    elif routine.upper() == 'PE':
+    elif routine == 'PE':
         _p.value, _e.value = var1, var2
         
         _rppeflsh_(byref(_p), byref(_e), _x, byref(_t), byref(_D), byref(_Dliq),
@@ -3412,7 +4479,7 @@ def flsh(routine, var1, var2, x, kph=1):
                     byref(_cv), byref(_cp), byref(_w), byref(_ierr),
                     byref(_herr), c_long(255))
 
-    elif routine.upper() == 'HS':
+    elif routine == 'HS':
         _h.value, _s.value = var1, var2
         
         _rphsflsh_(byref(_h), byref(_s), _x, byref(_t), byref(_p), byref(_D),
@@ -3420,7 +4487,7 @@ def flsh(routine, var1, var2, x, kph=1):
                     byref(_e), byref(_cv), byref(_cp), byref(_w), byref(_ierr),
                     byref(_herr), c_long(255))
 
-    elif routine.upper() == 'ES':
+    elif routine == 'ES':
         _e.value, _s.value = var1, var2
         
         _rpesflsh_(byref(_e), byref(_s), _x, byref(_t), byref(_p), byref(_D),
@@ -3428,7 +4495,7 @@ def flsh(routine, var1, var2, x, kph=1):
                     byref(_h), byref(_cv), byref(_cp), byref(_w), byref(_ierr),
                     byref(_herr), c_long(255))
 
-    elif routine.upper() == 'DH':
+    elif routine == 'DH':
         _D.value, _h.value = var1, var2
         
         _rpdhflsh_(byref(_D), byref(_h), _x, byref(_t), byref(_p), byref(_Dliq),
@@ -3436,7 +4503,7 @@ def flsh(routine, var1, var2, x, kph=1):
                     byref(_cv), byref(_cp), byref(_w), byref(_ierr),
                     byref(_herr), c_long(255))
 
-    elif routine.upper() == 'DS':
+    elif routine == 'DS':
         _D.value, _s.value = var1, var2
 
         _rpdsflsh_(byref(_D), byref(_s), _x, byref(_t), byref(_p), byref(_Dliq),
@@ -3444,7 +4511,7 @@ def flsh(routine, var1, var2, x, kph=1):
                     byref(_cv), byref(_cp), byref(_w), byref(_ierr),
                     byref(_herr), c_long(255))
 
-    elif routine.upper() == 'DE':
+    elif routine == 'DE':
         _D.value, _e.value = var1, var2
 
         _rpdeflsh_(byref(_D), byref(_e), _x, byref(_t), byref(_p), byref(_Dliq),
@@ -3452,7 +4519,7 @@ def flsh(routine, var1, var2, x, kph=1):
                     byref(_cv), byref(_cp), byref(_w), byref(_ierr),
                     byref(_herr), c_long(255))
 
-    elif routine.upper() == 'TQ':
+    elif routine == 'TQ':
         _t.value, _q.value = var1, var2
 
         _rptqflsh_(byref(_t), byref(_q), _x, byref(c_long(1)), byref(_p),
@@ -3460,7 +4527,7 @@ def flsh(routine, var1, var2, x, kph=1):
                     byref(_e), byref(_h), byref(_s), byref(_cv), byref(_cp),
                     byref(_w), byref(_ierr), byref(_herr), c_long(255))
     
-    elif routine.upper() == 'PQ':
+    elif routine == 'PQ':
         _p.value, _q.value = var1, var2
 
         _rppqflsh_(byref(_p), byref(_q), _x, byref(c_long(1)), byref(_t),
@@ -3471,6 +4538,81 @@ def flsh(routine, var1, var2, x, kph=1):
     else: raise RefpropinputError('Incorrect "routine" input, ' + str(routine) +
                                             ' is an invalid input')
 
+
+def flsh(routine, var1, var2, x, kph=1):
+    '''Flash calculation given two independent variables and bulk
+    composition
+
+    These routines accept both single-phase and two-phase states as the
+    input; if the phase is known, the specialized routines are faster
+
+    inputs:
+        routine--set input variables:
+            'TP'--temperature; pressure
+            'TD'--temperature; Molar Density
+            'TH'--temperature; enthalpy
+            'TS'--temperature; entropy
+            'TE'--temperature; internal energy
+            'PD'--pressure; molar density
+            'PH'--pressure; enthalpy
+            'PS'--pressure; entropy
+            'PE'--pressure; internal energy
+            'HS'--enthalpy; entropy
+            'ES'--internal energy; entropy
+            'DH'--molar density; enthalpy
+            'DS'--molar density; entropy
+            'DE'--molar density; internal energy
+            'TQ'--temperature; vapour quality
+            'PQ'--pressure; vapour qaulity
+        var1, var2--two of the following as indicated by the routine input:
+            t--temperature [K]
+            p--pressure [kPa]
+            e--internal energy [J/mol]
+            h--enthalpy [J/mol]
+            s--entropy [[J/mol-K]
+            q--vapor quality on molar basis [moles vapor/total moles]
+                q = 0 indicates saturated liquid
+                0 < q < 1 indicates 2 phase state
+                q = 1 indicates saturated vapor
+                q < 0 or q > 1 are not allowed and will result in warning
+        x--overall (bulk) composition [array of mol frac]
+        kph--phase flag:
+            N.B. only applicable for routine setting 'TE', 'TH' and 'TS'
+            1=liquid,
+            2=vapor in equilibrium with liq,
+            3=liquid in equilibrium with solid,
+            4=vapor in equilibrium with solid.
+    outputs:
+        t--temperature [K]
+        p--pressure [kPa]
+        D--overall (bulk) molar density [mol/L]
+        Dliq--molar density [mol/L] of the liquid phase
+        Dvap--molar density [mol/L] of the vapor phase
+            if only one phase is present, Dl = Dv = D
+        xliq--composition of liquid phase [array of mol frac]
+        xvap--composition of vapor phase [array of mol frac]
+            if only one phase is present, x = xliq = xvap
+        q--vapor quality on a MOLAR basis [moles vapor/total moles]
+            q < 0 indicates subcooled (compressed) liquid
+            q = 0 indicates saturated liquid
+            0 < q < 1 indicates 2 phase state
+            q = 1 indicates saturated vapor
+            q > 1 indicates superheated vapor
+            q = 998 superheated vapor, but quality not defined (t > Tc)
+            q = 999 indicates supercritical state (t > Tc) and (p > Pc)
+        e--overall (bulk) internal energy [J/mol]
+        h--overall (bulk) enthalpy [J/mol]
+        s--overall (bulk) entropy [J/mol-K]
+        cv--isochoric (constant V) heat capacity [J/mol-K]
+        cp--isobaric (constant p) heat capacity [J/mol-K]
+        w--speed of sound [m/s]
+            cp, cv and w are not defined for 2-phase states in such cases'''
+
+    _inputerrorcheck(locals())
+    _kph.value = kph
+    for each in range(len(x)): _x[each] = x[each]
+    _flshcall(routine.upper(), var1, var2)
+
     xliq = normalize([_xliq[each] for each in range(_nc_rec.record)])['x']
     xvap = normalize([_xvap[each] for each in range(_nc_rec.record)])['x']
     if '_purefld_rec' in _Setuprecord.object_list \
@@ -4305,7 +5447,8 @@ def info(icomp=1):
                   byref(_acf), byref(_dip), byref(_Rgas))
 
     return _prop(icomp = icomp, wmm = _wmm.value, ttrp = _ttrp.value,
-            tnbpt = _tnbpt.value, tcrit = _tcrit.value, Dcrit = _Dcrit.value,
+            tnbpt = _tnbpt.value, tcrit = _tcrit.value, pcrit = _pcrit.value,
+            Dcrit = _Dcrit.value,
             zcrit = _zcrit.value, acf = _acf.value, dip = _dip.value,
             Rgas = _Rgas.value)
 
@@ -4786,6 +5929,883 @@ def trnprp(t, D, x):
             ierr = _ierr.value, herr = _herr.value, defname = 'trnprp')
 
 
+def curveorder(columns, bits=10):
+    '''Return the indices of the points of columns ordered along a Hilbert
+    curve, consecutive points of the order are close in all columns. Batch
+    calculations run in this order converge faster from the previous
+    solution (kept by the library) than in random order.
+
+    inputs:
+        columns--list of input columns (list, array or numpy array) of equal
+            length, a column of lists (e.g. compositions) adds one dimension
+            per list item, columns of strings and constant columns are
+            ignored
+        bits--resolution of the curve per dimension (2 ** bits cells),
+            limited to 63 bits per point with numpy
+    output:
+        list of indices, the inverse permutation scatters results of the
+        order back: result[order[each]] = ordered[each]'''
+    try:
+        import numpy
+    except ImportError:
+        numpy = None
+    size = len(columns[0]) if columns else 0
+    #scale each dimension to integers 0 .. 2 ** bits - 1
+    dims = []
+    for column in columns:
+        if len(column) != size:
+            raise RefpropinputError('columns should have equal length')
+        if not size or isinstance(column[0], str):
+            continue
+        if hasattr(column[0], '__len__'):
+            dims.extend([each[item] for each in column] for item in
+                        range(len(column[0])))
+        else:
+            dims.append(column)
+    #ranges of the non constant dimensions, non finite values (nan, inf)
+    #are placed in the first cell
+    ranges = []
+    for dim in dims:
+        values = [value for value in dim if isfinite(value)]
+        low, high = min(values or [0]), max(values or [0])
+        if high > low:
+            ranges.append((dim, low, high))
+    if numpy != None:
+        bits = max(min(bits, 63 // max(len(ranges), 1)), 1)
+    top = (1 << bits) - 1
+    scaled = []
+    for dim, low, high in ranges:
+        factor = top / float(high - low)
+        scaled.append([int((value - low) * factor) if isfinite(value) else 0
+                       for value in dim])
+    if not scaled:
+        return list(range(size))
+    if numpy != None:
+        X = [numpy.array(dim, dtype=numpy.int64) for dim in scaled]
+        return numpy.argsort(_hilbertkeys(X, bits, numpy.where),
+                             kind='stable').tolist()
+    keys = [_hilbertkey(list(point), bits) for point in zip(*scaled)]
+    return sorted(range(size), key=keys.__getitem__)
+
+def _hilbertkey(X, bits):
+    '''return the Hilbert curve index of the integer coordinates X (list,
+    changed in place), see Skilling, AIP Conf. Proc. 707, 2004'''
+    n = len(X)
+    #inverse undo excess work
+    Q = 1 << (bits - 1)
+    while Q > 1:
+        P = Q - 1
+        for i in range(n):
+            if X[i] & Q:
+                X[0] ^= P
+            else:
+                t = (X[0] ^ X[i]) & P
+                X[0] ^= t
+                X[i] ^= t
+        Q >>= 1
+    #gray encode
+    for i in range(1, n):
+        X[i] ^= X[i - 1]
+    t = 0
+    Q = 1 << (bits - 1)
+    while Q > 1:
+        if X[n - 1] & Q:
+            t ^= Q - 1
+        Q >>= 1
+    #interleave the bits of the transposed index, highest bits first
+    key = 0
+    for b in range(bits - 1, -1, -1):
+        for i in range(n):
+            key = (key << 1) | (((X[i] ^ t) >> b) & 1)
+    return key
+
+def _hilbertkeys(X, bits, where):
+    '''array variant of _hilbertkey for a list of numpy int64 arrays X,
+    where is numpy.where'''
+    n = len(X)
+    Q = 1 << (bits - 1)
+    while Q > 1:
+        P = Q - 1
+        for i in range(n):
+            hit = (X[i] & Q) != 0
+            t = where(hit, 0, (X[0] ^ X[i]) & P)
+            X[0] = where(hit, X[0] ^ P, X[0] ^ t)
+            if i:
+                X[i] = X[i] ^ t
+        Q >>= 1
+    for i in range(1, n):
+        X[i] = X[i] ^ X[i - 1]
+    t = X[0] & 0
+    Q = 1 << (bits - 1)
+    while Q > 1:
+        t = where((X[n - 1] & Q) != 0, t ^ (Q - 1), t)
+        Q >>= 1
+    key = X[0] & 0
+    for b in range(bits - 1, -1, -1):
+        for i in range(n):
+            key = (key << 1) | (((X[i] ^ t) >> b) & 1)
+    return key
+
+
+def uniqueinputs(columns):
+    '''Return (first, inverse) of the unique input rows of columns: first
+    lists the index of the first occurrence of each unique row, inverse the
+    position in first of each row (row i equals row first[inverse[i]]). Uses
+    numpy.unique for numeric columns when numpy is installed.
+
+    inputs:
+        columns--list of input columns (list, array or numpy array) of equal
+            length, items may be lists (e.g. compositions)'''
+    try:
+        import numpy
+    except ImportError:
+        numpy = None
+    size = len(columns[0]) if columns else 0
+    for column in columns:
+        if len(column) != size:
+            raise RefpropinputError('columns should have equal length')
+    numeric = numpy != None and size and not any(
+        hasattr(column[0], '__len__') for column in columns)
+    if numeric:
+        rows = numpy.column_stack([numpy.asarray(column, dtype=float) for
+                                   column in columns])
+        unique, first, inverse = numpy.unique(rows, axis=0,
+                                              return_index=True,
+                                              return_inverse=True)
+        #numbered in order of first occurrence
+        order = numpy.argsort(first, kind='stable')
+        rank = numpy.empty(len(order), dtype=numpy.int64)
+        rank[order] = numpy.arange(len(order))
+        return first[order].tolist(), rank[inverse.reshape(-1)].tolist()
+    first, inverse, seen = [], [], {}
+    for index, row in enumerate(zip(*columns)):
+        key = tuple(tuple(each) if hasattr(each, '__len__') and not
+                    isinstance(each, str) else each for each in row)
+        number = seen.get(key)
+        if number == None:
+            number = seen[key] = len(first)
+            first.append(index)
+        inverse.append(number)
+    return first, inverse
+
+def _batchorder(columns, order, dedup):
+    '''return (indices, unique) of a batch of inputs columns: the indices of
+    the inputs to calculate (in curve order with order) and (first,
+    inverse) of uniqueinputs with dedup (None without)'''
+    unique = uniqueinputs(columns) if dedup else None
+    indices = unique[0] if dedup else range(len(columns[0]))
+    if order:
+        if dedup:
+            columns = [[column[each] for each in indices] for column in
+                       columns]
+        indices = [indices[each] for each in curveorder(columns)]
+    return indices, unique
+
+def _expandbatch(prps, outputs, errors, unique, warnings=None):
+    '''copy the outputs, errors and warnings of the calculated inputs to
+    their duplicates and return the dedup statistics'''
+    first, inverse = unique
+    for index, number in enumerate(inverse):
+        source = first[number]
+        if source != index:
+            for output in outputs:
+                prps[output][index] = prps[output][source]
+            if source in errors:
+                errors[index] = errors[source]
+            if warnings != None and source in warnings:
+                warnings[index] = warnings[source]
+    return {'inputs':len(inverse), 'unique':len(first),
+            'duplicates':len(inverse) - len(first)}
+
+
+#(t, D) routines of thermbatch: library routine, output buffers following
+#t, D and x (spare buffers are not returned), error flag and message
+_thermbatch = {
+    'therm':('_rptherm_', ('_p', '_e', '_h', '_s', '_cv', '_cp', '_w',
+                           '_hjt'), False),
+    'therm2':('_rptherm2_', ('_p', '_e', '_h', '_s', '_cv', '_cp', '_w',
+                             '_Z', '_hjt', '_A', '_G', '_xkappa', '_beta',
+                             '_dpdD', '_d2pdD2', '_dpdt', '_dDdt', '_dDdp',
+                             '_spare1', '_spare2', '_spare3', '_spare4'),
+              False),
+    'therm3':('_rptherm3_', ('_xkappa', '_beta', '_xisenk', '_xkt',
+                             '_betas', '_bs', '_xkkt', '_thrott', '_pint',
+                             '_spht'), False),
+    'trnprp':('_rptrnprp_', ('_eta', '_tcx'), True),
+    'dielec':('_rpdielec_', ('_de',), False)}
+
+
+def thermbatch(t, D, x, routines=('therm',), outputs=None, out=None,
+               order=False, dedup=False):
+    '''Compute the outputs of therm, therm2, therm3, trnprp and / or dielec
+    for each pair of t[i], D[i] at composition x.
+
+    The input is checked and the composition is copied to the library once,
+    the outputs are written to preallocated arrays, which avoids the per call
+    overhead of the single state functions (input check and output
+    dictionary) on large arrays of states.
+
+    inputs:
+        t--temperatures [K] (list, array or numpy array)
+        D--molar densities [mol/L] of equal length as t
+        x--composition [array of mol frac]
+        routines--routines run for each state, any of 'therm', 'therm2',
+            'therm3', 'trnprp' and 'dielec'
+        outputs--names of the outputs to return (see the routines), None
+            for all outputs of routines
+        out--dictionary of output name: preallocated writable array (e.g.
+            numpy) or a frameRP.PropertyFrame, filled in place, other
+            outputs are returned as array('d')
+        order--calculate the states in Hilbert curve order of (t, D) (see
+            curveorder), the outputs are in the order of the inputs
+        dedup--calculate equal (t, D) inputs once (see uniqueinputs)
+    outputs:
+        arrays of the outputs (see therm, therm2, therm3, trnprp and
+            dielec) of each state
+        errors--dictionary of index: (ierr, herr) of the states of which
+            trnprp failed, their outputs of trnprp are nan (trnprp only)
+        warnings--dictionary of index: (ierr, herr) of the states of which
+            trnprp returned a warning (trnprp only)
+        dedup--statistics inputs, unique and duplicates (dedup only)'''
+    from array import array
+    _inputerrorcheck({'x':x})
+    if len(t) != len(D):
+        raise RefpropinputError('t and D should have equal length')
+    routines = [routines] if routines.__class__ is str else list(routines)
+    for routine in routines:
+        if routine not in _thermbatch:
+            raise RefpropinputError('unknown thermbatch routine "' +
+                                    str(routine) + '", select therm, ' +
+                                    'therm2, therm3, trnprp or dielec')
+    available = []
+    for routine in routines:
+        available.extend(buf[1:] for buf in _thermbatch[routine][1] if
+                         not buf.startswith('_spare'))
+    if outputs == None:
+        outputs = available
+    for output in outputs:
+        if output not in available:
+            raise RefpropinputError('output "' + str(output) + '" is not ' +
+                                    'calculated by ' + str(routines))
+    size = len(t)
+    prps = dict(out or {})
+    for output in outputs:
+        if output not in prps:
+            prps[output] = array('d', [0.0]) * size
+        elif len(prps[output]) != size:
+            raise RefpropinputError('out array ' + output + ' should have ' +
+                                    'length ' + str(size))
+
+    #plan of (routine, arguments, (output array, buffer) copies, errorflag),
+    #each output is copied once from the first routine calculating it
+    plan, copied = [], set()
+    for routine in routines:
+        name, buffers, errorflag = _thermbatch[routine]
+        func = globals()[name]
+        if func.__class__ is _Symbol:
+            func = _bindsymbol(name)
+        args = [byref(_t), byref(_D), _x]
+        args.extend(byref(globals()[buf]) for buf in buffers)
+        if errorflag:
+            args.extend((byref(_ierr), byref(_herr), c_long(255)))
+        copies = []
+        for buf in buffers:
+            if buf[1:] in outputs and buf[1:] not in copied:
+                copies.append((prps[buf[1:]], globals()[buf]))
+                copied.add(buf[1:])
+        plan.append((func, tuple(args), tuple(copies), errorflag))
+
+    for each in range(len(x)): _x[each] = x[each]
+    errors, warnings = {}, {}
+    nan = float('nan')
+    indices, unique = _batchorder([t, D], order, dedup)
+    for index in indices:
+        _t.value, _D.value = t[index], D[index]
+        for func, args, copies, errorflag in plan:
+            func(*args)
+            if errorflag and _ierr.value != 0:
+                herr = _herr.value.decode('utf-8', 'replace')
+                if _ierr.value < 0:
+                    #warning, the outputs are valid
+                    warnings[index] = (_ierr.value, herr)
+                else:
+                    errors[index] = (_ierr.value, herr)
+                    #outputs of the failed routine are undefined
+                    for array_out, buf in copies:
+                        array_out[index] = nan
+                    continue
+            for array_out, buf in copies:
+                array_out[index] = buf.value
+    if dedup:
+        prps['dedup'] = _expandbatch(prps, outputs, errors, unique, warnings)
+    if 'trnprp' in routines:
+        prps['errors'] = errors
+        prps['warnings'] = warnings
+    return _prop(x = x, **prps)
+
+
+#outputs of the flash routines, the other outputs of state are calculated at
+#t and D of the flash
+_flshoutputs = ('t', 'p', 'D', 'Dliq', 'Dvap', 'q', 'e', 'h', 's', 'cv', 'cp',
+                'w', 'xliq', 'xvap')
+#flash outputs stored by State.update
+_stateflash = _flshoutputs[:-2]
+#saturation cache of State: half width [K] of the bands and margin (relative
+#to the saturation pressure) of a warm start
+_satwidth = 5.0
+_satmargin = 0.02
+#liquid density input of surft in state (> 0 saturated liquid, < 0 by SATT)
+_Dsigma = c_double()
+_stateplans = {}
+
+
+def _stateplan(outputs):
+    '''return plan (flash outputs, calls) of state outputs, calls are the
+    (t, D) routines (library routine, arguments, ((output, buffer), ...),
+    errorflag) run after the flash, each output from the first routine
+    calculating it'''
+    if outputs in _stateplans:
+        return _stateplans[outputs]
+    flash = tuple(each for each in outputs if each in _flshoutputs)
+    remaining = [each for each in outputs if each not in _flshoutputs]
+    calls = []
+    for routine in ('trnprp', 'dielec', 'therm2', 'therm3'):
+        name, buffers, errorflag = _thermbatch[routine]
+        copies = tuple((buf[1:], globals()[buf]) for buf in buffers if
+                       buf[1:] in remaining)
+        if not copies:
+            continue
+        args = [byref(_t), byref(_D), _x]
+        args.extend(byref(globals()[buf]) for buf in buffers)
+        if errorflag:
+            args.extend((byref(_ierr), byref(_herr), c_long(255)))
+        calls.append((name, tuple(args), copies, errorflag))
+        remaining = [each for each in remaining if each not in
+                     [copy[0] for copy in copies]]
+    if 'sigma' in remaining:
+        calls.append(('_rpsurft_', (byref(_t), byref(_Dsigma), _x,
+                                    byref(_sigma), byref(_ierr),
+                                    byref(_herr), c_long(255)),
+                      (('sigma', _sigma),), True))
+        remaining.remove('sigma')
+    if remaining:
+        raise RefpropinputError('unknown state output(s) ' + str(remaining))
+    _stateplans[outputs] = flash, tuple(calls)
+    return _stateplans[outputs]
+
+
+def _statecalls(calls):
+    '''run the (t, D) calls of a state plan at the flash state, return
+    (ierr, herr) of the first failed call or None'''
+    for name, args, copies, errorflag in calls:
+        if name == '_rpsurft_':
+            #surface tension at the saturated liquid of the flash state
+            _Dsigma.value = _Dliq.value if 0 <= _q.value <= 1 else -1
+        globals()[name](*args)
+        if errorflag and _ierr.value != 0:
+            return _ierr.value, _herr.value
+    return None
+
+
+def state(routine, var1, var2, x, outputs=('t', 'p', 'D', 'h', 's'), kph=1):
+    '''Flash calculation returning only the requested outputs, with the
+    minimum set of library calls: the flash routine and only those (t, D)
+    routines (trnprp, dielec, therm2, therm3, surft) which calculate a
+    requested output. Post processing of unrequested outputs (e.g.
+    normalizing the phase compositions) is skipped.
+
+    inputs:
+        routine, var1, var2, x, kph--see flsh
+        outputs--names of the outputs:
+            t, p, D, Dliq, Dvap, q, e, h, s, cv, cp, w, xliq, xvap--see flsh
+            eta, tcx--see trnprp
+            de--see dielec
+            Z, hjt, A, G, xkappa, beta, dpdD, d2pdD2, dpdt, dDdt, dDdp--see
+                therm2
+            xisenk, xkt, betas, bs, xkkt, thrott, pint, spht--see therm3
+            sigma--surface tension [N/m] at t (see surft)
+    outputs:
+        dictionary of the requested outputs, cv, cp and w are nan for
+        2-phase states'''
+    _inputerrorcheck({'routine':routine, 'var1':var1, 'var2':var2, 'x':x,
+                      'kph':kph})
+    flash, calls = _stateplan(tuple(outputs))
+    _kph.value = kph
+    for each in range(len(x)): _x[each] = x[each]
+    _flshcall(routine.upper(), var1, var2)
+    failed = (_ierr.value, _herr.value) if _ierr.value != 0 else None
+    if failed == None or failed[0] < 0:
+        failed = _statecalls(calls) or failed
+    prps = _stateoutputs(flash, calls, x)
+    if failed != None:
+        _outputierrcheck(failed[0], failed[1], 'state', prps)
+    return prps
+
+
+def _stateoutputs(flash, calls, x):
+    'return dictionary of the outputs of a state plan from the buffers'
+    prps = {}
+    for output in flash:
+        if output == 'xliq' or output == 'xvap':
+            buf = _xliq if output == 'xliq' else _xvap
+            comp = normalize([buf[each] for each in
+                              range(_nc_rec.record)])['x']
+            if '_purefld_rec' in _Setuprecord.object_list and len(x) == 1 \
+            and len(comp) != 1:
+                comp = [comp[_purefld_rec.record['icomp'] - 1]]
+            prps[output] = comp
+        elif output in ('cv', 'cp', 'w') and _cp.value < 0:
+            #not defined for 2-phase states
+            prps[output] = float('nan')
+        else:
+            prps[output] = globals()['_' + output].value
+    for name, args, copies, errorflag in calls:
+        for output, buf in copies:
+            prps[output] = buf.value
+    return prps
+
+
+def statebatch(routine, var1, var2, x, outputs=('t', 'p', 'D', 'h', 's'),
+               kph=1, out=None, order=False, dedup=False):
+    '''Array variant of state, flash calculation of the requested outputs
+    for each pair of var1[i], var2[i] at composition x. The plan of library
+    calls is made and the composition is copied once.
+
+    inputs:
+        routine, x, kph--see flsh
+        var1, var2--arrays (list, array or numpy array) of equal length
+        outputs--see state, except xliq and xvap
+        out--dictionary of output name: preallocated writable array (e.g.
+            numpy) or a frameRP.PropertyFrame, filled in place, other
+            outputs are returned as array('d')
+        order--flash the states in Hilbert curve order of (var1, var2)
+            (see curveorder), the outputs are in the order of the inputs
+        dedup--flash equal (var1, var2) inputs once (see uniqueinputs)
+    outputs:
+        arrays of the requested outputs, nan for failed states
+        errors--dictionary of index: (ierr, herr) of the failed states and
+            states with warnings
+        dedup--statistics inputs, unique and duplicates (dedup only)'''
+    from array import array
+    _inputerrorcheck({'routine':routine, 'x':x, 'kph':kph})
+    if len(var1) != len(var2):
+        raise RefpropinputError('var1 and var2 should have equal length')
+    outputs = tuple(outputs)
+    if 'xliq' in outputs or 'xvap' in outputs:
+        raise RefpropinputError('xliq and xvap are not available in ' +
+                                'statebatch, use state')
+    flash, calls = _stateplan(outputs)
+    size = len(var1)
+    prps = dict(out or {})
+    for output in outputs:
+        if output not in prps:
+            prps[output] = array('d', [0.0]) * size
+        elif len(prps[output]) != size:
+            raise RefpropinputError('out array ' + output + ' should have ' +
+                                    'length ' + str(size))
+    copies = [(prps[output], globals()['_' + output], output in
+               ('cv', 'cp', 'w')) for output in flash]
+    copies.extend((prps[output], buf, False) for name, args, callcopies,
+                  errorflag in calls for output, buf in callcopies)
+    routine = routine.upper()
+    nan = float('nan')
+    _kph.value = kph
+    for each in range(len(x)): _x[each] = x[each]
+    errors = {}
+    indices, unique = _batchorder([var1, var2], order, dedup)
+    for index in indices:
+        _flshcall(routine, var1[index], var2[index])
+        failed = (_ierr.value, _herr.value) if _ierr.value != 0 else None
+        if failed == None or failed[0] < 0:
+            failed = _statecalls(calls) or failed
+        if failed != None:
+            errors[index] = (failed[0], failed[1].decode('utf-8', 'replace'))
+            if failed[0] > 0:
+                for array_out, buf, twophase in copies:
+                    array_out[index] = nan
+                continue
+        undefined = _cp.value < 0
+        for array_out, buf, twophase in copies:
+            array_out[index] = nan if twophase and undefined else buf.value
+    if dedup:
+        prps['dedup'] = _expandbatch(prps, outputs, errors, unique)
+    prps['errors'] = errors
+    return prps
+
+
+def isobar(p, t, x, outputs=('t', 'p', 'D', 'h', 's'), prop=None, kph=1):
+    '''Return generator of the outputs (see state) along isobar p for each
+    temperature of iterable t. Each point is warm started from the density
+    of the previous point (see State), a cold flash is used across the
+    saturation curve.
+
+    inputs:
+        p--pressure [kPa]
+        t--(lazy) iterable of temperatures [K]
+        x--composition [array of mol frac]
+        outputs--names of the outputs, see state
+        prop--setup details (standard dictionary output from refprop
+            functions), None for the loaded setup
+        kph--phase flag of the cold flash (see flsh)'''
+    fluid = State(prop, x, kph)
+    for each in t:
+        yield fluid.update('tp', each, p).outputs(outputs)
+
+
+def isotherm(t, p, x, outputs=('t', 'p', 'D', 'h', 's'), prop=None, kph=1):
+    '''Return generator of the outputs (see state) along isotherm t for
+    each pressure of iterable p, warm started as isobar.'''
+    fluid = State(prop, x, kph)
+    for each in p:
+        yield fluid.update('tp', t, each).outputs(outputs)
+
+
+#flash input pairs of isoline
+_flshpairs = ('TP', 'TD', 'TH', 'TS', 'TE', 'PD', 'PH', 'PS', 'PE', 'HS', 'ES',
+              'DH', 'DS', 'DE')
+#saturation points of isolines, least recently used first
+_isolinesat = OrderedDict()
+_isolinesatsize = 4096 #maximum no. of cached isolines
+
+
+def isoline(fixed, value, along, limits, x, outputs=('t', 'p', 'D', 'h', 's'),
+            tol=0.002, maxstep=None, minstep=None, prop=None, kph=1):
+    '''Return generator of the outputs (see state) along the isoline
+    fixed = value (e.g. isobar 'p' = 100) from along = limits[0] to
+    limits[1] (e.g. 'h'), for P-h, T-s etc. diagrams and tables.
+
+    The step size is adapted to the curvature: the outputs of each point are
+    compared to the linear extrapolation of the previous two points, the
+    step grows where the isoline is straight and shrinks (the point is
+    recalculated) where it bends. On isobars and isotherms the bubble and
+    dew points (cached per setup, isoline and composition) are inserted as
+    points and the extrapolation restarts after the kink. Each point is
+    warm started from the previous point (see State, 'tp' isolines).
+
+    inputs:
+        fixed--fixed variable 't', 'p', 'D', 'h', 's' or 'e'
+        value--value of fixed
+        along--variable stepped along the isoline (another of the above)
+        limits--(start, end) of along
+        x--composition [array of mol frac]
+        outputs--names of the outputs, see state
+        tol--tolerated deviation from the linear extrapolation, relative to
+            the range of each output on the isoline
+        maxstep--maximum step of along (default 1/10 of the range)
+        minstep--minimum step of along (default 1/10000 of the range)
+        prop--setup details (standard dictionary output from refprop
+            functions), None for the loaded setup
+        kph--phase flag of the flash (see flsh)'''
+    fixed, along = fixed.upper(), along.upper()
+    if fixed + along in _flshpairs:
+        routine, first = fixed + along, True
+    elif along + fixed in _flshpairs:
+        routine, first = along + fixed, False
+    else:
+        raise RefpropinputError('no flash routine for isoline ' + fixed +
+                                ' along ' + along)
+    start, end = limits
+    span = end - start
+    if span == 0:
+        raise RefpropinputError('limits should differ')
+    maxstep = abs(maxstep or span / 10.0)
+    minstep = abs(minstep or span / 10000.0)
+    direction = 1 if span > 0 else -1
+    fluid = State(prop, x, kph)
+    outputs = tuple(outputs)
+    keys = [each for each in outputs if each.upper() not in (fixed, along)
+            and each not in ('xliq', 'xvap')]
+    #saturation points inside the limits, ordered along the isoline
+    breaks = sorted(set(each for each in _isolinebreaks(fluid, fixed, value,
+                                                        along) if
+                        min(start, end) < each < max(start, end)),
+                    reverse=direction < 0)
+
+    def point(var):
+        'outputs at along = var, None if the flash fails'
+        try:
+            if first:
+                fluid.update(routine, value, var)
+            else:
+                fluid.update(routine, var, value)
+        except RefpropdllError:
+            return None
+        return fluid.outputs(outputs)
+
+    lows, highs = {}, {} #range of each output on the isoline
+    def deviation(prps, previous, step):
+        '''largest relative deviation of prps from the extrapolation,
+        non finite outputs (e.g. cv, cp and w of 2-phase states) are
+        skipped'''
+        err = 0.0
+        (var0, prps0), (var1, prps1) = previous
+        for key in keys:
+            y0, y1, y = prps0[key], prps1[key], prps[key]
+            if not (isfinite(y0) and isfinite(y1) and isfinite(y)):
+                continue
+            scale = max(highs[key] - lows[key], 1e-9 * abs(y), 1e-12)
+            predicted = y1 + (y1 - y0) / (var1 - var0) * step
+            err = max(err, abs(y - predicted) / scale)
+        return err
+
+    def track(prps):
+        'update the range of the finite outputs of prps'
+        for key in keys:
+            y = prps[key]
+            if not isfinite(y):
+                continue
+            if key not in lows or y < lows[key]:
+                lows[key] = y
+            if key not in highs or y > highs[key]:
+                highs[key] = y
+
+    var = start
+    step = min(maxstep, abs(span) / 50.0)
+    previous = [] #last two (along, outputs) since the last kink
+    prps = point(var)
+    if prps != None:
+        track(prps)
+        previous.append((var, prps))
+        yield prps
+    while direction * (end - var) > 0:
+        target = var + direction * step
+        #stop at the next saturation point and at the end
+        nextbreak = breaks[0] if breaks else None
+        kink = nextbreak != None and direction * (target - nextbreak) >= 0
+        if kink:
+            target = nextbreak
+        if direction * (target - end) > 0:
+            target = end
+        prps = point(target)
+        if prps == None:
+            #failed flash (e.g. near the critical point), step over
+            previous = []
+            var = target
+            if kink:
+                breaks.pop(0)
+            continue
+        track(prps)
+        if len(previous) == 2 and not kink:
+            err = deviation(prps, previous, target - previous[1][0])
+            if err > 4 * tol and step > minstep:
+                #bends too much, retry with a smaller step
+                step = max(step * max(0.2, (tol / err) ** 0.5), minstep)
+                continue
+            #second order error, grow or shrink the next step
+            factor = (tol / err) ** 0.5 if err > 0 else 2.0
+            step = min(max(step * min(max(factor, 0.2), 2.0), minstep),
+                       maxstep)
+        var = target
+        yield prps
+        if kink:
+            breaks.pop(0)
+            previous = [(var, prps)]
+        else:
+            previous = (previous + [(var, prps)])[-2:]
+
+
+def _isolinebreaks(fluid, fixed, value, along):
+    '''return along values of the bubble and dew point on isobar or
+    isotherm fixed = value of State fluid (cached), [] for other isolines
+    and supercritical isolines'''
+    if fixed not in ('T', 'P'):
+        return []
+    key = (fluid._key or fingerprint(), fixed, value, along, tuple(fluid.x))
+    if key in _isolinesat:
+        _isolinesat.move_to_end(key)
+        return _isolinesat[key]
+    fluid._load()
+    breaks = []
+    for kph in (1, 2):
+        try:
+            if fixed == 'P':
+                sat = satp(value, fluid.x, kph)
+            else:
+                sat = satt(value, fluid.x, kph)
+        except RefpropError:
+            continue
+        D = sat['Dliq'] if kph == 1 else sat['Dvap']
+        if along in ('T', 'P'):
+            breaks.append(sat[along.lower()])
+        elif along == 'D':
+            breaks.append(D)
+        else:
+            breaks.append(therm(sat['t'], D, fluid.x)[along.lower()])
+    _isolinesat[key] = breaks
+    if len(_isolinesat) > _isolinesatsize:
+        _isolinesat.popitem(False)
+    return breaks
+
+
+#phase envelopes of phase_envelope
+#(setup key, composition, settings): traced envelope, least recently used
+#first
+_envelopes = OrderedDict()
+_envelopesize = 256 #maximum no. of cached envelopes
+
+
+def phase_envelope(x, pmin=10, tol=0.005, maxstep=0.1, minstep=1e-4,
+                   maxpoints=500, prop=None):
+    '''Trace the phase envelope (bubble and dew curve) of composition x by
+    continuation from pmin to the critical region, where satp or satt on a
+    fixed grid fail.
+
+    Each curve is followed in ln t and ln p: the next point is specified in
+    the variable changing fastest along the curve (satp where the curve is
+    steep in p, satt around the cricondenbar) and predicted by linear
+    extrapolation of the previous two points. Steps grow where the curve is
+    straight and are retried smaller where the prediction of the other
+    variable or the phase densities fails (bends or a jump to another root).
+    Where the minimum step fails the other variable is specified for the
+    rest of the curve, which ends at the critical point (equal phase
+    densities) or where the minimum step fails again. The envelopes of the
+    256 most recently used setups, compositions and settings are cached.
+
+    inputs:
+        x--composition [array of mol frac]
+        pmin--pressure [kPa] of the first bubble and dew point
+        tol--tolerated deviation of the prediction [ln units]
+        maxstep, minstep--maximum and minimum step [ln units]
+        maxpoints--maximum no. of points per curve
+        prop--setup details (standard dictionary output from refprop
+            functions), None for the loaded setup
+    outputs:
+        bubble, dew--dictionaries of the lists t [K], p [kPa], Dliq, Dvap
+            [mol/L] along the curve
+        cricondenbar--(t, p) of the maximum pressure of the envelope, None
+            if not traced
+        cricondentherm--(t, p) of the maximum temperature of the envelope,
+            None if not traced'''
+    if prop != None and fingerprint(prop) != _loadedfingerprint():
+        resetup(prop)
+    _inputerrorcheck({'x':x})
+    x = list(x)
+    key = (_loadedfingerprint(), tuple(x), pmin, tol, maxstep, minstep,
+           maxpoints)
+    if key not in _envelopes:
+        for each in range(len(x)): _x[each] = x[each]
+        curves = tuple(_tracesat(kph, pmin, tol, maxstep, minstep, maxpoints)
+                       for kph in (1, 2))
+        _envelopes[key] = (curves, _envelopeextreme(curves, 1),
+                           _envelopeextreme(curves, 0))
+        if len(_envelopes) > _envelopesize:
+            _envelopes.popitem(False)
+    else:
+        _envelopes.move_to_end(key)
+    curves, bar, tmax = _envelopes[key]
+    bubble, dew = [dict(zip(('t', 'p', 'Dliq', 'Dvap'),
+                            [list(each) for each in zip(*curve)] or
+                            [[], [], [], []])) for curve in curves]
+    return _prop(x = x, bubble = bubble, dew = dew, cricondenbar = bar,
+                 cricondentherm = tmax)
+
+
+def _satpoint(var, value, kph):
+    '''return (t, p, Dliq, Dvap) of the saturation point var ('t' or 'p') =
+    value of the composition loaded in _x, None if satt / satp fails'''
+    _kph.value = kph
+    if var == 't':
+        _t.value = value
+        _rpsatt_(byref(_t), _x, byref(_kph), byref(_p), byref(_Dliq),
+                 byref(_Dvap), _xliq, _xvap, byref(_ierr), byref(_herr),
+                 c_long(255))
+    else:
+        _p.value = value
+        _rpsatp_(byref(_p), _x, byref(_kph), byref(_t), byref(_Dliq),
+                 byref(_Dvap), _xliq, _xvap, byref(_ierr), byref(_herr),
+                 c_long(255))
+    if _ierr.value > 0 or min(_t.value, _p.value, _Dliq.value,
+                              _Dvap.value) <= 0:
+        return None
+    return _t.value, _p.value, _Dliq.value, _Dvap.value
+
+
+def _tracesat(kph, pmin, tol, maxstep, minstep, maxpoints):
+    '''return list of (t, p, Dliq, Dvap) of the bubble (kph 1) or dew (kph
+    2) curve traced from pmin, see phase_envelope'''
+    point = _satpoint('p', pmin, kph)
+    if point == None:
+        return []
+    points = [point]
+    step = min(0.05, maxstep)
+    forced = None #variable specified after a failure of the other one
+    while len(points) < maxpoints:
+        last = [log(each) for each in points[-1]]
+        if len(points) == 1:
+            var, sign, slope = 1, 1, None
+        else:
+            #specify the variable changing fastest, continue its direction
+            delta = [a - b for a, b in zip(last, [log(each) for each in
+                                                  points[-2]])]
+            var = 1 if abs(delta[1]) >= abs(delta[0]) else 0
+            if forced != None:
+                var = forced
+            sign = 1 if delta[var] > 0 else -1
+            slope = [each / delta[var] for each in delta]
+        target = last[var] + sign * step
+        point = _satpoint('tp'[var], exp(target), kph)
+        if point != None and slope != None:
+            #deviation of t or p and the densities from the prediction
+            err = max(abs(log(value) - (ln + slope[each] * sign * step)) for
+                      each, (value, ln) in enumerate(zip(point, last)) if
+                      each != var)
+            if err > 4 * tol:
+                if step <= minstep:
+                    if forced != None:
+                        #jump to another root at the minimum step
+                        break
+                    #other root of satp / satt, specify the other variable
+                    forced, step = 1 - var, min(0.05, maxstep)
+                    continue
+                step = max(step * max(0.2, (tol / err) ** 0.5), minstep)
+                continue
+            factor = (tol / err) ** 0.5 if err > 0 else 2.0
+            step = min(max(step * min(max(factor, 0.2), 2.0), minstep),
+                       maxstep)
+        elif point == None:
+            if step <= minstep:
+                if forced != None or slope == None:
+                    break
+                forced, step = 1 - var, min(0.05, maxstep)
+                continue
+            step = max(step / 4, minstep)
+            continue
+        points.append(point)
+        if abs(log(point[2] / point[3])) < 2 * tol:
+            #critical point, equal phase densities
+            break
+    return points
+
+
+def _envelopeextreme(curves, index):
+    '''return (t, p) of the maximum of index (0 for t, 1 for p) of the
+    traced curves, refined by a parabola through the maximum point and its
+    neighbours, None if no point was traced'''
+    best = None
+    for curve in curves:
+        for each in range(len(curve)):
+            if best == None or curve[each][index] > best[0][best[1]][index]:
+                best = curve, each
+    if best == None:
+        return None
+    curve, each = best
+    if 0 < each < len(curve) - 1:
+        other = 1 - index
+        (u0, y0), (u1, y1), (u2, y2) = [(point[other], point[index]) for
+                                        point in curve[each - 1:each + 2]]
+        d = (u0 - u1) * (u0 - u2) * (u1 - u2)
+        if d != 0:
+            a = (u2 * (y1 - y0) + u1 * (y0 - y2) + u0 * (y2 - y1)) / d
+            b = (u2 ** 2 * (y0 - y1) + u1 ** 2 * (y2 - y0) +
+                 u0 ** 2 * (y1 - y2)) / d
+            if a < 0:
+                u = -b / (2 * a)
+                y = y1 + a * (u - u1) ** 2 + (2 * a * u1 + b) * (u - u1)
+                if min(u0, u2) <= u <= max(u0, u2) and y >= y1:
+                    return (u, y) if index == 1 else (y, u)
+    return curve[each][:2]
+
+
 def getktv(icomp, jcomp):
     '''Retrieve mixture model and parameter info for a specified binary
 
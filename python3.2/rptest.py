@@ -16,13 +16,373 @@ import platform
 def settest(test):
     '''set test module
     'refprop' or 'multiRP'
-    and execute test run'''
+    and execute test run
+    'distRP' tests the coordinator with workers on localhost (pure python
+    tasks, no refprop installation required)
+    'batch' tests the batch helpers, frames, sinks, sweeps and pools with
+    pure python functions (no refprop installation required)
+    'order' benchmarks statebatch in input and in curve order'''
     if test == 'refprop':
         import refprop as rp
         _maintest(rp)
     elif test == 'multiRP':
         import multiRP as rp
         _maintest(rp)
+    elif test == 'distRP':
+        _disttest()
+    elif test == 'batch':
+        _batchtest()
+    elif test == 'order':
+        _orderbenchmark()
+
+#pure python tasks of the pool tests, importable by the workers
+def _square(value):
+    return value * value
+
+def _sleep(seconds):
+    import time
+    time.sleep(seconds)
+    return seconds
+
+def _fail(value):
+    if value == 3:
+        raise ValueError('failed input 3')
+    return value
+
+def _state(t, p):
+    if t == 13:
+        raise ValueError('failed input 13')
+    #ierr -1, a warning
+    return {'t':t, 'p':p, 'D':t / p, 'ierr':-1 if t == 7 else 0,
+            'herr':'warning' if t == 7 else ''}
+
+#distRP test, coordinator and workers on localhost
+def _disttest():
+    import os
+    import time
+    import distRP
+    import multiRP
+    authkey = os.urandom(16)
+    with distRP.Coordinator(('127.0.0.1', 0), authkey=authkey,
+                            timeout=30) as pool:
+        workers = distRP.startworkers(pool.address, 2, authkey)
+        #wait for both workers to register
+        for each in range(100):
+            if len(pool.workers()) == 2:
+                break
+            time.sleep(0.1)
+
+        print('distRP imap')
+        result = list(pool.imap(_square, ((each,) for each in range(100)),
+                                chunksize=7))
+        print(result[:10], '\n')
+        assert result == [each * each for each in range(100)]
+
+        print('distRP workers')
+        print(pool.workers(), '\n')
+        assert len(pool.workers()) == 2
+
+        #the worker exceeding its time budget is dropped and stops after
+        #its task
+        print('distRP imap, timeout and skiperrors')
+        result = list(pool.imap(_sleep, [(0,), (3,), (0,)], chunksize=1,
+                                timeout=1, skiperrors=True))
+        print(result, '\n')
+        assert result[0] == 0 and result[2] == 0
+        assert isinstance(result[1], multiRP.TaskError)
+    for process in workers:
+        process.join(10)
+        assert not process.is_alive()
+
+#tests of the parts of the batch modules not calling refprop
+def _batchtest():
+    _ordertest()
+    _indextest()
+    _frametest()
+    _sinktest()
+    _sweeptest()
+    _batchertest()
+    _pooltest()
+
+#curveorder, uniqueinputs and the dedup of imap
+def _ordertest():
+    import random
+    import refprop
+    import multiRP
+    random.seed(1)
+    t = [random.uniform(250, 650) for each in range(1000)]
+    p = [random.uniform(100, 20000) for each in range(1000)]
+    order = refprop.curveorder([t, p])
+    print('curveorder')
+    print(order[:10], '\n')
+    assert sorted(order) == list(range(1000))
+    #consecutive points are closer than in input order
+    def path(indices):
+        return sum(abs(t[a] - t[b]) / 400 + abs(p[a] - p[b]) / 19900 for
+                   a, b in zip(indices, indices[1:]))
+    assert path(order) < path(list(range(1000))) / 5
+
+    print('curveorder, non finite values and compositions')
+    order = refprop.curveorder([[1.0, float('nan'), 3.0, 2.0]])
+    print(order, '\n')
+    #non finite values share the first cell with the minimum
+    assert order == [0, 1, 3, 2]
+    order = refprop.curveorder([[1.0, 2.0, 3.0, 2.0],
+                                [[0.5, 0.5], [0.1, 0.9], [0.9, 0.1],
+                                 [0.5, 0.5]]])
+    assert sorted(order) == [0, 1, 2, 3]
+
+    print('uniqueinputs')
+    first, inverse = refprop.uniqueinputs([[1.0, 2.0, 1.0, 3.0, 2.0],
+                                           [5.0, 6.0, 5.0, 7.0, 6.0]])
+    print(first, inverse, '\n')
+    assert list(first) == [0, 1, 3] and list(inverse) == [0, 1, 0, 2, 1]
+    first, inverse = refprop.uniqueinputs([[[0.5, 0.5], [0.2, 0.8],
+                                            [0.5, 0.5]]])
+    assert list(first) == [0, 1] and list(inverse) == [0, 1, 0]
+
+    print('_dedupmap, ordered and unordered')
+    inputs = [(each % 7,) for each in range(100)]
+    def mapper(iterable):
+        return (_square(*args) for args in iterable)
+    stats = {}
+    result = list(multiRP._dedupmap(mapper, inputs, True, stats))
+    print(stats, '\n')
+    assert result == [_square(*args) for args in inputs]
+    assert stats == {'inputs':100, 'unique':7, 'duplicates':93}
+    def unordered(iterable):
+        return enumerate(_square(*args) for args in iterable)
+    result = sorted(multiRP._dedupmap(unordered, inputs, False, True))
+    assert result == [(index, _square(*args)) for index, args in
+                      enumerate(inputs)]
+
+#fluid file index records
+def _indextest():
+    import os
+    import shutil
+    import tempfile
+    import refprop
+    dirname = tempfile.mkdtemp() + os.sep
+    try:
+        with open(dirname + 'TEST.FLD', 'w') as fluidfile:
+            fluidfile.write('TEST             !short name\n' +
+                            '7732-18-5        !CAS number\n' +
+                            'test fluid       !full name\n' +
+                            'H2O              !chemical formula\n' +
+                            '18.015268        !molecular weight [g/mol]\n' +
+                            '647.096          !critical temperature [K]\n' +
+                            '22064.0          !critical pressure [kPa]\n' +
+                            '#EOS             !equation of state\n' +
+                            '1.0              !acentric factor\n')
+        with open(dirname + 'TEST.MIX', 'w') as mixfile:
+            mixfile.write('TESTMIX  !name\n' +
+                          '28.96 132.5 3786.0 10.4\n' +
+                          '2\n' +
+                          'NITROGEN.FLD\n' +
+                          'OXYGEN.FLD\n' +
+                          '0.79 0.21\n')
+        print('_parsefld')
+        record = refprop._parsefld(dirname, 'TEST.FLD')
+        print(record, '\n')
+        assert record['hname'] == 'TEST' and record['hcas'] == '7732-18-5'
+        assert record['wmm'] == 18.015268 and record['tcrit'] == 647.096
+        #values after the first model section are not read
+        assert record['acf'] == None
+        print('_parsemix')
+        record = refprop._parsemix(dirname, 'TEST.MIX')
+        print(record, '\n')
+        assert record['hname'] == 'TESTMIX' and record['tcrit'] == 132.5
+        assert record['hfld'] == ['NITROGEN', 'OXYGEN']
+        assert record['x'] == [0.79, 0.21]
+    finally:
+        shutil.rmtree(dirname)
+
+#PropertyFrame
+def _frametest():
+    import frameRP
+    print('PropertyFrame')
+    frame = frameRP.PropertyFrame(3, ('t', 'D'))
+    assert frame.fill(_state(each, 2.0) for each in range(5)) == 5
+    frame.setrow(5, ValueError('failed row'))
+    print(frame.row(5), '\n')
+    assert list(frame['D'][:5]) == [0, 0.5, 1, 1.5, 2]
+    assert frame['ierr'][5] == frameRP._failedierr
+    assert frame.errors == {5:'failed row'}
+    assert frame['D'][5] != frame['D'][5]
+    #grown by doubling, trimmed after the last filled row
+    frame.trim()
+    assert len(frame) == 6
+    frame.resize(2)
+    assert len(frame) == 2 and frame.errors == {}
+    frame = frameRP.PropertyFrame.fromoutputs([_state(7, 1.0),
+                                              _state(8, 1.0)], ('t', 'p'))
+    assert list(frame['t']) == [7, 8] and list(frame['ierr']) == [-1, 0]
+    assert frame.errors == {0:'warning'}
+    #mapping of the output columns, as out of thermbatch and statebatch
+    assert dict(frame) == {'t':frame['t'], 'p':frame['p']}
+    try:
+        frame['h']
+    except frameRP.PropertyFrameError as error:
+        print('PropertyFrameError')
+        print(error, '\n')
+    else:
+        raise AssertionError('missing column not detected')
+
+#sinks, checkpointed sweep and merge
+def _sinktest():
+    import os
+    import gzip
+    import shutil
+    import tempfile
+    import sinkRP
+    dirname = tempfile.mkdtemp()
+    try:
+        print('CSVSink')
+        filename = os.path.join(dirname, 'out.csv')
+        with sinkRP.sink(filename, ('t', 'D'), rowgroup=4) as out:
+            out.write(_state(each, 2.0) for each in range(10))
+            out.write([ValueError('failed row')])
+        lines = open(filename).read().splitlines()
+        print(lines[:3], '\n')
+        assert lines[0] == 't,D,ierr,herr' and len(lines) == 12
+        assert lines[8] == '7.0,3.5,-1,warning'
+        assert lines[11] == 'nan,nan,' + str(sinkRP.frameRP._failedierr) + \
+            ',failed row'
+        #the warning is not counted as failed
+        assert out.rows == 11 and out.failed == 1
+
+        print('sweep')
+        checkpoint = os.path.join(dirname, 'checkpoint')
+        inputs = [(each, 2.0) for each in range(50)]
+        sweep = sinkRP.sweep(_state, inputs, checkpoint, ('t', 'D'),
+                             segment=20, chunksize=4, processes=2,
+                             skiperrors=True)
+        print(sweep, '\n')
+        assert sweep == {'segments':3, 'calculated':3, 'rows':50,
+                         'failed':1}
+        #resumed, the completed segments are not calculated again
+        sweep = sinkRP.sweep(_state, inputs, checkpoint, ('t', 'D'),
+                             segment=20, chunksize=4, processes=2,
+                             skiperrors=True)
+        assert sweep['calculated'] == 0
+        try:
+            sinkRP.sweep(_state, inputs, checkpoint, ('t', 'D'), segment=10)
+        except sinkRP.CheckpointError as error:
+            print('CheckpointError')
+            print(error, '\n')
+        else:
+            raise AssertionError('changed segment size not detected')
+
+        print('merge')
+        filename = os.path.join(dirname, 'merged.csv.gz')
+        sinkRP.merge(checkpoint, filename)
+        with gzip.open(filename, 'rt') as merged:
+            lines = merged.read().splitlines()
+        print(lines[:3], '\n')
+        assert lines[0] == 't,D,ierr,herr' and len(lines) == 51
+        assert [float(line.split(',')[0]) for line in lines[1:]
+                if line.split(',')[0] != 'nan'] == [each for each in
+                                                    range(50) if each != 13]
+    finally:
+        shutil.rmtree(dirname)
+
+#simplex grids of sweepRP
+def _sweeptest():
+    import sweepRP
+    print('simplex')
+    grid = sweepRP.simplex(3, 4)
+    print(grid[:6], '\n')
+    assert len(grid) == 15 and len(set(grid)) == 15
+    assert all(sum(key) == 4 for key in grid)
+    #serpentine order, consecutive compositions are neighbours
+    assert all(sum(abs(a - b) for a, b in zip(key, other)) == 2 for
+               key, other in zip(grid, grid[1:]))
+    pairs = sweepRP._neighbours(dict.fromkeys(grid), 3)
+    print('_neighbours')
+    print(len(pairs), '\n')
+    assert len(pairs) == 30
+
+#MicroBatcher with a plain callable
+def _batchertest():
+    import batchRP
+    print('MicroBatcher')
+    with batchRP.MicroBatcher(maxdelay=2000, maxbatch=16,
+                              dedup=True) as batcher:
+        futures = [batcher.submit(_square, each % 5) for each in range(40)]
+        failed = batcher.submit(_fail, 3)
+        result = [future.result() for future in futures]
+        metrics = batcher.metrics()
+    print(metrics, '\n')
+    assert result == [_square(each % 5) for each in range(40)]
+    assert isinstance(failed.exception(), ValueError)
+    assert metrics['requests'] == 41 and metrics['errors'] == 1
+    assert metrics['duplicates'] > 0
+    try:
+        batcher.submit(_square, 1)
+    except batchRP.MicroBatcherError as error:
+        print('MicroBatcherError')
+        print(error, '\n')
+    else:
+        raise AssertionError('submit to a closed MicroBatcher not detected')
+
+#RPPool.imap with pure python functions
+def _pooltest():
+    import multiRP
+    with multiRP.RPPool(2) as pool:
+        print('RPPool imap')
+        result = list(pool.imap(_square, ((each,) for each in range(100)),
+                                chunksize=7))
+        print(result[:10], '\n')
+        assert result == [each * each for each in range(100)]
+
+        print('RPPool imap, unordered')
+        result = sorted(pool.imap(_square, ((each,) for each in range(20)),
+                                  chunksize=3, ordered=False))
+        assert result == [(each, each * each) for each in range(20)]
+
+        print('RPPool imap, skiperrors')
+        result = list(pool.imap(_fail, ((each,) for each in range(6)),
+                                chunksize=2, skiperrors=True))
+        print(result, '\n')
+        assert isinstance(result[3], multiRP.TaskError)
+        assert result[:3] == [0, 1, 2] and result[4:] == [4, 5]
+
+        print('RPPool imap, timeout and skiperrors')
+        result = list(pool.imap(_sleep, [(0,), (3,), (0,)], chunksize=1,
+                                timeout=1, skiperrors=True))
+        print(result, '\n')
+        assert result[0] == 0 and result[2] == 0
+        assert isinstance(result[1], multiRP.TaskError)
+
+        try:
+            list(pool.imap(_fail, ((each,) for each in range(6)),
+                           chunksize=2))
+        except ValueError as error:
+            print('imap error')
+            print(error, '\n')
+        else:
+            raise AssertionError('failed input not raised')
+
+#statebatch of random (production like) inputs in input and curve order
+def _orderbenchmark(states=20000):
+    import time
+    import random
+    import refprop as rp
+    rp.setup('def', 'water')
+    random.seed(1)
+    t = [random.uniform(280, 900) for each in range(states)]
+    p = [random.uniform(100, 50000) for each in range(states)]
+    start = time.time()
+    order = rp.curveorder([t, p])
+    print('curveorder of ' + str(states) + ' states')
+    print('%.3f s' % (time.time() - start), '\n')
+    for ordered in (False, True):
+        start = time.time()
+        prps = rp.statebatch('tp', t, p, [1], order=ordered)
+        elapsed = time.time() - start
+        print('statebatch, order = ' + str(ordered))
+        print('%.3f s, %.0f states/s, %d errors' % (
+            elapsed, states / elapsed, len(prps['errors'])), '\n')
 
 #main test def. for usage at refprop and multiRP
 def _maintest(rp):
@@ -0,0 +1,547 @@
+#-------------------------------------------------------------------------------
+#Name:            sinkRP
+#Purpose:         streaming writers of refprop sweep results to csv, parquet
+#                 and arrow files
+#
+#Author:          Thelen, B.J.
+#                 thelen_ben@yahoo.com
+#-------------------------------------------------------------------------------
+
+'''Sweep results collected in a list (or pickled at the end of a job) grow in
+memory untill the job ends. The sinks of this module take the outputs of
+refprop functions, multiRP.imap or PropertyFrames (see frameRP) and write them
+incrementally, the memory usage is limited to one row group of rowgroup rows:
+
+    with sinkRP.sink('table.parquet', ('t', 'p', 'D', 'h'), prop=H2O) as out:
+        out.write(multiRP.imap('flsh', (('tp', t, p, [1]) for t, p in
+                               states), prop=H2O))
+
+or with the workers returning only the columns of the sink:
+
+    with sinkRP.sink('table.csv', ('t', 'p', 'D', 'h'), prop=H2O) as out:
+        sinkRP.imap('flsh', (('tp', t, p, [1]) for t, p in states), out)
+
+Long sweeps are checkpointed with sweep, which writes one part file per
+segment of inputs into a directory and resumes with the missing segments
+only (see sweep and merge).
+
+CSVSink is always available, ParquetSink and ArrowSink (Arrow IPC file)
+require pyarrow.'''
+
+import os
+import csv
+import json
+from itertools import islice
+from collections import deque
+import refprop
+import multiRP
+import frameRP
+
+#input declarations
+RefpropError = refprop.RefpropError
+
+#Declarations
+_rowgroup = 65536
+
+#Classes
+class SinkError(RefpropError):
+    'Raise error on invalid sink input or usage'
+    def __init__(self, value):
+        self.value = value
+    def __str__(self):
+        return repr(self.value)
+
+
+class CheckpointError(SinkError):
+    'Raise error on a checkpoint not matching the resumed sweep'
+    def __init__(self, value):
+        self.value = value
+    def __str__(self):
+        return repr(self.value)
+
+
+class _Sink():
+    '''base class of the sinks, buffers written rows in a PropertyFrame of
+    rowgroup rows and writes the buffer when full, the sinks implement
+    _write(columns, rows)
+
+    input:
+        path--output file (CSVSink also accepts a file object)
+        columns--names of the refprop outputs to write, columns ierr and herr
+            (error message of failed rows, empty for ierr 0) are added
+        prop--setup details (standard dictionary output from refprop
+            functions) of the written states
+        rowgroup--no. of rows buffered and written at once
+        typecode--'d' for double or 'f' for single precision columns'''
+    def __init__(self, path, columns=frameRP._columns, prop=None,
+                 rowgroup=_rowgroup, typecode='d'):
+        if rowgroup < 1:
+            raise SinkError('rowgroup should be >= 1')
+        self.path = path
+        self.rowgroup = rowgroup
+        self.rows = 0 #no. of written rows
+        self.failed = 0 #no. of written failed rows (ierr > 0, not warnings)
+        self._buffer = frameRP.PropertyFrame(rowgroup, columns, prop,
+                                             typecode)
+        self.columns = self._buffer.columns
+        self.prop = self._buffer.prop
+        self._names = self.columns + ('ierr',)
+        self._header = self._names + ('herr',)
+        self._count = 0 #no. of buffered rows
+        self._closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write(self, outputs):
+        '''Write refprop outputs (standard dictionaries, column tuples of
+        frameRP.imap or exceptions) of iterable outputs or the rows of a
+        PropertyFrame.
+
+        output:
+            no. of written rows'''
+        if self._closed:
+            raise SinkError('sink ' + str(self.path) + ' is closed')
+        if isinstance(outputs, frameRP.PropertyFrame):
+            return self._writeframe(outputs)
+        count = 0
+        buffer = self._buffer
+        for prps in outputs:
+            buffer.setrow(self._count, prps)
+            self._count += 1
+            count += 1
+            if self._count == self.rowgroup:
+                self.flush()
+        return count
+
+    def _writeframe(self, frame):
+        'write frame in slices of rowgroup rows'
+        for name in self._names:
+            if name not in frame:
+                raise SinkError('no column "' + name + '" in PropertyFrame')
+        self.flush()
+        for start in range(0, len(frame), self.rowgroup):
+            stop = min(start + self.rowgroup, len(frame))
+            self._writecolumns(dict((name, frame[name][start:stop]) for name
+                                    in self._names), stop - start,
+                               dict((row - start, herr) for row, herr in
+                                    frame.errors.items() if start <= row <
+                                    stop))
+        return len(frame)
+
+    def _writecolumns(self, columns, rows, errors):
+        'write dictionary of columns and errors (row: herr) of rows rows'
+        if rows:
+            columns['herr'] = [errors.get(row) or '' for row in range(rows)] \
+                if errors else [''] * rows
+            self._write(columns, rows)
+            self.rows += rows
+            self.failed += sum(1 for ierr in columns['ierr'] if ierr > 0)
+
+    def flush(self):
+        'Write the buffered rows'
+        if self._count:
+            buffer = self._buffer
+            self._writecolumns(dict((name, buffer[name][:self._count]) for
+                                    name in self._names), self._count,
+                               buffer.errors)
+            buffer.errors.clear()
+            self._count = 0
+
+    def close(self):
+        'Write the buffered rows and close the file'
+        if not self._closed:
+            try:
+                self.flush()
+            finally:
+                self._closed = True
+                self._close()
+
+    def _close(self):
+        'close file, implemented by the sinks'
+        pass
+
+
+class CSVSink(_Sink):
+    '''Buffered csv writer of refprop outputs, one header line with the
+    column names
+
+    input:
+        path, columns, prop, rowgroup, typecode--see _Sink
+        delimiter--column delimiter
+        compression--None or 'gzip'
+        buffering--file buffer size [bytes]'''
+    def __init__(self, path, columns=frameRP._columns, prop=None,
+                 rowgroup=_rowgroup, typecode='d', delimiter=',',
+                 compression=None, buffering=1 << 20):
+        _Sink.__init__(self, path, columns, prop, rowgroup, typecode)
+        self._owned = True
+        if hasattr(path, 'write'):
+            #file object (e.g. sys.stdout), not closed by the sink
+            self._file = path
+            self._owned = False
+        elif compression == 'gzip':
+            import gzip
+            self._file = gzip.open(path, 'wt', newline='')
+        elif compression == None:
+            self._file = open(path, 'w', newline='', buffering=buffering)
+        else:
+            raise SinkError('unsupported csv compression "' +
+                            str(compression) + '", select None or "gzip"')
+        self._writer = csv.writer(self._file, delimiter=delimiter)
+        self._writer.writerow(self._header)
+
+    def _write(self, columns, rows):
+        self._writer.writerows(zip(*[columns[name] for name in self._header]))
+
+    def _close(self):
+        if self._owned:
+            self._file.close()
+        else:
+            self._file.flush()
+
+
+class _ArrowSink(_Sink):
+    'base class of the pyarrow sinks'
+    def __init__(self, path, columns, prop, rowgroup, typecode):
+        try:
+            import pyarrow
+        except ImportError:
+            raise SinkError(self.__class__.__name__ + ' requires pyarrow')
+        _Sink.__init__(self, path, columns, prop, rowgroup, typecode)
+        self._pyarrow = pyarrow
+        valuetype = pyarrow.float64() if typecode == 'd' else \
+            pyarrow.float32()
+        metadata = {'prop':repr(self.prop)} if self.prop != None else None
+        self._schema = pyarrow.schema(
+            [(name, valuetype) for name in self.columns] +
+            [('ierr', pyarrow.int32()), ('herr', pyarrow.string())],
+            metadata=metadata)
+
+    def _batch(self, columns, rows):
+        'return pyarrow.RecordBatch of columns (without copying)'
+        return self._pyarrow.RecordBatch.from_arrays(
+            [frameRP._asarrow(self._pyarrow, columns[name]) for name in
+             self._names] + [self._pyarrow.array(columns['herr'],
+                                                 self._pyarrow.string())],
+            schema=self._schema)
+
+
+class ParquetSink(_ArrowSink):
+    '''Parquet writer of refprop outputs, each rowgroup rows are written as
+    one parquet row group (requires pyarrow)
+
+    input:
+        path, columns, prop, rowgroup, typecode--see _Sink
+        compression--parquet compression ('snappy', 'gzip', 'zstd', 'lz4',
+            'brotli' or None)'''
+    def __init__(self, path, columns=frameRP._columns, prop=None,
+                 rowgroup=_rowgroup, typecode='d', compression='snappy'):
+        _ArrowSink.__init__(self, path, columns, prop, rowgroup, typecode)
+        import pyarrow.parquet
+        self._writer = pyarrow.parquet.ParquetWriter(
+            path, self._schema, compression=compression or 'none')
+
+    def _write(self, columns, rows):
+        self._writer.write_table(self._pyarrow.Table.from_batches(
+            [self._batch(columns, rows)]), row_group_size=self.rowgroup)
+
+    def _close(self):
+        self._writer.close()
+
+
+class ArrowSink(_ArrowSink):
+    '''Arrow IPC file (feather v2) writer of refprop outputs, each rowgroup
+    rows are written as one record batch (requires pyarrow)
+
+    input:
+        path, columns, prop, rowgroup, typecode--see _Sink
+        compression--buffer compression ('lz4', 'zstd' or None)'''
+    def __init__(self, path, columns=frameRP._columns, prop=None,
+                 rowgroup=_rowgroup, typecode='d', compression=None):
+        _ArrowSink.__init__(self, path, columns, prop, rowgroup, typecode)
+        import pyarrow.ipc
+        options = pyarrow.ipc.IpcWriteOptions(compression=compression)
+        self._writer = pyarrow.ipc.new_file(path, self._schema,
+                                            options=options)
+
+    def _write(self, columns, rows):
+        self._writer.write_batch(self._batch(columns, rows))
+
+    def _close(self):
+        self._writer.close()
+
+
+#functions
+def sink(path, columns=frameRP._columns, prop=None, rowgroup=_rowgroup,
+         typecode='d', **kwargs):
+    '''Return sink for path selected by its extension: .parquet
+    (ParquetSink), .arrow, .feather or .ipc (ArrowSink), .csv, .csv.gz, .tsv
+    or .tsv.gz (CSVSink). kwargs are passed to the sink (compression,
+    delimiter, buffering).'''
+    name = str(path).lower()
+    if name.endswith('.gz'):
+        kwargs.setdefault('compression', 'gzip')
+        name = name[:-3]
+    if name.endswith('.parquet'):
+        return ParquetSink(path, columns, prop, rowgroup, typecode, **kwargs)
+    elif name.endswith(('.arrow', '.feather', '.ipc')):
+        return ArrowSink(path, columns, prop, rowgroup, typecode, **kwargs)
+    elif name.endswith('.tsv'):
+        kwargs.setdefault('delimiter', '\t')
+        return CSVSink(path, columns, prop, rowgroup, typecode, **kwargs)
+    elif name.endswith('.csv'):
+        return CSVSink(path, columns, prop, rowgroup, typecode, **kwargs)
+    raise SinkError('unknown file type of "' + str(path) + '", select ' +
+                    '.csv, .tsv, .parquet, .arrow, .feather or .ipc')
+
+def imap(routine, iterable, out, prop=None, chunksize=256, pool=None,
+         **kwargs):
+    '''Calculate routine(*args) for each args of iterable on the workers of
+    pool (multiRP.RPPool, or a temporary pool) and write the outputs in order
+    to sink out. The workers return only the columns of the sink, memory
+    usage is limited to the inflight chunks of imap and one row group.
+
+    input:
+        routine--refprop function (name, refprop or multiRP function)
+        iterable--(lazy) iterable of input tuples of routine
+        out--sink the outputs are written to
+        prop--setup details, default the setup details of the sink
+        chunksize--no. of inputs per task send to a worker
+        pool--multiRP.RPPool (or distRP.Coordinator), None for a temporary
+            pool
+        **kwargs--further input of RPPool.imap (maxinflight, timeout,
+            skiperrors, dedup) or multiRP.imap (processes, path)
+    output:
+        no. of written rows'''
+    if routine.__class__ is not str:
+        routine = multiRP._rpfunction(routine)
+    if prop == None:
+        prop = out.prop
+    func = frameRP._Columns(routine, out.columns)
+    if pool == None:
+        outputs = multiRP.imap(func, iterable, prop, chunksize, True, **kwargs)
+    else:
+        outputs = pool.imap(func, iterable, prop, chunksize, True, **kwargs)
+    return out.write(outputs)
+
+#checkpointed sweeps
+def _routinename(routine):
+    'return name of routine stored in the checkpoint manifest'
+    if routine.__class__ is str:
+        return routine.lower()
+    return getattr(routine, '__module__', '') + '.' + routine.__name__
+
+def _signature(prop):
+    '''return signature of the models of setup details prop, the setup
+    fingerprint and the hashes of the fluid files (see fluidindex)'''
+    if prop == None:
+        return None
+    hashes = []
+    for fluid in refprop.setup_details(prop).get('hfld', []):
+        try:
+            record = refprop.findfluid(fluid)
+        except Exception:
+            #no fluid directory to index
+            record = None
+        hashes.append(record['hash'] if record != None else None)
+    return {'fingerprint':refprop.fingerprint(prop), 'fluidhashes':hashes}
+
+def _segmenthash(argslist):
+    'return hash of the inputs of a segment'
+    from hashlib import sha1
+    return sha1(repr(argslist).encode('utf-8')).hexdigest()
+
+def _partname(segment, filetype):
+    'return file name of the part file of segment'
+    return 'part-%08d.' % segment + filetype
+
+def _readmanifest(directory):
+    'return manifest of checkpoint directory, None if not existing'
+    try:
+        with open(os.path.join(directory, 'manifest.json')) as manifest:
+            return json.load(manifest)
+    except FileNotFoundError:
+        return None
+
+def _writemanifest(directory, manifest):
+    'write manifest of checkpoint directory atomically'
+    filename = os.path.join(directory, 'manifest.json')
+    with open(filename + '.tmp', 'w') as tmpfile:
+        json.dump(manifest, tmpfile)
+        tmpfile.flush()
+        os.fsync(tmpfile.fileno())
+    os.replace(filename + '.tmp', filename)
+
+def sweep(routine, iterable, directory, columns=frameRP._columns, prop=None,
+          segment=_rowgroup, filetype='csv', chunksize=256, pool=None,
+          name=None, **kwargs):
+    '''Checkpointed sweep, calculate routine(*args) for each args of
+    iterable on the workers of pool (multiRP.RPPool, or a temporary pool)
+    and write the outputs of each segment (segment inputs) to part file
+    part-<segment no>.<filetype> in directory.
+
+    A completed segment is recorded in directory/manifest.json together with
+    the hash of its inputs. Rerun with the same input to resume, completed
+    segments are skipped (their inputs are only read and compared to the
+    checkpoint) and only the missing segments are calculated. A checkpoint
+    of another routine, columns, segment size, setup (fingerprint and fluid
+    file hashes) or other inputs raises CheckpointError.
+
+    input:
+        routine--refprop function (name, refprop or multiRP function)
+        iterable--iterable of input tuples of routine, deterministic: a
+            resumed run should produce the same inputs in the same order
+        directory--checkpoint directory (created if not existing)
+        columns, prop--see PropertyFrame
+        segment--no. of inputs per part file and checkpoint
+        filetype--file type of the part files ('csv', 'tsv', 'parquet',
+            'arrow', 'feather' or 'ipc')
+        chunksize, pool, **kwargs--see imap
+        name--routine name stored in the checkpoint, default the module and
+            name of routine (differs between a module run as script and
+            imported)
+    output:
+        segments--no. of segments
+        calculated--no. of segments calculated in this run
+        rows--no. of rows of all segments
+        failed--no. of failed rows of all segments'''
+    if segment < 1:
+        raise SinkError('segment should be >= 1')
+    columns = list(columns)
+    settings = {'routine':name or _routinename(routine), 'columns':columns,
+                'segment':segment, 'filetype':filetype,
+                'signature':_signature(prop)}
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    manifest = _readmanifest(directory)
+    if manifest == None:
+        manifest = dict(settings, done={}, segments=None)
+        _writemanifest(directory, manifest)
+    else:
+        for key, value in settings.items():
+            if manifest.get(key) != value:
+                raise CheckpointError('checkpoint ' + str(directory) +
+                                      ' differs in ' + key + ': ' +
+                                      repr(manifest.get(key)) + ' != ' +
+                                      repr(value))
+    done = manifest['done'] #segment no. (str): rows, failed, input hash
+    pending = deque() #(segment no., no. of inputs, input hash) to calculate
+    state = {'segments':0, 'calculated':0}
+
+    def missing():
+        'yield the inputs of the segments missing in the checkpoint'
+        inputs = iter(iterable)
+        number = 0
+        while True:
+            argslist = [args if args.__class__ is tuple else (args,) for
+                        args in islice(inputs, segment)]
+            if not argslist:
+                break
+            inputhash = _segmenthash(argslist)
+            record = done.get(str(number))
+            if record != None:
+                if record['hash'] != inputhash or record['rows'] != len(
+                        argslist):
+                    raise CheckpointError('inputs of segment ' + str(number) +
+                                          ' differ from checkpoint ' +
+                                          str(directory))
+            else:
+                pending.append((number, len(argslist), inputhash))
+                for args in argslist:
+                    yield args
+            number += 1
+        state['segments'] = number
+
+    if routine.__class__ is not str:
+        routine = multiRP._rpfunction(routine)
+    func = frameRP._Columns(routine, columns)
+    if pool == None:
+        outputs = multiRP.imap(func, missing(), prop, chunksize, True,
+                               **kwargs)
+    else:
+        outputs = pool.imap(func, missing(), prop, chunksize, True, **kwargs)
+    for prps in outputs:
+        #outputs are ordered, the first output opens the next segment
+        number, rows, inputhash = pending.popleft()
+        partname = _partname(number, filetype)
+        tmpname = os.path.join(directory, '.' + partname)
+        with sink(tmpname, columns, prop, min(rows, _rowgroup)) as out:
+            out.write([prps])
+            out.write(islice(outputs, rows - 1))
+        if out.rows != rows:
+            raise SinkError('missing outputs of segment ' + str(number))
+        os.replace(tmpname, os.path.join(directory, partname))
+        done[str(number)] = {'rows':rows, 'failed':out.failed,
+                             'hash':inputhash}
+        _writemanifest(directory, manifest)
+        state['calculated'] += 1
+    manifest['segments'] = state['segments']
+    _writemanifest(directory, manifest)
+    return {'segments':state['segments'], 'calculated':state['calculated'],
+            'rows':sum(record['rows'] for record in done.values()),
+            'failed':sum(record['failed'] for record in done.values())}
+
+def merge(directory, output):
+    '''Concatenate the part files of the completed sweep in directory to
+    output of the same file type (see sweep, csv and tsv parts can be merged
+    to a gzip compressed .csv.gz or .tsv.gz file), one part file in memory
+    at a time. A sweep without inputs writes output with the columns only.
+
+    output:
+        no. of rows'''
+    manifest = _readmanifest(directory)
+    if manifest == None or manifest['segments'] == None or len(
+            manifest['done']) != manifest['segments']:
+        raise CheckpointError('sweep ' + str(directory) + ' is not completed')
+    filetype = manifest['filetype']
+    name = str(output).lower()
+    compressed = filetype in ('csv', 'tsv') and name.endswith('.gz')
+    if compressed:
+        name = name[:-3]
+    if not name.endswith('.' + filetype):
+        raise SinkError('output should be a .' + filetype + ' file')
+    if not manifest['segments']:
+        #no part files, write the header or schema
+        sink(output, manifest['columns']).close()
+        return 0
+    parts = [os.path.join(directory, _partname(number, filetype)) for
+             number in range(manifest['segments'])]
+    rows = sum(record['rows'] for record in manifest['done'].values())
+    if filetype in ('csv', 'tsv'):
+        if compressed:
+            import gzip
+            outfile = gzip.open(output, 'wt', newline='')
+        else:
+            outfile = open(output, 'w', newline='', buffering=1 << 20)
+        with outfile:
+            for number, part in enumerate(parts):
+                with open(part, newline='') as partfile:
+                    header = partfile.readline()
+                    if number == 0:
+                        outfile.write(header)
+                    for line in partfile:
+                        outfile.write(line)
+        return rows
+    import pyarrow
+    if filetype == 'parquet':
+        import pyarrow.parquet
+        writer = None
+        for part in parts:
+            table = pyarrow.parquet.read_table(part)
+            if writer == None:
+                writer = pyarrow.parquet.ParquetWriter(output, table.schema)
+            writer.write_table(table)
+    else:
+        import pyarrow.ipc
+        writer = None
+        for part in parts:
+            table = pyarrow.ipc.open_file(part).read_all()
+            if writer == None:
+                writer = pyarrow.ipc.new_file(output, table.schema)
+            writer.write_table(table)
+    writer.close()
+    return rows
@@ -0,0 +1,290 @@
+#-------------------------------------------------------------------------------
+#Name:            sweepRP
+#Purpose:         composition space sweeps for the screening of blends
+#
+#Author:          Thelen, B.J.
+#                 thelen_ben@yahoo.com
+#-------------------------------------------------------------------------------
+
+'''Screening of blends evaluates critical points, saturation states, glide and
+cycle performance over the composition simplex of a mixture. sweep enumerates
+the simplex grid (each mol fraction a multiple of 1 / divisions), orders the
+compositions for locality (neighbouring compositions on the same worker
+chunk), evaluates the selected properties on the workers of a RPPool (the
+setup stays loaded on the workers) and returns a PropertyFrame (see frameRP)
+or writes it to a csv, parquet or arrow file (see sinkRP):
+
+    prop = refprop.setup('def', 'R32', 'R125', 'R1234YF')
+    frame = sweepRP.sweep(('tcrit', 'glide', 'cop'), divisions=20,
+                          prop=prop, refine=2, out='blends.parquet')
+
+With refine, the grid is refined where a property changes fastest: between
+neighbouring compositions of which a property differs more than tol (relative
+to its range on the sweep) the midpoint is added at twice the resolution, for
+refine levels.
+
+properties (see _groups for the refprop calls):
+    tcrit, pcrit, Dcrit--critical point (critp) [K, kPa, mol/L]
+    pbubble, pdew--bubble and dew pressure at temperature t [kPa]
+    tbubble, tdew, glide--bubble and dew temperature at pressure p and the
+        temperature glide tdew - tbubble [K]
+    cop, qvol, pevap, pcond, tdischarge--vapor compression cycle with
+        saturated vapor (dew point) at tevap, saturated liquid (bubble point)
+        at tcond and isentropic compression: coefficient of performance [-],
+        volumetric cooling capacity [kJ/m3], evaporation and condensation
+        pressure [kPa] and discharge temperature [K]'''
+
+import multiRP
+import frameRP
+import sinkRP
+import refprop
+
+#input declarations
+RefpropError = refprop.RefpropError
+
+#Declarations
+#properties calculated together by one group of refprop calls
+_groups = {'critp':('tcrit', 'pcrit', 'Dcrit'),
+           'satt':('pbubble', 'pdew'),
+           'satp':('tbubble', 'tdew', 'glide'),
+           'cycle':('cop', 'qvol', 'pevap', 'pcond', 'tdischarge')}
+#default conditions of the properties
+_conditions = {'t':273.15, 'p':101.325, 'tevap':268.15, 'tcond':313.15}
+
+#Classes
+class SweepError(RefpropError):
+    'Raise error on invalid sweep input'
+    def __init__(self, value):
+        self.value = value
+    def __str__(self):
+        return repr(self.value)
+
+
+class _Point():
+    '''picklable evaluation of the property groups of one composition, a
+    failing group leaves its properties undefined (nan) and sets ierr'''
+    def __init__(self, groups, conditions):
+        self.groups = groups
+        self.conditions = conditions
+        self.__name__ = 'sweep'
+
+    def __call__(self, x):
+        prps, herr = {}, None
+        for group in self.groups:
+            try:
+                prps.update(globals()['_' + group](x, self.conditions))
+            except RefpropError as exc:
+                herr = herr or group + ': ' + str(exc)
+        prps['ierr'] = 1 if herr else 0
+        prps['herr'] = herr
+        return prps
+
+
+#functions
+def _critp(x, conditions):
+    crit = refprop.critp(x)
+    return {'tcrit':crit['tcrit'], 'pcrit':crit['pcrit'],
+            'Dcrit':crit['Dcrit']}
+
+def _satt(x, conditions):
+    t = conditions['t']
+    return {'pbubble':refprop.satt(t, x, 1)['p'],
+            'pdew':refprop.satt(t, x, 2)['p']}
+
+def _satp(x, conditions):
+    p = conditions['p']
+    tbubble = refprop.satp(p, x, 1)['t']
+    tdew = refprop.satp(p, x, 2)['t']
+    return {'tbubble':tbubble, 'tdew':tdew, 'glide':tdew - tbubble}
+
+def _cycle(x, conditions):
+    tevap, tcond = conditions['tevap'], conditions['tcond']
+    evap = refprop.satt(tevap, x, 2)
+    vapor = refprop.therm(tevap, evap['Dvap'], x)
+    cond = refprop.satt(tcond, x, 1)
+    h3 = refprop.therm(tcond, cond['Dliq'], x)['h']
+    discharge = refprop.flsh('ps', cond['p'], vapor['s'], x)
+    h1 = vapor['h']
+    return {'cop':(h1 - h3) / (discharge['h'] - h1),
+            'qvol':(h1 - h3) * evap['Dvap'], 'pevap':evap['p'],
+            'pcond':cond['p'], 'tdischarge':discharge['t']}
+
+def simplex(nc, divisions):
+    '''Return list of the integer compositions (tuples of nc integers summing
+    to divisions) of the simplex grid in serpentine order: consecutive
+    compositions are neighbours on the grid'''
+    if nc < 1 or divisions < 1:
+        raise SweepError('nc and divisions should be >= 1')
+    def parts(nc, total):
+        if nc == 1:
+            yield (total,)
+            return
+        for first in range(total + 1):
+            for rest in parts(nc - 1, total - first):
+                yield (first,) + rest
+    return sorted(parts(nc, divisions), key=_serpentine)
+
+def _serpentine(key):
+    '''sort key of the serpentine order of integer composition key, the
+    direction of each component alternates with the preceding components'''
+    order, total = [], 0
+    for each in key:
+        order.append(each if total % 2 == 0 else -each)
+        total += each
+    return tuple(order)
+
+def _neighbours(points, nc):
+    '''return pairs of neighbouring integer compositions of dictionary
+    points (one unit moved from one component to another)'''
+    pairs = []
+    for key in points:
+        for i in range(nc):
+            for j in range(i + 1, nc):
+                if key[j] == 0:
+                    continue
+                other = list(key)
+                other[i] += 1
+                other[j] -= 1
+                other = tuple(other)
+                if other in points:
+                    pairs.append((key, other))
+    return pairs
+
+def sweep(properties, divisions=10, compositions=None, conditions=None,
+          prop=None, refine=0, tol=0.05, out=None, processes=None,
+          chunksize=32, pool=None, typecode='d'):
+    '''Evaluate properties over the composition simplex grid (or the list of
+    compositions) on the workers of pool (multiRP.RPPool, or a temporary
+    pool).
+
+    input:
+        properties--names of the properties (see module documentation)
+        divisions--no. of divisions of each mol fraction of the grid
+        compositions--list of compositions [array of mol frac] evaluated
+            instead of the grid, duplicates are evaluated once
+        conditions--dictionary of t, p, tevap and tcond of the properties
+            (see _conditions for the defaults)
+        prop--setup details (standard dictionary output from refprop
+            functions) of the mixture
+        refine--no. of refinement levels of the grid
+        tol--change of a property between neighbours, relative to its range,
+            above which the grid is refined
+        out--file name or sink (see sinkRP) to write the results to
+        processes--no. of worker processes of the temporary pool
+        chunksize--no. of compositions per task send to a worker
+        pool--multiRP.RPPool, None for a temporary pool
+        typecode--'d' for double or 'f' for single precision columns
+    output:
+        PropertyFrame with columns x1 .. xnc (mol frac), level (refinement
+        level of the row) and properties, the properties of failing refprop
+        calls are nan with ierr 1 (999 for a failed worker, see
+        PropertyFrame.errors)'''
+    properties = tuple(properties)
+    groups = []
+    for name in properties:
+        for group, names in _groups.items():
+            if name in names:
+                if group not in groups:
+                    groups.append(group)
+                break
+        else:
+            raise SweepError('unknown property "' + str(name) + '"')
+    settings = dict(_conditions)
+    settings.update(conditions or {})
+    if compositions != None:
+        if refine:
+            raise SweepError('refine requires the simplex grid, not ' +
+                             'compositions')
+        unique = {}
+        for x in compositions:
+            unique.setdefault(tuple(round(each, 12) for each in x),
+                              list(x))
+        #order the compositions as the grid cell they are in
+        xs = sorted(unique.values(), key=lambda x: (_serpentine(tuple(
+            int(each * divisions + 0.5) for each in x)), x))
+        nc = len(xs[0]) if xs else 0
+    else:
+        nc = prop.get('nc') if prop != None else None
+        if not nc:
+            raise SweepError('setup details prop with "nc" required for ' +
+                             'the simplex grid')
+        xs = None
+    if pool == None:
+        with multiRP.RPPool(processes, refprop._fpath or None) as pool:
+            frame = _sweep(pool, groups, settings, properties, nc,
+                           divisions, xs, prop, refine, tol, chunksize,
+                           typecode)
+    else:
+        frame = _sweep(pool, groups, settings, properties, nc, divisions, xs,
+                       prop, refine, tol, chunksize, typecode)
+    if out != None:
+        if out.__class__ is str:
+            with sinkRP.sink(out, frame.columns, prop, typecode=typecode) as \
+            sink:
+                sink.write(frame)
+        else:
+            out.write(frame)
+    return frame
+
+def _sweep(pool, groups, settings, properties, nc, divisions, xs, prop,
+           refine, tol, chunksize, typecode):
+    'evaluate the grid and its refinements, see sweep'
+    xcolumns = tuple('x' + str(each + 1) for each in range(nc))
+    frame = frameRP.PropertyFrame(len(xs) if xs != None else 0,
+                                  xcolumns + ('level',) + properties, prop,
+                                  typecode)
+    func = frameRP._Columns(_Point(groups, settings), properties)
+    def evaluate(compositions, level):
+        'append rows of the outputs of compositions'
+        start = frame._filled
+        outputs = pool.imap(func, [(x,) for x in compositions], prop,
+                            chunksize, skiperrors=True)
+        for row, (x, output) in enumerate(zip(compositions, outputs),
+                                          start):
+            if output.__class__ is tuple:
+                frame.setrow(row, tuple(x) + (level,) + output)
+            else:
+                #TaskError of a failed composition
+                frame.setrow(row, output)
+                for column, value in zip(xcolumns, x):
+                    frame[column][row] = value
+                frame['level'][row] = level
+        frame.trim()
+        return start
+
+    if xs != None:
+        evaluate(xs, 0)
+        return frame
+
+    resolution = divisions
+    keys = simplex(nc, divisions)
+    points = {} #integer composition at resolution: row
+    for level in range(refine + 1):
+        start = evaluate([[each / float(resolution) for each in key] for key
+                          in keys], level)
+        for row, key in enumerate(keys, start):
+            points[key] = row
+        if level == refine:
+            break
+        #midpoints of neighbours differing more than tol in a property
+        columns = [frame[name] for name in properties]
+        ranges = []
+        for column in columns:
+            values = [value for value in column if value == value]
+            ranges.append(max(values) - min(values) if values else 0)
+        midpoints = set()
+        for a, b in _neighbours(points, nc):
+            ra, rb = points[a], points[b]
+            for column, span in zip(columns, ranges):
+                va, vb = column[ra], column[rb]
+                if span > 0 and abs(va - vb) > tol * span:
+                    #nan differences compare False, failed rows are skipped
+                    midpoints.add(tuple(i + j for i, j in zip(a, b)))
+                    break
+        if not midpoints:
+            break
+        resolution *= 2
+        points = dict((tuple(2 * each for each in key), row) for key, row in
+                      points.items())
+        keys = sorted(midpoints, key=_serpentine)
+    return frame